@@ -1,3 +1,5 @@
+import sys
+
 from django.apps import AppConfig
 
 
@@ -9,3 +11,18 @@ class ApiConfig(AppConfig):
         # We import here to avoid issues with app registry
         from .keep_alive import start_keep_alive_loop
         start_keep_alive_loop()
+
+        # Registers the job handlers and the tombstone signal
+        from . import tasks, pipeline, signals  # noqa: F401
+
+        # Resume any queued jobs left over from a previous process. One-off
+        # management commands (migrate, shell, ...) get no workers.
+        from .jobs import ensure_in_process_workers
+        ensure_in_process_workers()
+
+
+def is_server_process():
+    argv = sys.argv
+    if argv and argv[0].endswith('manage.py'):
+        return len(argv) > 1 and argv[1] == 'runserver'
+    return True
@@ -0,0 +1,789 @@
+"""
+Offline benchmark for webhook ingest and the items API (`manage.py benchmark`).
+
+Everything the pipeline talks to is replaced by a local stand-in:
+- One threaded HTTP server plays Meta's Graph API, Jina Reader and the origin
+  sites. The pipeline reaches it through HTTP_PROXY, because it is configured
+  with plain-http upstream URLs and synthetic links; the server routes on the
+  requested host.
+- The Gemini client is swapped for a stub with a fixed latency.
+- The run happens in a scratch copy of the database and a scratch resilience
+  file, so real data and circuit state are never touched.
+
+Ingest phase: it posts synthetic webhook bursts through whatsapp_webhook, lets
+the job workers drain them, and measures webhook latency, end-to-end items/s
+and per-stage times.
+
+API phase: it seeds a collection and loads the SavedItemViewSet endpoints.
+
+Results are JSON and can be saved as a baseline and compared against.
+Synthetic data and upstream behaviour come from a seeded RNG, so two runs with
+the same options do the same work.
+"""
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from . import jobs, thumbnails, utils
+from .facets import rebuild_facets
+from .htmlmeta import CHUNK_SIZE, extract_head_meta
+from .models import Job, OutboundMessage, SavedItem
+from .observability import FALLBACKS, STAGE_ERRORS, STAGE_SECONDS
+from .thumbnails import scan_store
+from .utils import CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+RESULTS_VERSION = 1
+WORDS = (
+    'python django react vector search latency cache queue worker async batch gemini '
+    'recipe travel startup design fitness crypto gaming productivity design tutorial '
+    'thread review launch guide tips workflow database index stream benchmark'
+).split()
+
+# Platform mix of synthetic links: (weight, url template). Plain http so they go through the proxy.
+LINK_MIX = (
+    (40, 'http://blog.example/{slug}'),
+    (25, 'http://www.instagram.com/p/{token}/'),
+    (20, 'http://x.com/{word}/status/{number}'),
+    (15, 'http://www.youtube.com/watch?v={token}'),
+)
+
+
+# --- Fake upstreams ---------------------------------------------------------
+
+def synthetic_image(seed, size=(1200, 630)):
+    """A photo-sized JPEG (the usual og:image dimensions) that doesn't compress to nothing."""
+    import numpy as np
+    from PIL import Image
+
+    width, height = size
+    noise = np.random.default_rng(seed).integers(0, 48, (height, width, 3), dtype=np.uint8)
+    gradient = np.linspace(0, 200, width, dtype=np.uint8)[None, :, None]
+    out = io.BytesIO()
+    Image.fromarray(noise + gradient).save(out, 'JPEG', quality=85)
+    return out.getvalue()
+
+
+class FakeUpstreams:
+    """Shared state and behaviour of the fake Graph / Jina / origin server."""
+
+    def __init__(self, seed, latency, wall_rate, page_kb):
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.wall_rate = wall_rate
+        self._lock = threading.Lock()
+        self.requests = {'graph': 0, 'jina': 0, 'origin': 0, 'image': 0}
+        filler_rng = random.Random(seed)
+        self.filler = ' '.join(filler_rng.choice(WORDS) for _ in range(page_kb * 1024 // 7))
+        # A few distinct images: the thumbnail store keeps one file per distinct image.
+        self.images = [synthetic_image(seed + i) for i in range(8)]
+
+    def delay(self):
+        with self._lock:
+            jitter = self.rng.uniform(0.5, 1.5)
+        return self.latency * jitter
+
+    def count(self, name):
+        with self._lock:
+            self.requests[name] += 1
+
+    def walled(self, url):
+        """Deterministic per URL, so every run hits the same login walls."""
+        return zlib.crc32(url.encode()) % 1000 < self.wall_rate * 1000
+
+    def origin_html(self, url):
+        if self.walled(url):
+            return "<html><head><title>Log in</title></head><body>Log In to continue</body></html>"
+        title = f"Post {zlib.crc32(url.encode()):08x}"
+        return (
+            "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+            f"<title>{title}</title>"
+            f"<meta property='og:title' content='{title}'>"
+            f"<meta property='og:description' content='{self.filler[:300]}'>"
+            "<meta property='og:site_name' content='Bench'>"
+            f"<meta property='og:image' content='http://cdn.example/{title[5:]}.jpg'>"
+            f"</head><body><article><p>{self.filler}</p></article></body></html>"
+        )
+
+    def image(self, url):
+        return self.images[zlib.crc32(url.encode()) % len(self.images)]
+
+    def jina_markdown(self, url):
+        if self.walled(url):
+            return "Log In\n\nThis content is only available to signed-in users."
+        return f"# Article {zlib.crc32(url.encode()):08x}\n\n{self.filler[:6000]}"
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def target(self):
+        # Proxied requests carry the absolute URL; direct ones only the path.
+        parts = urlsplit(self.path)
+        host = parts.hostname or self.headers.get('Host', '').split(':')[0]
+        return host, self.path if parts.scheme else f"http://{host}{self.path}"
+
+    def reply(self, status, body, content_type):
+        data = body if isinstance(body, bytes) else body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        upstreams = self.server.upstreams
+        host, url = self.target()
+        time.sleep(upstreams.delay())
+        if host == 'r.jina.ai':
+            upstreams.count('jina')
+            page = url.split('r.jina.ai/', 1)[1]
+            self.reply(200, upstreams.jina_markdown(page), 'text/markdown; charset=utf-8')
+        elif host in ('cdn.example', 'img.youtube.com'):
+            upstreams.count('image')
+            self.reply(200, upstreams.image(url), 'image/jpeg')
+        else:
+            upstreams.count('origin')
+            self.reply(200, upstreams.origin_html(url), 'text/html; charset=utf-8')
+
+    def do_POST(self):
+        upstreams = self.server.upstreams
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        time.sleep(upstreams.delay())
+        upstreams.count('graph')
+        self.reply(200, json.dumps({
+            'messaging_product': 'whatsapp',
+            'messages': [{'id': f"wamid.bench{upstreams.requests['graph']}"}],
+        }), 'application/json')
+
+
+class UpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-response on purpose (the social layer stops reading after </head>).
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+@contextlib.contextmanager
+def fake_upstream_server(upstreams):
+    server = UpstreamServer(('127.0.0.1', 0), UpstreamHandler)
+    server.upstreams = upstreams
+    thread = threading.Thread(target=server.serve_forever, name='bench-upstreams', daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class FakeGeminiModels:
+    """Stands in for `client.models`: fixed latency, deterministic JSON answers."""
+
+    def __init__(self, latency, per_item):
+        self.latency = latency
+        self.per_item = per_item
+        self.calls = 0
+
+    @staticmethod
+    def enrichment_for(url):
+        h = zlib.crc32(url.encode())
+        return {
+            'title': f"Saved post {h:08x}",
+            'category': CATEGORIES[h % len(CATEGORIES)],
+            'summary': f"A benchmark item about {WORDS[h % len(WORDS)]} and {WORDS[h // 7 % len(WORDS)]}.",
+            'hashtags': [WORDS[(h >> shift) % len(WORDS)] for shift in (0, 5, 10)],
+        }
+
+    def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        if 'ITEMS (JSON): ' in contents:
+            items = json.loads(contents.split('ITEMS (JSON): ', 1)[1].split('\n', 1)[0])
+            time.sleep(self.latency + self.per_item * len(items))
+            payload = [{'id': item['id'], **self.enrichment_for(item['url'])} for item in items]
+        else:
+            url = contents.split('SOURCE URL: ', 1)[1].split()[0]
+            time.sleep(self.latency + self.per_item)
+            payload = self.enrichment_for(url)
+        return SimpleNamespace(text=json.dumps(payload))
+
+
+# --- Environment ------------------------------------------------------------
+
+@contextlib.contextmanager
+def patched(obj, name, value):
+    old = getattr(obj, name)
+    setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        setattr(obj, name, old)
+
+
+@contextlib.contextmanager
+def environ(**values):
+    old = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in old.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+@contextlib.contextmanager
+def scratch_database(workdir):
+    """Run against a throwaway database with the current schema (a file, for SQLite)."""
+    if connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.close()
+        try:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        except Exception as e:
+            logger.warning("Could not drop the benchmark database: %s", e)
+
+
+@contextlib.contextmanager
+def bench_environment(options, proxy_url, workdir):
+    gemini = FakeGeminiModels(options['ai_latency'], options['ai_per_item_latency'])
+    unlimited = {name: (1000.0, 1000) for name in settings.UPSTREAM_RATE_LIMITS}
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(override_settings(
+            JOB_WORKER_MODE='external',
+            JINA_READER_URL='http://r.jina.ai/',
+            WHATSAPP_API_URL='http://graph.facebook.com/v22.0/',
+            YOUTUBE_THUMBNAIL_URL='http://img.youtube.com/vi/{id}/hqdefault.jpg',
+            THUMBNAIL_DIR=os.path.join(workdir, 'thumbnails'),
+            RESILIENCE_DB_PATH=os.path.join(workdir, 'resilience.sqlite3'),
+            # Measure our code, not the real upstream quotas.
+            UPSTREAM_RATE_LIMITS=unlimited,
+            ITEM_WRITE_COALESCING=options['write_coalescing'],
+        ))
+        stack.enter_context(environ(
+            HTTP_PROXY=proxy_url, http_proxy=proxy_url, NO_PROXY='', no_proxy='',
+            WHATSAPP_ACCESS_TOKEN='bench-token', WHATSAPP_PHONE_NUMBER_ID='bench',
+        ))
+        stack.enter_context(patched(utils, '_client', SimpleNamespace(models=gemini)))
+        # The fake upstream hosts don't resolve; the proxy serves them all.
+        stack.enter_context(patched(thumbnails, 'resolve_host', lambda host, port: {'93.184.215.14'}))
+        # Keep re-enrichment and facet rebuilds out of the measurements.
+        stack.enter_context(patched(jobs, '_periodic_scheduled', True))
+        stack.enter_context(scratch_database(workdir))
+        yield gemini
+
+
+# --- Measurements -----------------------------------------------------------
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def latency_summary(seconds, elapsed):
+    return {
+        'requests': len(seconds),
+        'p50_ms': round(percentile(seconds, 0.5) * 1000, 2) if seconds else None,
+        'p99_ms': round(percentile(seconds, 0.99) * 1000, 2) if seconds else None,
+        'rps': round(len(seconds) / elapsed, 1) if elapsed else None,
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def stage_breakdown(before, after):
+    """Mean time per pipeline stage/result between two STAGE_SECONDS.totals() snapshots."""
+    stages = {}
+    for key, (count, total) in sorted(after.items()):
+        count_before, total_before = before.get(key, (0, 0.0))
+        if count > count_before:
+            stages['/'.join(key)] = {
+                'count': count - count_before,
+                'mean_ms': round((total - total_before) / (count - count_before) * 1000, 2),
+            }
+    return stages
+
+
+def run_parallel(tasks, concurrency, func):
+    """Run func(task) for every task on `concurrency` threads, each with its own test Client."""
+    local = threading.local()
+
+    def call(task):
+        if not hasattr(local, 'client'):
+            local.client = Client(HTTP_HOST='localhost')
+        return func(local.client, task)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bench') as pool:
+        results = list(pool.map(call, tasks))
+    return results, time.perf_counter() - started
+
+
+# --- Ingest phase -----------------------------------------------------------
+
+def synthetic_links(rng, count):
+    weights = [weight for weight, _ in LINK_MIX]
+    links = []
+    for i in range(count):
+        template = rng.choices([template for _, template in LINK_MIX], weights)[0]
+        links.append(template.format(
+            slug=f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{i}",
+            token=f"b{i:05d}{rng.randrange(36 ** 4):04x}",
+            word=rng.choice(WORDS),
+            number=10 ** 15 + i,
+        ))
+    return links
+
+
+def webhook_payload(messages):
+    return {'entry': [{'changes': [{'value': {'messages': [
+        {'id': message_id, 'from': sender, 'type': 'text', 'text': {'body': text}}
+        for message_id, sender, text in messages
+    ]}}]}]}
+
+
+@contextlib.contextmanager
+def job_workers(kind, concurrency):
+    if kind == 'async':
+        from .pipeline import run_async_worker
+
+        loop = asyncio.new_event_loop()
+        stop = asyncio.Event()
+        thread = threading.Thread(
+            target=loop.run_until_complete, args=(run_async_worker(concurrency, stop),),
+            name='bench-async-worker', daemon=True,
+        )
+        thread.start()
+        try:
+            yield
+        finally:
+            loop.call_soon_threadsafe(stop.set)
+            thread.join()
+            loop.close()
+    else:
+        stop = threading.Event()
+        threads = jobs.start_workers(concurrency, stop, name='bench')
+        try:
+            yield
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+
+def thumbnail_summary(links, upstreams):
+    stored = [size for _, size, _ in scan_store().values()]
+    return {
+        'items': SavedItem.objects.filter(url__in=links, media_url__isnull=False).count(),
+        'files': len(stored),
+        'source_kb': round(sum(map(len, upstreams.images)) / len(upstreams.images) / 1024, 1),
+        'file_kb': round(sum(stored) / len(stored) / 1024, 1) if stored else None,
+    }
+
+
+def drain_jobs(kind, deadline):
+    while time.perf_counter() < deadline:
+        if not Job.objects.filter(kind=kind, status__in=('queued', 'running')).exists():
+            return
+        time.sleep(0.05)
+
+
+def run_ingest(options, rng, upstreams):
+    links = synthetic_links(rng, options['messages'])
+    messages = [(f"wamid.in{i}", f"1555{i % 50:04d}", f"look {url}") for i, url in enumerate(links)]
+    # Meta delivers in small batches and sometimes redelivers; replay a share of them.
+    posts = [messages[i:i + options['batch']] for i in range(0, len(messages), options['batch'])]
+    redeliveries = [post for post in posts if rng.random() < options['redelivery_rate']]
+    posts += redeliveries
+    rng.shuffle(posts)
+
+    posted_at = {}
+
+    def post(client, batch):
+        started = time.perf_counter()
+        sent_at = time.time()
+        response = client.post(
+            '/api/webhook/whatsapp/', data=json.dumps(webhook_payload(batch)), content_type='application/json',
+        )
+        for _, _, text in batch:
+            posted_at.setdefault(text.split()[-1], sent_at)
+        return time.perf_counter() - started, response.status_code
+
+    stages_before = STAGE_SECONDS.totals()
+    # The webhook answers 200 even when processing fails (so Meta doesn't retry forever).
+    webhook_failures_before = STAGE_ERRORS.value(stage='webhook')
+    fallbacks_before = {stage: FALLBACKS.value(stage=stage) for stage in ('scrape', 'ai')}
+    with job_workers(options['worker'], options['workers']):
+        started = time.perf_counter()
+        results, webhook_elapsed = run_parallel(posts, options['concurrency'], post)
+        deadline = started + options['timeout']
+        drain_jobs('process_link', deadline)
+        elapsed = time.perf_counter() - started
+        # The last replies and thumbnails are done after the last item is saved.
+        drain_jobs('send_whatsapp', deadline)
+        drain_jobs('thumbnail', deadline)
+
+    saved = dict(SavedItem.objects.filter(url__in=links).values_list('url', 'created_at'))
+    end_to_end = [created_at.timestamp() - posted_at[url] for url, created_at in saved.items() if url in posted_at]
+    return {
+        'webhook': {
+            **latency_summary([seconds for seconds, _ in results], webhook_elapsed),
+            'errors': sum(1 for _, status in results if status != 200),
+            'failed': STAGE_ERRORS.value(stage='webhook') - webhook_failures_before,
+            'redeliveries': len(redeliveries),
+        },
+        'ingest': {
+            'links': len(links),
+            'saved': len(saved),
+            'complete': len(saved) == len(links),
+            'items_per_sec': round(len(saved) / elapsed, 2) if elapsed else None,
+            'p50_ms': round(percentile(end_to_end, 0.5) * 1000, 1) if end_to_end else None,
+            'p99_ms': round(percentile(end_to_end, 0.99) * 1000, 1) if end_to_end else None,
+            'scrape_fallbacks': FALLBACKS.value(stage='scrape') - fallbacks_before['scrape'],
+            'ai_fallbacks': FALLBACKS.value(stage='ai') - fallbacks_before['ai'],
+            'upstream_requests': dict(upstreams.requests),
+        },
+        'replies': {
+            'queued': OutboundMessage.objects.count(),
+            'sent': OutboundMessage.objects.filter(status='sent').count(),
+            'graph_posts': upstreams.requests['graph'],
+        },
+        'thumbnails': thumbnail_summary(links, upstreams),
+        'stages': stage_breakdown(stages_before, STAGE_SECONDS.totals()),
+    }
+
+
+# --- API phase --------------------------------------------------------------
+
+def seed_items(rng, count, batch_size=1000):
+    item_types = [choice for choice, _ in SavedItem._meta.get_field('item_type').choices]
+    now = timezone.now()
+    for start in range(0, count, batch_size):
+        SavedItem.objects.bulk_create([
+            SavedItem(
+                url=f"http://seed.example/{i}",
+                item_type=rng.choice(item_types),
+                title=' '.join(rng.choice(WORDS) for _ in range(5)).title(),
+                caption=' '.join(rng.choice(WORDS) for _ in range(40)),
+                summary=' '.join(rng.choice(WORDS) for _ in range(20)),
+                category=rng.choice(CATEGORIES),
+                hashtags=rng.sample(WORDS, 3),
+                is_seen=rng.random() < 0.3,
+                updated_at=now,
+            )
+            for i in range(start, min(start + batch_size, count))
+        ])
+    rebuild_facets()
+
+
+def search_query(rng):
+    """A word, two words, or a half-typed word; every seeded item is made of WORDS, so all of them hit."""
+    shape = rng.random()
+    if shape < 0.4:
+        return rng.choice(WORDS)
+    if shape < 0.7:
+        return f"{rng.choice(WORDS)}+{rng.choice(WORDS)}"
+    word = rng.choice(WORDS)
+    return word[:max(3, len(word) // 2)]
+
+
+def api_scenarios(rng, cursor, etag):
+    """name -> (path, headers) generators; each call draws its own parameters."""
+    return {
+        'list': lambda: ('/api/items/', {}),
+        'list_fields': lambda: ('/api/items/?fields=id,title,url,category', {}),
+        'list_filtered': lambda: (f"/api/items/?category={rng.choice(CATEGORIES).replace('&', '%26')}&is_seen=false", {}),
+        'list_not_modified': lambda: ('/api/items/', {'HTTP_IF_NONE_MATCH': etag}),
+        'search': lambda: (f"/api/items/search/?q={search_query(rng)}", {}),
+        'facets': lambda: ('/api/items/facets/', {}),
+        'changes': lambda: (f"/api/items/changes/?since={cursor}", {}),
+    }
+
+
+def run_api(options, rng):
+    seed_started = time.perf_counter()
+    seed_items(rng, options['items'])
+    seed_seconds = time.perf_counter() - seed_started
+
+    first = Client(HTTP_HOST='localhost').get('/api/items/')
+    scenarios = api_scenarios(rng, first['X-Sync-Cursor'], first['ETag'])
+
+    def get(client, request):
+        path, headers = request
+        started = time.perf_counter()
+        response = client.get(path, **headers)
+        seconds = time.perf_counter() - started
+        ok = response.status_code in (200, 304)
+        if ok and path.startswith('/api/items/search/'):
+            # Zero hits means a broken index, and timing those measures nothing.
+            ok = response.json()['count'] > 0
+        return seconds, ok
+
+    results = {'seeded_items': SavedItem.objects.count(), 'seed_seconds': round(seed_seconds, 2)}
+    for name, make_request in scenarios.items():
+        requests = [make_request() for _ in range(options['requests'])]
+        timings, elapsed = run_parallel(requests, options['api_concurrency'], get)
+        results[name] = {
+            **latency_summary([seconds for seconds, _ in timings], elapsed),
+            'errors': sum(1 for _, ok in timings if not ok),
+        }
+    return results
+
+
+# --- Startup ----------------------------------------------------------------
+
+# What a fresh server process does before it can answer: settings, app
+# registry (AppConfig.ready imports the task modules), WSGI handler and URLconf,
+# which imports every view module.
+STARTUP_SCRIPT = '''
+import time
+started = time.perf_counter()
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - started)
+'''
+
+
+def startup_run(importtime=False):
+    """One cold start in a fresh interpreter. Returns (seconds, -X importtime report or '')."""
+    env = dict(os.environ, JOB_WORKER_MODE='external')
+    # No keep-alive thread or workers in the probe process.
+    env.pop('RENDER_EXTERNAL_URL', None)
+    env.pop('WEBSITE_URL', None)
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', STARTUP_SCRIPT]
+    proc = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True)
+    return float(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def import_costs(report, top=10):
+    """Self import time per top-level package (ms) from a -X importtime report, largest first."""
+    costs = {}
+    for line in report.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, _, name = line.split(':', 1)[1].split('|')
+        if not self_us.strip().isdigit():
+            continue  # header
+        package = name.strip().split('.')[0]
+        costs[package] = costs.get(package, 0) + int(self_us)
+    ranked = sorted(costs.items(), key=lambda entry: -entry[1])[:top]
+    return {package: round(us / 1000, 1) for package, us in ranked}
+
+
+def measure_startup(runs):
+    """Cold-start time over `runs` fresh interpreters, plus where the import time goes."""
+    seconds = [startup_run()[0] for _ in range(runs)]
+    _, report = startup_run(importtime=True)
+    return {
+        'runs': runs,
+        'p50_ms': round(percentile(seconds, 0.5) * 1000, 1),
+        'min_ms': round(min(seconds) * 1000, 1),
+        'imports': import_costs(report),
+    }
+
+
+# --- HTML metadata extraction -----------------------------------------------
+
+HTML_PAGE_KB = (64, 256, 1024)
+
+
+def synthetic_page(kb):
+    """A social-post-like page: styles, scripts and card tags in the head, then `kb` of body."""
+    filler = ' '.join(WORDS[i * 7 % len(WORDS)] for i in range(kb * 1024 // 7))
+    head = (
+        "<!DOCTYPE html><html lang='en'><head><meta charset='utf-8'><title>Post</title>"
+        f"<style>{'.c{margin:0;padding:0} ' * 800}</style>"
+        f"<script>window.__config = {json.dumps({'words': WORDS * 40})};</script>"
+        "<meta property='og:title' content='A post about caching &amp; queues'>"
+        f"<meta property='og:description' content='{filler[:280]}'>"
+        "<meta property='og:site_name' content='Bench'>"
+        "<meta property='og:image' content='https://cdn.example/p/1.jpg'>"
+        "<meta property='og:video' content='https://cdn.example/p/1.mp4'>"
+        "<meta property='article:published_time' content='2025-01-02T03:04:05Z'>"
+        "<meta name='twitter:title' content='A post about caching &amp; queues'>"
+        "</head>"
+    )
+    # Real bodies are tag soup, not one long paragraph.
+    blocks = ''.join(
+        f"<div class='post'><a href='/p/{i}'><span>{filler[i:i + 120]}</span></a><img src='/i/{i}.jpg' alt=''></div>"
+        for i in range(0, len(filler), 120)
+    )
+    return (head + f"<body><main>{blocks}</main></body></html>").encode('utf-8')
+
+
+def soup_extract(chunks):
+    """The previous social-layer path: buffer the whole body, decode it, BeautifulSoup it."""
+    from bs4 import BeautifulSoup
+
+    body = b''.join(chunks)
+    soup = BeautifulSoup(body.decode('utf-8'), 'html.parser')
+    found = {
+        'title': soup.find('meta', property='og:title') or soup.find('meta', attrs={'name': 'twitter:title'}),
+        'description': soup.find('meta', property='og:description'),
+    }
+    return {k: v['content'] if v and v.has_attr('content') else None for k, v in found.items()}, len(body)
+
+
+def stream_extract(chunks):
+    meta, read = extract_head_meta(chunks, 'utf-8')
+    return {'title': meta.get('og:title'), 'description': meta.get('og:description')}, read
+
+
+def measure_extractor(func, page, runs):
+    def chunks():
+        # What iter_content hands over: the body as it comes off the socket.
+        return (page[i:i + CHUNK_SIZE] for i in range(0, len(page), CHUNK_SIZE))
+
+    # Don't bill one extractor for collecting the other's garbage.
+    gc.collect()
+    cpu_started = time.process_time()
+    for _ in range(runs):
+        found, read = func(chunks())
+    cpu = (time.process_time() - cpu_started) / runs
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(chunks())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return found, {'bytes_read': read, 'cpu_ms': round(cpu * 1000, 2), 'peak_kb': round(peak / 1024, 1)}
+
+
+def run_html(runs):
+    """Social-layer metadata extraction, streaming head-only parser vs the BeautifulSoup path."""
+    results = {}
+    for kb in HTML_PAGE_KB:
+        page = synthetic_page(kb)
+        soup_found, soup = measure_extractor(soup_extract, page, runs)
+        stream_found, stream = measure_extractor(stream_extract, page, runs)
+        results[f"{kb}kb"] = {
+            'page_bytes': len(page), 'soup': soup, 'stream': stream, 'same_result': soup_found == stream_found,
+        }
+    return results
+
+
+# --- Entry point and baselines ----------------------------------------------
+
+def run_benchmark(options):
+    """Run the selected phases and return the results dict."""
+    rng = random.Random(options['seed'])
+    upstreams = FakeUpstreams(options['seed'], options['upstream_latency'], options['wall_rate'], options['page_kb'])
+    results = {
+        'meta': {
+            'version': RESULTS_VERSION,
+            'when': datetime.now().astimezone().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': connection.vendor,
+            'options': options,
+        },
+    }
+    if options['startup_runs']:
+        results['startup'] = measure_startup(options['startup_runs'])
+    workdir = tempfile.mkdtemp(prefix='htt-bench-')
+    try:
+        with fake_upstream_server(upstreams) as proxy_url, bench_environment(options, proxy_url, workdir) as gemini:
+            if options['messages']:
+                results.update(run_ingest(options, rng, upstreams))
+                results['ingest']['gemini_calls'] = gemini.calls
+                results['peak_rss_mb'] = {'ingest': peak_rss_mb()}
+            if options['items']:
+                results['api'] = run_api(options, rng)
+                results.setdefault('peak_rss_mb', {})['api'] = peak_rss_mb()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    # Last, since the BeautifulSoup trees would inflate the other phases' peak RSS.
+    if options['html_runs']:
+        results['html'] = run_html(options['html_runs'])
+    return results
+
+
+def comparable_metrics(results, prefix=''):
+    """Flatten to {dotted.name: (value, higher_is_better)} for the metrics worth comparing."""
+    metrics = {}
+    for key, value in results.items():
+        if key == 'meta':
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(comparable_metrics(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and value is not None:
+            if key.endswith('_ms') or name.startswith('peak_rss_mb'):
+                metrics[name] = (value, False)
+            elif key in ('rps', 'items_per_sec'):
+                # Rates only: counts (items saved, messages sent) scale with --messages/--items.
+                metrics[name] = (value, True)
+    return metrics
+
+
+def compare(baseline, current, tolerance):
+    """Rows of (metric, baseline, current, change, regressed) for metrics present in both."""
+    before = comparable_metrics(baseline)
+    rows = []
+    for name, (value, higher_is_better) in comparable_metrics(current).items():
+        if name not in before or not before[name][0]:
+            continue
+        old = before[name][0]
+        change = (value - old) / old
+        worse = -change if higher_is_better else change
+        rows.append((name, old, value, change, worse > tolerance))
+    return rows
@@ -0,0 +1,135 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CacheEntry
+from .observability import CACHE_REQUESTS
+
+_MISSING = object()
+
+PURGE_INTERVAL = 3600
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU with optional per-entry TTL.
+    Used as the in-memory tier in front of DB-backed stores.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store `value` for `ttl` seconds (default: the cache's ttl; None: no expiry). ttl <= 0 stores nothing."""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            self.delete(key)
+            return
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    """
+    In-process LRU in front of the CacheEntry table. Values must be JSON-serializable.
+    The LRU absorbs hot keys; the table survives restarts and is shared by every process.
+    """
+
+    def __init__(self, namespace, maxsize=1024):
+        self.namespace = namespace
+        self.lru = LRUCache(maxsize=maxsize)
+        self._last_purge = time.monotonic()
+
+    @staticmethod
+    def db_key(key):
+        if len(key) <= 255:
+            return key
+        return 'sha1:' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        value = self.lru.get(key, _MISSING)
+        if value is not _MISSING:
+            CACHE_REQUESTS.inc(cache=self.namespace, result='lru')
+            return value
+
+        entry = (
+            CacheEntry.objects
+            .filter(namespace=self.namespace, key=self.db_key(key))
+            .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()))
+            .values('value', 'expires_at')
+            .first()
+        )
+        if entry is None:
+            CACHE_REQUESTS.inc(cache=self.namespace, result='miss')
+            return None
+
+        CACHE_REQUESTS.inc(cache=self.namespace, result='db')
+        ttl = None
+        if entry['expires_at'] is not None:
+            ttl = (entry['expires_at'] - timezone.now()).total_seconds()
+        self.lru.set(key, entry['value'], ttl=ttl)
+        return entry['value']
+
+    def set(self, key, value, ttl=None):
+        """Store `value` for `ttl` seconds, or without expiry when ttl is None. ttl <= 0 stores nothing."""
+        if ttl is not None and ttl <= 0:
+            self.delete(key)
+            return
+        self.lru.set(key, value, ttl=ttl)
+        expires_at = timezone.now() + timedelta(seconds=ttl) if ttl is not None else None
+        CacheEntry.objects.update_or_create(
+            namespace=self.namespace, key=self.db_key(key),
+            defaults={'value': value, 'expires_at': expires_at},
+        )
+
+        if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            self.purge_expired()
+
+    def delete(self, key):
+        self.lru.delete(key)
+        CacheEntry.objects.filter(namespace=self.namespace, key=self.db_key(key)).delete()
+
+    def purge_expired(self):
+        deleted, _ = CacheEntry.objects.filter(
+            namespace=self.namespace, expires_at__lte=timezone.now()
+        ).delete()
+        return deleted
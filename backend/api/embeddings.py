@@ -0,0 +1,248 @@
+"""
+Item embeddings and the in-memory vector index behind semantic search and
+related items.
+
+Vectors are L2-normalized float32, stored on SavedItem.embedding as raw bytes.
+The backend is pluggable (EMBEDDING_BACKEND); the default hashing model needs
+no network and no training. The index is a NumPy matrix searched brute force:
+at a few thousand items one matrix-vector product is well under a millisecond,
+so an IVF layer would only cost recall. It is kept current incrementally from
+the delta-sync feed (see sync.py), which also picks up items embedded by other
+processes and drops deleted ones.
+
+NumPy is imported where it is used: every process imports this module via the
+views, but only semantic search, related items and embedding need it.
+"""
+import logging
+import re
+import threading
+import zlib
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .resilience import guarded
+from .sync import CursorExpired, changes_since
+
+logger = logging.getLogger(__name__)
+
+# Fields that feed an item's embedding, most descriptive first.
+EMBEDDED_FIELDS = ('title', 'category', 'summary', 'hashtags', 'caption')
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+class HashingEmbedder:
+    """
+    Offline embedding: signed feature hashing of words and character n-grams,
+    with sublinear term frequency. N-grams let "glute" meet "glutes" and
+    "workout" meet "workouts"; no vocabulary to fit or store.
+    """
+    name = 'hashing'
+
+    def __init__(self, dim=512, ngram_range=(3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def features(self, text):
+        for word in TOKEN_RE.findall(text.lower()):
+            yield 'w:' + word
+            padded = f'<{word}>'
+            low, high = self.ngram_range
+            for n in range(low, high + 1):
+                for i in range(len(padded) - n + 1):
+                    yield padded[i:i + n]
+
+    def embed(self, texts):
+        import numpy as np
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in self.features(text or ''):
+                h = zlib.crc32(feature.encode('utf-8'))
+                counts[h] = counts.get(h, 0) + 1
+            for h, count in counts.items():
+                sign = 1.0 if h & 0x80000000 else -1.0
+                vectors[row, h % self.dim] += sign * (1.0 + np.log(count))
+        return normalize(vectors)
+
+
+class GeminiEmbedder:
+    """Gemini text embeddings. Better recall on paraphrases, but needs the API (and its rate budget)."""
+    name = 'gemini'
+
+    def __init__(self, model='text-embedding-004', dim=768):
+        self.model = model
+        self.dim = dim
+
+    def embed(self, texts):
+        import numpy as np
+        from .utils import get_client
+        with guarded('gemini'):
+            response = get_client().models.embed_content(model=self.model, contents=list(texts))
+        return normalize(np.array([e.values for e in response.embeddings], dtype=np.float32))
+
+
+def normalize(vectors):
+    import numpy as np
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                backend = import_string(settings.EMBEDDING_BACKEND)
+                _embedder = backend(dim=settings.EMBEDDING_DIM)
+    return _embedder
+
+
+def item_text(fields):
+    """Text for an item given a dict (or object) carrying EMBEDDED_FIELDS."""
+    get = fields.get if isinstance(fields, dict) else lambda name: getattr(fields, name, None)
+    parts = []
+    for name in EMBEDDED_FIELDS:
+        value = get(name)
+        if not value:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(str(v).lstrip('#') for v in value)
+        parts.append(str(value))
+    return '\n'.join(parts)
+
+
+def to_blob(vector):
+    import numpy as np
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def from_blob(blob):
+    import numpy as np
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def embed_item(fields):
+    """Embedding blob for one item, or None if the backend fails (the item saves without one)."""
+    try:
+        return to_blob(get_embedder().embed([item_text(fields)])[0])
+    except Exception as e:
+        logger.warning("Embedding failed: %s", e)
+        return None
+
+
+def embed_query(text):
+    return get_embedder().embed([text])[0]
+
+
+class VectorIndex:
+    """Thread-safe id -> vector matrix with brute-force cosine top-k."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = None         # int64 array, created with the matrix by the first upsert
+        self._matrix = None
+        self._positions = {}     # item id -> row
+        self._cursor = None
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _reset(self):
+        self._ids = None
+        self._matrix = None
+        self._positions = {}
+        self._cursor = None
+
+    def _upsert(self, rows):
+        """Insert or replace [(item_id, vector)], appending all new rows with one copy."""
+        import numpy as np
+        new_ids, new_vectors = [], []
+        for item_id, vector in rows:
+            if self._matrix is None:
+                self._ids = np.zeros(0, dtype=np.int64)
+                self._matrix = np.empty((0, vector.shape[0]), dtype=np.float32)
+            if self._matrix.shape[1] != vector.shape[0]:
+                # Stored with a different backend/dimension; skip until re-embedded.
+                continue
+            row = self._positions.get(item_id)
+            if row is not None:
+                self._matrix[row] = vector
+                continue
+            self._positions[item_id] = len(self._ids) + len(new_ids)
+            new_ids.append(item_id)
+            new_vectors.append(vector)
+        if new_ids:
+            self._ids = np.concatenate([self._ids, np.array(new_ids, dtype=np.int64)])
+            self._matrix = np.vstack([self._matrix, np.stack(new_vectors)])
+
+    def _remove(self, item_id):
+        row = self._positions.pop(item_id, None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        if row != last:
+            # Move the last row into the hole so removal stays O(dim).
+            moved = int(self._ids[last])
+            self._ids[row] = moved
+            self._matrix[row] = self._matrix[last]
+            self._positions[moved] = row
+        self._ids = self._ids[:last]
+        self._matrix = self._matrix[:last]
+
+    def refresh(self):
+        """Apply everything saved or deleted since the last refresh (the first call loads the table)."""
+        with self._lock:
+            while True:
+                try:
+                    changed, deleted, cursor, has_more = changes_since(
+                        self._cursor, settings.EMBEDDING_LOAD_BATCH, ('id', 'embedding'),
+                    )
+                except CursorExpired:
+                    self._reset()
+                    continue
+                for item_id in deleted:
+                    self._remove(item_id)
+                for row in changed:
+                    if not row['embedding']:
+                        self._remove(row['id'])
+                self._upsert([
+                    (row['id'], from_blob(row['embedding'])) for row in changed if row['embedding']
+                ])
+                self._cursor = cursor
+                if not has_more:
+                    break
+
+    def search(self, vector, k=10, exclude=()):
+        """[(item_id, score)] best first, cosine similarity."""
+        import numpy as np
+        self.refresh()
+        with self._lock:
+            if self._matrix is None or not len(self._ids) or self._matrix.shape[1] != vector.shape[0]:
+                return []
+            scores = self._matrix @ vector
+            ids = self._ids.copy()
+        if exclude:
+            keep = ~np.isin(ids, list(exclude))
+            scores, ids = scores[keep], ids[keep]
+        k = min(k, len(ids))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def vector(self, item_id):
+        self.refresh()
+        with self._lock:
+            row = self._positions.get(item_id)
+            return None if row is None else self._matrix[row].copy()
+
+
+vector_index = VectorIndex()
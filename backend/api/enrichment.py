@@ -0,0 +1,244 @@
+"""
+Batched Gemini enrichment.
+
+Links waiting for the AI stage are collected for a short window (or until a
+batch fills up) and sent as one structured-output request that returns a JSON
+array. Results are cached by a hash of everything the prompt is built from,
+and concurrent identical requests share a single in-flight call.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .cache import TieredCache
+from .observability import FALLBACKS, stage
+from .resilience import guarded
+from .utils import (
+    CATEGORIES, MODEL_NAME, ai_fallback, build_ai_prompt, canonicalize_url,
+    get_client, get_url_type, normalize_ai_output,
+)
+
+logger = logging.getLogger(__name__)
+
+ai_cache = TieredCache('ai', maxsize=settings.AI_CACHE_LRU_SIZE)
+
+BATCH_RESPONSE_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': {
+            'id': {'type': 'INTEGER'},
+            'title': {'type': 'STRING'},
+            'category': {'type': 'STRING'},
+            'summary': {'type': 'STRING'},
+            'hashtags': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        },
+        'required': ['id', 'title', 'category', 'summary', 'hashtags'],
+    },
+}
+
+
+def content_key(url, scraped_data):
+    """
+    Hash of what the LLM actually gets to see: the prompt carries the URL and
+    platform next to the scraped data, and the output depends on them (titles
+    inferred from the slug, platform hashtags), so two URLs with the same
+    scraped text don't share a result. The URL is canonicalized, so tracking
+    parameters still hit the cache.
+    """
+    basis = {
+        'url': canonicalize_url(url),
+        'platform': get_url_type(url),
+        # Provenance ('source') doesn't change what the model sees.
+        'scraped': {k: v for k, v in scraped_data.items() if k != 'source'},
+    }
+    raw = json.dumps(basis, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def build_batch_prompt(batch):
+    items = [
+        {
+            'id': i,
+            'url': url,
+            'platform': get_url_type(url),
+            'status': scraped_data.get('status'),
+            'scraped_data': scraped_data,
+        }
+        for i, (url, scraped_data) in enumerate(batch)
+    ]
+    return f"""
+    You are an expert Content Curator. Transform EACH of the following items into a premium entry.
+
+    ITEMS (JSON): {json.dumps(items, default=str)}
+
+    YOUR MISSION, for every item:
+    Even if the scraped data is sparse or restricted (e.g., login wall), you MUST generate high-quality metadata.
+    1. **Title**: Professional and descriptive. If restricted, infer from the URL slug/username (e.g., "Post by @username on <platform>").
+    2. **Category**: Select the MOST ACCURATE from: {CATEGORIES}. DO NOT default to 'Other' if you can infer context from the URL.
+    3. **Summary**: Insightful summary (max 30 words). If you can't see the content, mention it's a save from its platform and infer its likely topic from the URL.
+    4. **Hashtags**: 3-5 niche tags.
+
+    **OUTPUT REQUIREMENT**:
+    Return a JSON array with exactly one object per item, carrying the item's "id".
+    DO NOT include any explanatory text, markdown formatting blocks, or emojis.
+    """
+
+
+def generate_one(url, scraped_data):
+    """Single-item request, same prompt as before batching. Raises on LLM failure."""
+    with stage('gemini_request', result='single'), guarded('gemini'):
+        response = get_client().models.generate_content(
+            model=MODEL_NAME,
+            contents=build_ai_prompt(url, scraped_data),
+            config={'response_mime_type': 'application/json'}
+        )
+    logger.debug("Raw AI response: %s", response.text)
+    return normalize_ai_output(json.loads(response.text), url, scraped_data)
+
+
+def generate_batch(batch):
+    """
+    Enrich a list of (url, scraped_data) in one request. Returns a list aligned
+    with the input; entries the model skipped are None.
+    """
+    with stage('gemini_request', result='batch'), guarded('gemini'):
+        response = get_client().models.generate_content(
+            model=MODEL_NAME,
+            contents=build_batch_prompt(batch),
+            config={
+                'response_mime_type': 'application/json',
+                'response_schema': BATCH_RESPONSE_SCHEMA,
+            }
+        )
+    logger.debug("Raw AI batch response: %s", response.text)
+    results = [None] * len(batch)
+    for entry in json.loads(response.text):
+        index = entry.get('id') if isinstance(entry, dict) else None
+        if isinstance(index, int) and 0 <= index < len(batch) and results[index] is None:
+            url, scraped_data = batch[index]
+            results[index] = normalize_ai_output(entry, url, scraped_data)
+    return results
+
+
+class AIBatcher:
+    """Collects enrichment requests and flushes them to Gemini in batches."""
+
+    def __init__(self, max_batch, window, concurrency):
+        self.max_batch = max_batch
+        self.window = window
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = []          # [(key, url, scraped_data)]
+        self._in_flight = {}        # key -> Future, shared by identical requests
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ai-batch')
+        self._flusher = None
+
+    def submit(self, url, scraped_data):
+        """Returns a Future resolving to the AI metadata dict. Never raises through the future."""
+        key = content_key(url, scraped_data)
+        cached = ai_cache.get(key)
+        if cached is not None:
+            logger.debug("AI cache hit for %s", url)
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self._in_flight[key] = future
+            self._pending.append((key, url, scraped_data))
+            self._ensure_flusher()
+            self._wakeup.notify()
+        return future
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name='ai-batcher', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                # Give the batch a short window to fill up, unless it already has.
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        resolved = set()
+        try:
+            items = [(url, scraped_data) for _, url, scraped_data in batch]
+            if len(items) == 1:
+                results = [self._safe_one(*items[0])]
+            else:
+                try:
+                    results = generate_batch(items)
+                except Exception as e:
+                    # The LLM itself is failing; don't multiply the load with per-item retries.
+                    logger.error("Gemini batch of %s failed: %s", len(items), e)
+                    results = [None] * len(items)
+                else:
+                    # Anything the batch dropped gets one individual attempt.
+                    results = [
+                        result if result is not None else self._safe_one(url, scraped_data)
+                        for result, (url, scraped_data) in zip(results, items)
+                    ]
+
+            for (key, url, _), result in zip(batch, results):
+                self._resolve(key, url, result)
+                resolved.add(key)
+        except Exception:
+            logger.exception("Gemini batch of %s crashed", len(batch))
+        finally:
+            # Whatever went wrong, nobody may be left waiting on a key that stays in flight.
+            for key, url, _ in batch:
+                if key not in resolved:
+                    self._resolve(key, url, None)
+            close_old_connections()
+
+    def _safe_one(self, url, scraped_data):
+        try:
+            return generate_one(url, scraped_data)
+        except Exception as e:
+            logger.error("Gemini request failed: %s", e, extra={'url': url})
+            return None
+
+    def _resolve(self, key, url, result):
+        if result is None:
+            FALLBACKS.inc(stage='ai')
+            result = ai_fallback(url)
+        else:
+            # Only genuine model output is worth remembering.
+            try:
+                ai_cache.set(key, result, ttl=settings.AI_CACHE_TTL)
+            except Exception as e:
+                logger.warning("AI cache write failed: %s", e)
+        with self._lock:
+            future = self._in_flight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+
+ai_batcher = AIBatcher(
+    max_batch=settings.AI_BATCH_SIZE,
+    window=settings.AI_BATCH_WINDOW,
+    concurrency=settings.AI_BATCH_CONCURRENCY,
+)
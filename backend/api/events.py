@@ -0,0 +1,188 @@
+"""
+Server-Sent Events for item changes (/api/items/events/).
+
+Each stream is a delta-sync client (see sync.py) that gets woken up instead of
+polling: saves and deletes in this process wake it as soon as they commit, and
+one watcher thread per process polls the collection version so changes made
+by other processes (an external `run_worker`, another gunicorn worker) arrive
+within SSE_POLL_INTERVAL. No broker needed; the database is the fan-out.
+
+The event id is the sync cursor, so a reconnecting EventSource resumes from
+Last-Event-ID without missing anything.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .serializers import LIST_FIELDS, serialize_rows
+from .sync import CursorExpired, changes_since, collection_version, current_cursor
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeBroadcaster:
+    """Wakes every open stream in this process when the collection may have changed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._generation = 0
+        self._async_waiters = set()     # {(loop, asyncio.Event)}
+        self._watcher = None
+
+    def notify(self):
+        with self._lock:
+            self._generation += 1
+            self._condition.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def wait(self, generation, timeout):
+        """Block until notified after `generation`, or the timeout passes. Returns the new generation."""
+        self.ensure_watcher()
+        with self._lock:
+            self._condition.wait_for(lambda: self._generation != generation, timeout)
+            return self._generation
+
+    def subscribe(self):
+        """Register an asyncio.Event for the running loop; pass it to unsubscribe() when done."""
+        self.ensure_watcher()
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._async_waiters.add(waiter)
+        return waiter
+
+    def unsubscribe(self, waiter):
+        with self._lock:
+            self._async_waiters.discard(waiter)
+
+    def ensure_watcher(self):
+        with self._lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, name='sse-watcher', daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        """Poll the (cheap) collection version and wake the streams when it moves."""
+        last = None
+        while True:
+            try:
+                version = collection_version()
+                if last is not None and version != last:
+                    self.notify()
+                last = version
+            except Exception as e:
+                logger.warning("SSE watcher error: %s", e)
+            finally:
+                close_old_connections()
+            time.sleep(settings.SSE_POLL_INTERVAL)
+
+
+broadcaster = ChangeBroadcaster()
+
+
+def notify_change():
+    """Wake the streams once the current transaction (if any) commits."""
+    transaction.on_commit(broadcaster.notify)
+
+
+def format_event(event, data=None, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    if data is not None:
+        lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def read_changes(cursor):
+    """
+    One step of the stream: (event_text or None, next_cursor, has_more).
+    `event_text` is a ready-to-send 'changes' event, or a 'reset' event when
+    the cursor has expired (next_cursor is then None).
+    """
+    try:
+        changed, deleted, cursor, has_more = changes_since(cursor, settings.CHANGES_PAGE_SIZE, LIST_FIELDS)
+    except CursorExpired:
+        return format_event('reset', {'detail': CursorExpired.default_detail}), None, False
+    finally:
+        close_old_connections()
+    if not changed and not deleted:
+        return None, cursor, False
+    data = {'changed': serialize_rows(changed, LIST_FIELDS), 'deleted': deleted}
+    return format_event('changes', data, event_id=cursor), cursor, has_more
+
+
+def start_cursor(cursor):
+    if cursor:
+        return cursor
+    try:
+        return current_cursor(collection_version())
+    finally:
+        close_old_connections()
+
+
+def event_stream(cursor):
+    """Blocking stream for WSGI servers: holds a worker thread, so it is capped at SSE_MAX_STREAM_SECONDS."""
+    deadline = time.monotonic() + settings.SSE_MAX_STREAM_SECONDS
+    cursor = start_cursor(cursor)
+    yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+    last_write = time.monotonic()
+    generation = broadcaster.generation()
+    while time.monotonic() < deadline:
+        event, cursor, has_more = read_changes(cursor)
+        if event:
+            yield event
+            last_write = time.monotonic()
+        if cursor is None:
+            return
+        if has_more:
+            continue
+        if time.monotonic() - last_write >= settings.SSE_HEARTBEAT_SECONDS:
+            # An id-only message keeps proxies from idling us out and moves Last-Event-ID forward.
+            yield format_event(None, event_id=cursor)
+            last_write = time.monotonic()
+        generation = broadcaster.wait(generation, settings.SSE_HEARTBEAT_SECONDS)
+
+
+async def aevent_stream(cursor):
+    """Async twin of event_stream for ASGI servers, where an open stream costs no thread."""
+    deadline = time.monotonic() + settings.SSE_MAX_STREAM_SECONDS
+    cursor = await sync_to_async(start_cursor)(cursor)
+    yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+    last_write = time.monotonic()
+    waiter = broadcaster.subscribe()
+    _, woken = waiter
+    try:
+        while time.monotonic() < deadline:
+            woken.clear()
+            event, cursor, has_more = await sync_to_async(read_changes)(cursor)
+            if event:
+                yield event
+                last_write = time.monotonic()
+            if cursor is None:
+                return
+            if has_more:
+                continue
+            if time.monotonic() - last_write >= settings.SSE_HEARTBEAT_SECONDS:
+                yield format_event(None, event_id=cursor)
+                last_write = time.monotonic()
+            try:
+                await asyncio.wait_for(woken.wait(), settings.SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        broadcaster.unsubscribe(waiter)
@@ -0,0 +1,122 @@
+"""
+Streaming collection export: JSONL, CSV or Markdown, optionally gzipped.
+
+Rows come from a server-side `.iterator(chunk_size=...)` over `.values()`, are
+formatted one chunk at a time and handed to a StreamingHttpResponse, so
+memory stays flat however many items there are.
+
+Under ASGI a StreamingHttpResponse given a plain generator drains it into a
+list before sending anything; aexport_stream hands the same generator over
+one chunk per thread hop instead.
+"""
+import csv
+import io
+import itertools
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .serializers import ALL_FIELDS, serialize_rows
+
+FORMATS = {
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'md': ('text/markdown; charset=utf-8', 'md'),
+}
+
+
+def chunks(queryset, fields, chunk_size):
+    """Serialized rows in lists of chunk_size, read with a server-side cursor."""
+    rows = queryset.values(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield serialize_rows(chunk, fields)
+
+
+def jsonl_lines(queryset, chunk_size):
+    for chunk in chunks(queryset, ALL_FIELDS, chunk_size):
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in chunk)
+
+
+def csv_lines(queryset, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ALL_FIELDS)
+    for chunk in chunks(queryset, ALL_FIELDS, chunk_size):
+        for row in chunk:
+            writer.writerow([
+                ' '.join(value) if isinstance(value, list) else value
+                for value in (row[name] for name in ALL_FIELDS)
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header alone, for an empty collection.
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def md_escape(text):
+    return (text or '').replace('[', '\\[').replace(']', '\\]').replace('\n', ' ').strip()
+
+
+def markdown_lines(queryset, chunk_size):
+    fields = ('title', 'url', 'category', 'summary', 'hashtags', 'created_at')
+    yield '# Hack the Thread collection\n\n'
+    for chunk in chunks(queryset, fields, chunk_size):
+        parts = []
+        for row in chunk:
+            parts.append(f"- [{md_escape(row['title']) or row['url']}]({row['url']})")
+            details = ' · '.join(filter(None, [row['category'], (row['created_at'] or '')[:10]]))
+            if details:
+                parts.append(f"  *{details}*")
+            if row['summary']:
+                parts.append(f"  {md_escape(row['summary'])}")
+            if row['hashtags']:
+                parts.append('  ' + ' '.join(f"#{str(tag).lstrip('#')}" for tag in row['hashtags']))
+            parts.append('')
+        yield '\n'.join(parts) + '\n'
+
+
+WRITERS = {'jsonl': jsonl_lines, 'csv': csv_lines, 'md': markdown_lines}
+
+
+def gzipped(pieces):
+    """Compress a stream of text pieces into gzip members as they arrive."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for piece in pieces:
+        data = compressor.compress(piece.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(queryset, fmt, gzip=False):
+    """Bytes generator for a StreamingHttpResponse."""
+    pieces = WRITERS[fmt](queryset.order_by('id'), settings.EXPORT_CHUNK_SIZE)
+    if gzip:
+        return gzipped(pieces)
+    return (piece.encode('utf-8') for piece in pieces)
+
+
+async def aexport_stream(queryset, fmt, gzip=False):
+    """
+    Async twin of export_stream for ASGI servers. Each piece (one chunk of rows)
+    is produced on Django's thread-sensitive sync thread, so the DB cursor
+    always stays on the thread that opened it.
+    """
+    pieces = export_stream(queryset, fmt, gzip=gzip)
+    next_piece = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            piece = await next_piece(pieces, None)
+            if piece is None:
+                return
+            yield piece
+    finally:
+        # Also runs when the client goes away mid-download: release the DB cursor.
+        await sync_to_async(pieces.close, thread_sensitive=True)()
@@ -0,0 +1,221 @@
+"""
+Precomputed facet counts for the sidebar filters.
+
+FacetCount holds one counter per (category, item_type, is_seen) cell and
+Hashtag one per tag, alongside the normalized item <-> hashtag table. Saves and
+deletes adjust them through signals (the state an item was loaded with is
+remembered at post_init, so updates are applied as a diff); bulk writers call
+apply_changes() themselves. A periodic rebuild recomputes everything from
+SavedItem to heal any drift from writes that bypass both, e.g. raw SQL.
+"""
+import logging
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .jobs import periodic_job
+from .models import FacetCount, Hashtag, SavedItem
+
+logger = logging.getLogger(__name__)
+
+# Fields an item's facet state is computed from.
+FACET_FIELDS = ('category', 'item_type', 'is_seen', 'hashtags')
+
+ItemTag = SavedItem.tags.through
+
+
+def normalize_tag(tag):
+    name = str(tag).strip().lstrip('#').strip().lower()[:100]
+    return name or None
+
+
+def normalize_tags(tags):
+    if not isinstance(tags, (list, tuple)):
+        return frozenset()
+    return frozenset(filter(None, (normalize_tag(tag) for tag in tags)))
+
+
+def item_state(item):
+    """(category, item_type, is_seen, tags) as counted, or None if the instance was loaded partially."""
+    deferred = item.get_deferred_fields()
+    if any(name in deferred for name in FACET_FIELDS):
+        return None
+    return (item.category or '', item.item_type, bool(item.is_seen), normalize_tags(item.hashtags))
+
+
+def remember_state(item):
+    item._facet_state = item_state(item) if item.pk else None
+
+
+def _bump(cell, delta):
+    category, item_type, is_seen = cell
+    cells = FacetCount.objects.filter(category=category, item_type=item_type, is_seen=is_seen)
+    if not cells.update(count=F('count') + delta):
+        FacetCount.objects.bulk_create(
+            [FacetCount(category=category, item_type=item_type, is_seen=is_seen)], ignore_conflicts=True,
+        )
+        cells.update(count=F('count') + delta)
+
+
+def apply_changes(changes):
+    """
+    Apply [(item_id, old_state, new_state)] to the counters and the hashtag links.
+    old_state None = created, new_state None = deleted (its links are gone with it).
+    """
+    cells = Counter()
+    tag_deltas = Counter()
+    links_added = []
+    links_removed = []
+    for item_id, old, new in changes:
+        if old == new:
+            continue
+        if old is not None:
+            cells[old[:3]] -= 1
+        if new is not None:
+            cells[new[:3]] += 1
+        old_tags = old[3] if old is not None else frozenset()
+        new_tags = new[3] if new is not None else frozenset()
+        for name in new_tags - old_tags:
+            tag_deltas[name] += 1
+            links_added.append((item_id, name))
+        for name in old_tags - new_tags:
+            tag_deltas[name] -= 1
+            if new is not None:
+                links_removed.append((item_id, name))
+
+    with transaction.atomic():
+        for cell, delta in cells.items():
+            if delta:
+                _bump(cell, delta)
+        if not tag_deltas:
+            return
+
+        names = list(tag_deltas)
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in names], ignore_conflicts=True)
+        ids = dict(Hashtag.objects.filter(name__in=names).values_list('name', 'id'))
+        ItemTag.objects.bulk_create(
+            [ItemTag(saveditem_id=item_id, hashtag_id=ids[name]) for item_id, name in links_added],
+            ignore_conflicts=True,
+        )
+        for item_id, name in links_removed:
+            ItemTag.objects.filter(saveditem_id=item_id, hashtag_id=ids[name]).delete()
+
+        by_delta = defaultdict(list)
+        for name, delta in tag_deltas.items():
+            if delta:
+                by_delta[delta].append(ids[name])
+        for delta, tag_ids in by_delta.items():
+            Hashtag.objects.filter(id__in=tag_ids).update(item_count=F('item_count') + delta)
+
+
+def record_saved(item, created):
+    old = None if created else getattr(item, '_facet_state', None)
+    new = item_state(item)
+    if new is None or (old is None and not created):
+        # Partially loaded instance: we can't tell what changed. The periodic rebuild will catch it.
+        remember_state(item)
+        return
+    apply_changes([(item.pk, old, new)])
+    item._facet_state = new
+
+
+def record_deleted(item):
+    old = getattr(item, '_facet_state', None)
+    if old is not None:
+        apply_changes([(item.pk, old, None)])
+
+
+def record_bulk_updated(items):
+    """For bulk_update callers: apply the diff since each instance was loaded."""
+    changes = []
+    for item in items:
+        old, new = getattr(item, '_facet_state', None), item_state(item)
+        if old is not None and new is not None:
+            changes.append((item.pk, old, new))
+            item._facet_state = new
+    apply_changes(changes)
+
+
+def record_bulk_created(urls):
+    """For bulk_create callers (which may not get primary keys back): count the rows saved under `urls`."""
+    changes = [
+        (item.pk, None, item_state(item))
+        for item in SavedItem.objects.filter(url__in=urls).only('id', *FACET_FIELDS)
+    ]
+    apply_changes(changes)
+
+
+def rebuild_facets():
+    """Recompute every counter and hashtag link from SavedItem."""
+    with transaction.atomic():
+        cells = Counter()
+        links = []
+        for item_id, category, item_type, is_seen, hashtags in (
+            SavedItem.objects.values_list('id', *FACET_FIELDS).iterator(chunk_size=2000)
+        ):
+            cells[(category or '', item_type, bool(is_seen))] += 1
+            links.extend((item_id, name) for name in normalize_tags(hashtags))
+
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create([
+            FacetCount(category=category, item_type=item_type, is_seen=is_seen, count=count)
+            for (category, item_type, is_seen), count in cells.items()
+        ])
+
+        names = {name for _, name in links}
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in names], ignore_conflicts=True)
+        ids = dict(Hashtag.objects.filter(name__in=names).values_list('name', 'id'))
+        ItemTag.objects.all().delete()
+        ItemTag.objects.bulk_create(
+            [ItemTag(saveditem_id=item_id, hashtag_id=ids[name]) for item_id, name in links],
+            batch_size=2000,
+        )
+        counts = ItemTag.objects.filter(hashtag_id=OuterRef('pk')).values('hashtag_id').annotate(n=Count('*')).values('n')
+        Hashtag.objects.update(item_count=Coalesce(Subquery(counts), Value(0)))
+    return sum(cells.values()), len(names)
+
+
+@periodic_job('rebuild_facets', settings.FACETS_REBUILD_INTERVAL)
+def rebuild_facets_job():
+    items, tags = rebuild_facets()
+    logger.info("Facets rebuilt", extra={'items': items, 'hashtags': tags})
+
+
+def facet_counts(filters, hashtag_limit):
+    """
+    Sidebar counts from the precomputed cells. Each facet honours the filters on
+    the *other* dimensions (category, item_type, is_seen), so the numbers show
+    what picking a value would return. Hashtag counts are collection-wide.
+    """
+    cells = list(FacetCount.objects.filter(count__gt=0).values_list('category', 'item_type', 'is_seen', 'count'))
+
+    def matches(cell, skip):
+        category, item_type, is_seen, _ = cell
+        return all([
+            skip == 'category' or 'category' not in filters or category == filters['category'],
+            skip == 'item_type' or 'item_type' not in filters or item_type == filters['item_type'],
+            skip == 'is_seen' or 'is_seen' not in filters or is_seen == filters['is_seen'],
+        ])
+
+    def facet(index, name):
+        counts = Counter()
+        for cell in cells:
+            if matches(cell, name):
+                counts[cell[index]] += cell[3]
+        # Uncategorized items are stored under ''; report them as null like the items themselves.
+        return [
+            {'value': None if value == '' else value, 'count': count}
+            for value, count in counts.most_common()
+        ]
+
+    hashtags = Hashtag.objects.filter(item_count__gt=0).order_by('-item_count', 'name')[:hashtag_limit]
+    return {
+        'total': sum(cell[3] for cell in cells if matches(cell, None)),
+        'category': facet(0, 'category'),
+        'item_type': facet(1, 'item_type'),
+        'is_seen': facet(2, 'is_seen'),
+        'hashtags': [{'value': tag.name, 'count': tag.item_count} for tag in hashtags],
+    }
@@ -0,0 +1,96 @@
+"""
+Streaming extraction of the OpenGraph / Twitter card tags in a page's <head>.
+
+The social scrape layer only needs a handful of <meta> tags. HeadMetaParser is
+fed the response body chunk by chunk as it arrives and reports when it has seen
+the end of the head (</head> or <body>), so the caller can stop downloading
+there; SOCIAL_HEAD_MAX_BYTES bounds pages that never close it. Nothing past
+the head is read, decoded or kept in memory.
+"""
+import codecs
+from html.parser import HTMLParser
+
+from django.conf import settings
+
+CHUNK_SIZE = 16 * 1024
+
+# <meta property=...> / <meta name=...> keys worth keeping.
+META_KEYS = frozenset({
+    'og:title', 'og:description', 'og:site_name', 'og:type', 'og:url',
+    'og:image', 'og:image:secure_url', 'og:video', 'og:video:url', 'og:video:secure_url',
+    'twitter:title', 'twitter:description', 'twitter:image', 'twitter:image:src', 'twitter:player:stream',
+    'article:published_time', 'description',
+})
+
+
+def content_charset(content_type):
+    """The charset parameter of a Content-Type header, if any."""
+    for param in (content_type or '').split(';')[1:]:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            return value.strip().strip('"\'') or None
+    return None
+
+
+def incremental_decoder(encoding):
+    try:
+        factory = codecs.getincrementaldecoder(encoding or 'utf-8')
+    except LookupError:
+        factory = codecs.getincrementaldecoder('utf-8')
+    return factory(errors='replace')
+
+
+class HeadMetaParser(HTMLParser):
+    """Collects META_KEYS from the head; feed_bytes() returns True once reading more is pointless."""
+
+    def __init__(self, encoding=None, max_bytes=None):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self.done = False
+        self.bytes_read = 0
+        self.max_bytes = settings.SOCIAL_HEAD_MAX_BYTES if max_bytes is None else max_bytes
+        self._decoder = incremental_decoder(encoding)
+
+    def feed_bytes(self, chunk):
+        if not self.done:
+            self.bytes_read += len(chunk)
+            self.feed(self._decoder.decode(chunk))
+            if self.bytes_read >= self.max_bytes:
+                self.done = True
+        return self.done
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'meta':
+            attrs = dict(attrs)
+            key = (attrs.get('property') or attrs.get('name') or '').strip().lower()
+            # First occurrence wins, like soup.find().
+            if key in META_KEYS and key not in self.meta and attrs.get('content') is not None:
+                self.meta[key] = attrs['content']
+        elif tag == 'body':
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == 'head':
+            self.done = True
+
+
+def extract_head_meta(chunks, encoding=None, max_bytes=None):
+    """Parse byte chunks until the head is over. Returns (meta, bytes read)."""
+    parser = HeadMetaParser(encoding, max_bytes)
+    for chunk in chunks:
+        if parser.feed_bytes(chunk):
+            break
+    parser.close()
+    return parser.meta, parser.bytes_read
+
+
+async def aextract_head_meta(chunks, encoding=None, max_bytes=None):
+    """extract_head_meta over an async iterator of byte chunks."""
+    parser = HeadMetaParser(encoding, max_bytes)
+    async for chunk in chunks:
+        if parser.feed_bytes(chunk):
+            break
+    parser.close()
+    return parser.meta, parser.bytes_read
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+# Upstreams we talk to constantly get their own keep-alive pool; everything
+# else (arbitrary origins being scraped) shares a default one.
+POOLED_HOSTS = ('graph.facebook.com', 'r.jina.ai', 'vxtwitter.com')
+
+_session = None
+_session_lock = threading.Lock()
+
+# event loop -> {host: httpx.AsyncClient}. Async clients are bound to the loop that created them.
+_async_clients = {}
+
+
+def get_session():
+    """
+    Shared requests.Session for the sync code paths. urllib3 keeps one
+    connection pool per host inside it, so repeat calls skip TCP+TLS setup.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.HTTP_POOL_HOSTS,
+                    pool_maxsize=settings.HTTP_POOL_SIZE,
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def _pool_key(url):
+    host = urlparse(url).hostname or ''
+    return host if host in POOLED_HOSTS else '*'
+
+
+def get_async_client(url):
+    """Pooled keep-alive httpx client for the host of `url`, on the running event loop."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    key = _pool_key(url)
+    client = clients.get(key)
+    if client is None or client.is_closed:
+        import httpx  # Only the async worker needs it; keep it off the startup path.
+
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_POOL_SIZE,
+            max_keepalive_connections=settings.HTTP_POOL_SIZE,
+        )
+        client = httpx.AsyncClient(limits=limits, follow_redirects=True)
+        clients[key] = client
+    return client
+
+
+async def aclose_clients():
+    """Close every async client owned by the running loop (call on shutdown)."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
@@ -0,0 +1,59 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .cache import LRUCache
+from .models import ProcessedMessage
+
+# Message IDs seen by this process. Checked before touching the DB.
+_recent_ids = LRUCache(maxsize=settings.IDEMPOTENCY_LRU_SIZE, ttl=settings.IDEMPOTENCY_TTL_SECONDS)
+
+_purge_lock = threading.Lock()
+_last_purge = 0.0
+
+
+def claim_message(message_id):
+    """
+    Record a Meta message ID. Returns True the first time an ID is seen and
+    False for every redelivery, across processes and restarts.
+    """
+    if not message_id:
+        # Nothing to dedupe on; treat as new.
+        return True
+
+    if message_id in _recent_ids:
+        return False
+
+    try:
+        with transaction.atomic():
+            ProcessedMessage.objects.create(message_id=message_id)
+    except IntegrityError:
+        _recent_ids.set(message_id, True)
+        return False
+
+    # Only remember it locally once the claim is durable; if the webhook
+    # rolls back, Meta's retry must be processed again.
+    transaction.on_commit(lambda: _recent_ids.set(message_id, True))
+    purge_expired_messages()
+    return True
+
+
+def purge_expired_messages(force=False):
+    """Drop message IDs older than the TTL, at most once per purge interval per process."""
+    global _last_purge
+    now = time.monotonic()
+    if not force and now - _last_purge < settings.IDEMPOTENCY_PURGE_INTERVAL:
+        return 0
+
+    with _purge_lock:
+        if not force and now - _last_purge < settings.IDEMPOTENCY_PURGE_INTERVAL:
+            return 0
+        _last_purge = now
+
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    deleted, _ = ProcessedMessage.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,262 @@
+"""
+Bulk import of links from bookmark exports and chat histories.
+
+URLs are streamed from the file, deduped against SavedItem in chunks, run
+through the same scrape -> AI stages as the webhook on a bounded thread pool
+(the AI stage still batches through api.enrichment), and written with
+bulk_create, then queued for thumbnails. Already-saved URLs are skipped, so
+re-running the same file resumes where an interrupted import stopped.
+"""
+import csv
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.db import close_old_connections, transaction
+
+from .events import broadcaster
+from .facets import record_bulk_created
+from .models import SavedItem
+from .observability import stage
+from .resilience import circuit_retry_at
+from .tasks import build_item
+from .thumbnails import queue_thumbnails
+from .utils import get_url_type, process_with_ai, scrape_metadata
+
+logger = logging.getLogger(__name__)
+
+URL_RE = re.compile(r'https?://[^\s<>"\']+')
+# Trailing punctuation that belongs to the surrounding sentence, not the URL.
+URL_TRAILING = '.,;:!?)]}\'"'
+
+URL_COLUMNS = ('url', 'link', 'href', 'uri')
+
+FORMATS = ('txt', 'csv', 'jsonl', 'whatsapp')
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    # WhatsApp's "Export chat" is a .txt of "date, time - sender: message" lines,
+    # which the plain-text reader handles the same way.
+    return 'txt'
+
+
+def urls_in(text):
+    for match in URL_RE.findall(text):
+        url = match.rstrip(URL_TRAILING)
+        if url:
+            yield url
+
+
+def read_text(handle):
+    for line in handle:
+        yield from urls_in(line)
+
+
+def read_csv(handle):
+    reader = csv.reader(handle)
+    header = next(reader, None)
+    if header is None:
+        return
+    lowered = [name.strip().lower() for name in header]
+    column = next((lowered.index(name) for name in URL_COLUMNS if name in lowered), None)
+    if column is None:
+        # No recognisable header: the first row is data too, and URLs can sit in any cell.
+        for row in itertools.chain([header], reader):
+            for cell in row:
+                yield from urls_in(cell)
+        return
+    for row in reader:
+        if column < len(row):
+            yield from urls_in(row[column])
+
+
+def read_jsonl(handle):
+    for line in handle:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield from urls_in(line)
+            continue
+        if isinstance(record, str):
+            yield from urls_in(record)
+        elif isinstance(record, dict):
+            value = next((record[name] for name in URL_COLUMNS if record.get(name)), None)
+            if isinstance(value, str):
+                yield from urls_in(value)
+
+
+READERS = {'txt': read_text, 'whatsapp': read_text, 'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def iter_links(path, fmt=None):
+    """Stream URLs from an export file without loading it into memory."""
+    fmt = fmt or detect_format(path)
+    with open(path, encoding='utf-8-sig', errors='replace', newline='') as handle:
+        yield from READERS[fmt](handle)
+
+
+def new_links(urls, chunk_size):
+    """
+    Yield (chunk_stats, [urls to import]) per chunk: duplicates within the file
+    and URLs already in the DB are dropped, with one url__in query per chunk.
+    """
+    seen = set()
+    chunk = []
+
+    def flush():
+        fresh = list(dict.fromkeys(url for url in chunk if url not in seen))
+        existing = set(SavedItem.objects.filter(url__in=fresh).values_list('url', flat=True))
+        seen.update(chunk)
+        result = [url for url in fresh if url not in existing]
+        return {'read': len(chunk), 'duplicates': len(chunk) - len(result)}, result
+
+    for url in urls:
+        chunk.append(url)
+        if len(chunk) >= chunk_size:
+            yield flush()
+            chunk = []
+    if chunk:
+        yield flush()
+
+
+class ImportStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.read = 0
+        self.duplicates = 0
+        self.imported = 0
+        self.restricted = 0
+        self.failed = 0
+        self.scrape_seconds = 0.0
+        self.ai_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_timing(self, scrape_seconds, ai_seconds, restricted):
+        with self._lock:
+            self.scrape_seconds += scrape_seconds
+            self.ai_seconds += ai_seconds
+            self.restricted += int(restricted)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        processed = self.imported + self.failed
+        lines = [
+            f"Read {self.read} URLs: {self.imported} imported, {self.duplicates} duplicates skipped, {self.failed} failed.",
+            f"Elapsed {self.elapsed:.1f}s, {self.rate:.2f} items/s.",
+        ]
+        if processed:
+            lines.append(
+                f"Avg per item: scrape {self.scrape_seconds / processed:.2f}s, AI {self.ai_seconds / processed:.2f}s "
+                f"({self.restricted} restricted scrapes)."
+            )
+        return '\n'.join(lines)
+
+
+def wait_for_ai():
+    """Hold new work while Gemini's circuit is open rather than saving fallback metadata."""
+    retry_at = circuit_retry_at('gemini')
+    while retry_at is not None:
+        time.sleep(max(retry_at - time.time(), 0.5))
+        retry_at = circuit_retry_at('gemini')
+
+
+def enrich(url, stats):
+    """Scrape + AI for one URL, returning (unsaved SavedItem, scraped_data). Runs on the pool."""
+    try:
+        wait_for_ai()
+        started = time.monotonic()
+        scraped_data = scrape_metadata(url)
+        scraped = time.monotonic()
+        ai_data = process_with_ai(url, scraped_data)
+        stats.add_timing(scraped - started, time.monotonic() - scraped, scraped_data.get('status') == 'restricted')
+        return build_item(url, get_url_type(url), scraped_data, ai_data), scraped_data
+    finally:
+        close_old_connections()
+
+
+def run_import(urls, concurrency=8, batch_size=50, chunk_size=500, progress=None, stop_event=None):
+    """
+    Import an iterable of URLs. At most `concurrency` links are in flight, so
+    memory stays flat however large the file is. `progress(stats)` is called
+    after every batch write. Returns ImportStats.
+    """
+    stats = ImportStats()
+    pending = set()
+    batch = []
+
+    def write_batch():
+        if not batch:
+            return
+        with stage('db_write', result='bulk'), transaction.atomic():
+            # The webhook may have saved some of these since new_links() checked;
+            # those were counted when it saved them, so only the rest are ours.
+            urls = [item.url for item, _ in batch]
+            existing = set(SavedItem.objects.filter(url__in=urls).values_list('url', flat=True))
+            fresh = [(item, scraped_data) for item, scraped_data in batch if item.url not in existing]
+            SavedItem.objects.bulk_create([item for item, _ in fresh], ignore_conflicts=True)
+            # bulk_create skips post_save; count the new rows ourselves.
+            fresh_urls = [item.url for item, _ in fresh]
+            record_bulk_created(fresh_urls)
+            ids = dict(SavedItem.objects.filter(url__in=fresh_urls).values_list('url', 'id'))
+            for item, _ in fresh:
+                item.pk = ids.get(item.url)
+            queue_thumbnails([(item, scraped_data) for item, scraped_data in fresh if item.pk])
+        stats.imported += len(fresh)
+        stats.duplicates += len(batch) - len(fresh)
+        batch.clear()
+        broadcaster.notify()
+        if progress:
+            progress(stats)
+
+    def collect(done):
+        for future in done:
+            pending.discard(future)
+            try:
+                batch.append(future.result())
+            except Exception as e:
+                stats.failed += 1
+                logger.warning("Import of %s failed: %s", future.url, e)
+        if len(batch) >= batch_size:
+            write_batch()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='import') as pool:
+        for chunk_stats, links in new_links(urls, chunk_size):
+            stats.read += chunk_stats['read']
+            stats.duplicates += chunk_stats['duplicates']
+            for url in links:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                while len(pending) >= concurrency:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                future = pool.submit(enrich, url, stats)
+                future.url = url
+                pending.add(future)
+            if stop_event is not None and stop_event.is_set():
+                break
+
+        if pending:
+            done, _ = wait(pending)
+            collect(done)
+        write_batch()
+    return stats
@@ -0,0 +1,360 @@
+import functools
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .apps import is_server_process
+from .models import Job
+from .observability import JOB_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# kind -> callable(payload). Populated by @job_handler in api/tasks.py.
+JOB_HANDLERS = {}
+# kind -> coroutine function(payload), preferred by the async worker (api/pipeline.py).
+ASYNC_JOB_HANDLERS = {}
+# kind -> interval in seconds. Populated by @periodic_job.
+PERIODIC_JOBS = {}
+# Short, latency-sensitive kinds that the express workers run ahead of the backlog.
+EXPRESS_KINDS = set()
+
+_in_process_lock = threading.Lock()
+_in_process_started = False
+_periodic_scheduled = False
+
+
+class RetryLater(Exception):
+    """Raised by a handler to put its job back in the queue without using up an attempt."""
+
+    def __init__(self, delay, reason=''):
+        self.delay = max(delay, 0)
+        super().__init__(reason or f"retry in {self.delay:.1f}s")
+
+
+def job_handler(kind, express=False):
+    """
+    Register a function as the handler for jobs of the given kind. Express
+    kinds are also claimed by the JOB_EXPRESS_WORKERS, so they never wait
+    behind a backlog of slow jobs; keep them short.
+    """
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        if express:
+            EXPRESS_KINDS.add(kind)
+        return func
+    return decorator
+
+
+def periodic_job(kind, interval):
+    """
+    Register a no-argument function to run every `interval` seconds. Each kind is
+    a single queued job (held by its dedupe key) that reschedules itself after
+    every run, so exactly one worker across all processes runs it at a time.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def run(payload):
+            try:
+                func()
+            except Exception:
+                # A bad run shouldn't burn attempts and retire the schedule.
+                logger.exception("Periodic job %s failed", kind)
+            raise RetryLater(interval, f"next {kind} run")
+
+        JOB_HANDLERS[kind] = run
+        PERIODIC_JOBS[kind] = interval
+        return func
+    return decorator
+
+
+def schedule_periodic_jobs():
+    """Make sure every periodic job has its queued row. Safe to call from every worker."""
+    global _periodic_scheduled
+    if _periodic_scheduled or not PERIODIC_JOBS:
+        return
+    Job.objects.bulk_create([
+        Job(kind=kind, dedupe_key=f"periodic:{kind}", payload={}, max_attempts=settings.JOB_MAX_ATTEMPTS)
+        for kind in PERIODIC_JOBS
+    ], ignore_conflicts=True)
+    _periodic_scheduled = True
+
+
+def async_job_handler(kind):
+    """Register a coroutine as the async-worker handler for jobs of the given kind."""
+    def decorator(func):
+        ASYNC_JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue_job(kind, payload, delay=0, dedupe_key=None):
+    """Persist a job so any worker can pick it up, even after a restart."""
+    job = Job.objects.create(
+        kind=kind,
+        dedupe_key=dedupe_key,
+        payload=payload,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    ensure_in_process_workers()
+    return job
+
+
+def enqueue_jobs(kind, payloads, delay=0, dedupe_field=None):
+    """
+    Persist several jobs of the same kind in a single INSERT.
+    With dedupe_field, payload[dedupe_field] is claimed as the job's dedupe key:
+    a payload whose key is already held by a pending job is silently dropped,
+    so concurrent callers can never queue the same work twice.
+    """
+    if not payloads:
+        return []
+
+    run_after = timezone.now() + timedelta(seconds=delay)
+    jobs = Job.objects.bulk_create([
+        Job(
+            kind=kind,
+            dedupe_key=f"{kind}:{payload[dedupe_field]}" if dedupe_field else None,
+            payload=payload,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+            run_after=run_after,
+        )
+        for payload in payloads
+    ], ignore_conflicts=bool(dedupe_field))
+    ensure_in_process_workers()
+    return jobs
+
+
+def claim_job(worker_id, kinds=None):
+    """
+    Atomically claim the next runnable job for this worker, of one of `kinds` if given.
+    A job is runnable when it is queued and due, or when a previous worker's
+    lease has expired (the worker died mid-job). The claim is a conditional
+    UPDATE, so two workers racing for the same row can never both win.
+    """
+    now = timezone.now()
+    runnable = (
+        Q(status='queued', run_after__lte=now) |
+        Q(status='running', locked_until__lt=now)
+    )
+    jobs = Job.objects.filter(runnable)
+    if kinds is not None:
+        jobs = jobs.filter(kind__in=kinds)
+    candidates = (
+        jobs
+        .order_by('run_after', 'id')
+        .values_list('id', 'status', 'locked_until')[:10]
+    )
+
+    for job_id, seen_status, seen_lock in candidates:
+        claimed = Job.objects.filter(
+            id=job_id, status=seen_status, locked_until=seen_lock
+        ).update(
+            status='running',
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped so retries never stall for hours."""
+    base = settings.JOB_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return min(base, settings.JOB_RETRY_MAX_SECONDS) * random.uniform(0.5, 1.0)
+
+
+def complete_job(job):
+    Job.objects.filter(id=job.id, locked_by=job.locked_by).update(
+        status='done', dedupe_key=None, locked_by=None, locked_until=None,
+        updated_at=timezone.now()
+    )
+
+
+def fail_job(job, error):
+    """Requeue with backoff, or mark as failed once attempts are exhausted."""
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        updates = {'status': 'failed', 'dedupe_key': None}
+        logger.error("Job %s failed permanently after %s attempts: %s", job, job.attempts, error)
+    else:
+        delay = retry_delay(job.attempts)
+        updates = {'status': 'queued', 'run_after': now + timedelta(seconds=delay)}
+        logger.warning("Job %s failed (attempt %s), retrying in %.1fs: %s", job, job.attempts, delay, error)
+
+    Job.objects.filter(id=job.id, locked_by=job.locked_by).update(
+        locked_by=None, locked_until=None, last_error=str(error)[:2000],
+        updated_at=now, **updates
+    )
+
+
+def check_runnable(job, handlers):
+    """Fail jobs that can't or shouldn't run. Returns True if the job may proceed."""
+    if job.kind not in handlers:
+        fail_job(job, f"No handler registered for job kind '{job.kind}'")
+        return False
+
+    if job.attempts > job.max_attempts:
+        # Reclaimed after its lease expired on the final attempt; don't run it forever.
+        fail_job(job, job.last_error or "Lease expired on final attempt")
+        return False
+    return True
+
+
+def defer_job(job, delay, reason=''):
+    """Requeue after `delay` seconds; the claim that got us here doesn't count as an attempt."""
+    now = timezone.now()
+    logger.info("Job %s deferred for %.1fs: %s", job, delay, reason)
+    Job.objects.filter(id=job.id, locked_by=job.locked_by).update(
+        status='queued', run_after=now + timedelta(seconds=delay),
+        attempts=F('attempts') - 1, locked_by=None, locked_until=None, updated_at=now,
+    )
+
+
+class LeaseKeeper:
+    """
+    Renews the leases of the jobs this process is running, every third of
+    JOB_LEASE_SECONDS, so a handler that runs longer than one lease (a slow
+    scrape followed by a long AI call) isn't reclaimed and run twice. A worker
+    that dies stops renewing, and its jobs are reclaimed once the lease runs out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held = {}     # job id -> locked_by
+        self._thread = None
+
+    @contextmanager
+    def hold(self, job):
+        with self._lock:
+            self._held[job.id] = job.locked_by
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._renew_loop, name='job-leases', daemon=True)
+                self._thread.start()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._held.pop(job.id, None)
+
+    def renew(self):
+        with self._lock:
+            held = list(self._held.items())
+        now = timezone.now()
+        locked_until = now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        for job_id, locked_by in held:
+            Job.objects.filter(id=job_id, locked_by=locked_by, status='running').update(
+                locked_until=locked_until, updated_at=now,
+            )
+
+    def _renew_loop(self):
+        while True:
+            time.sleep(settings.JOB_LEASE_SECONDS / 3)
+            try:
+                self.renew()
+            except Exception as e:
+                logger.warning("Could not renew job leases: %s", e)
+            finally:
+                close_old_connections()
+
+
+leases = LeaseKeeper()
+
+
+def run_job(job):
+    if not check_runnable(job, JOB_HANDLERS):
+        return
+    handler = JOB_HANDLERS[job.kind]
+
+    started = time.perf_counter()
+    try:
+        with leases.hold(job):
+            handler(job.payload)
+    except RetryLater as e:
+        outcome = 'deferred'
+        defer_job(job, e.delay, str(e))
+    except Exception as e:
+        outcome = 'failed'
+        logger.exception("Job %s raised", job)
+        fail_job(job, e)
+    else:
+        outcome = 'done'
+        complete_job(job)
+    JOB_SECONDS.observe(time.perf_counter() - started, kind=job.kind, outcome=outcome)
+
+
+def worker_loop(worker_id, stop_event, kinds=None):
+    """Claim and run jobs (of `kinds`, if given) one at a time until stop_event is set."""
+    try:
+        schedule_periodic_jobs()
+    except Exception as e:
+        logger.error("Worker %s could not schedule periodic jobs: %s", worker_id, e)
+
+    while not stop_event.is_set():
+        job = None
+        try:
+            job = claim_job(worker_id, kinds)
+            if job is not None:
+                run_job(job)
+        except Exception as e:
+            logger.exception("Worker %s error: %s", worker_id, e)
+        finally:
+            # Crucial for long-running threads in Django
+            close_old_connections()
+
+        if job is None:
+            stop_event.wait(settings.JOB_POLL_INTERVAL)
+
+
+def start_workers(concurrency, stop_event, name='worker'):
+    """
+    Start a fixed-size pool of worker threads. The pool size is the hard cap
+    on concurrent scrapes/AI calls, no matter how many jobs are queued. The
+    JOB_EXPRESS_WORKERS started alongside only run EXPRESS_KINDS.
+    """
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    lanes = [(f"{name}-{i}", None) for i in range(concurrency)]
+    if EXPRESS_KINDS:
+        kinds = sorted(EXPRESS_KINDS)
+        lanes += [(f"{name}-express-{i}", kinds) for i in range(settings.JOB_EXPRESS_WORKERS)]
+    threads = []
+    for thread_name, kinds in lanes:
+        thread = threading.Thread(
+            target=worker_loop,
+            args=(f"{prefix}:{thread_name}", stop_event, kinds),
+            name=thread_name,
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def ensure_in_process_workers():
+    """
+    Start the in-process pool once per server process when JOB_WORKER_MODE='inprocess'.
+    Management commands only queue: their workers would claim jobs and then
+    exit with them, leaving them leased until JOB_LEASE_SECONDS ran out.
+    """
+    global _in_process_started
+    if settings.JOB_WORKER_MODE != 'inprocess' or _in_process_started or not is_server_process():
+        return
+
+    with _in_process_lock:
+        if _in_process_started:
+            return
+        _in_process_started = True
+        start_workers(settings.JOB_WORKER_CONCURRENCY, threading.Event(), name='inprocess')
@@ -6,6 +6,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Subsystems each ping asks /api/healthz to have loaded (see views.WARMERS).
+KEEP_ALIVE_WARM = os.environ.get('KEEP_ALIVE_WARM', 'db,ai')
+
 def ping_server():
     """
     Pings the server's own URL to keep it awake on platforms like Render.
@@ -25,9 +28,9 @@ def ping_server():
     if not url.endswith('/'):
         url += '/'
     
-    # Construct a URL that definitely hits the Django app
-    # Targeting 'api/items/' specifically as requested
-    target_url = f"{url}api/items/"
+    # The health check hits the Django app without reading the items table, and
+    # warms the DB connection and Gemini client so the next real request doesn't have to
+    target_url = f"{url}api/healthz?warm={KEEP_ALIVE_WARM}"
 
     try:
         # usage of timeout is good practice
@@ -0,0 +1,161 @@
+import json
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import compare, run_benchmark
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        "Offline benchmark: synthetic webhook bursts through the full ingest pipeline against "
+        "local fake upstreams, then load on the items API. Runs in a scratch database and "
+        "compares against a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        group = parser.add_argument_group('ingest')
+        group.add_argument('--messages', type=int, default=200, help="Links sent through the webhook (0 skips ingest).")
+        group.add_argument('--batch', type=int, default=1, help="Messages per webhook POST.")
+        group.add_argument('--concurrency', type=int, default=8, help="Concurrent webhook POSTs.")
+        group.add_argument('--worker', choices=('thread', 'async'), default='thread', help="Job worker kind.")
+        group.add_argument('--workers', type=int, default=8, help="Worker threads, or jobs in flight for --worker async.")
+        group.add_argument('--redelivery-rate', type=float, default=0.05, help="Share of POSTs Meta 'redelivers'.")
+        group.add_argument('--timeout', type=float, default=300, help="Seconds to wait for the queue to drain.")
+        group.add_argument('--no-write-coalescing', dest='write_coalescing', action='store_false',
+                           help="Save items inline instead of through the single item writer.")
+
+        group = parser.add_argument_group('fake upstreams')
+        group.add_argument('--upstream-latency', type=float, default=0.05, help="Mean Graph/Jina/origin latency (s).")
+        group.add_argument('--ai-latency', type=float, default=0.4, help="Stub Gemini latency per request (s).")
+        group.add_argument('--ai-per-item-latency', type=float, default=0.02, help="Extra stub latency per batched item (s).")
+        group.add_argument('--wall-rate', type=float, default=0.1, help="Share of links behind a login wall.")
+        group.add_argument('--page-kb', type=int, default=100, help="Size of the origin HTML pages.")
+
+        group = parser.add_argument_group('api')
+        group.add_argument('--items', type=int, default=5000, help="Items seeded for the API phase (0 skips it).")
+        group.add_argument('--requests', type=int, default=200, help="Requests per API scenario.")
+        group.add_argument('--api-concurrency', type=int, default=4, help="Concurrent API clients.")
+
+        group = parser.add_argument_group('startup')
+        group.add_argument('--startup-runs', type=int, default=5,
+                           help="Cold starts timed in fresh interpreters (0 skips). "
+                                "--messages 0 --items 0 measures only this.")
+
+        group = parser.add_argument_group('html')
+        group.add_argument('--html-runs', type=int, default=3,
+                           help="Runs per page size of the social-layer metadata extraction comparison (0 skips).")
+
+        group = parser.add_argument_group('results')
+        group.add_argument('--seed', type=int, default=1, help="Seed for the synthetic data.")
+        group.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="Baseline results file.")
+        group.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline.")
+        group.add_argument('--output', default=None, help="Also write this run's results here.")
+        group.add_argument('--tolerance', type=float, default=0.2, help="Relative slowdown flagged as a regression.")
+        group.add_argument('--fail-on-regression', action='store_true', help="Exit non-zero on a regression.")
+
+    def handle(self, *args, **options):
+        bench_options = {
+            name: options[name] for name in (
+                'messages', 'batch', 'concurrency', 'worker', 'workers', 'redelivery_rate', 'timeout', 'write_coalescing',
+                'upstream_latency', 'ai_latency', 'ai_per_item_latency', 'wall_rate', 'page_kb',
+                'items', 'requests', 'api_concurrency', 'startup_runs', 'html_runs', 'seed',
+            )
+        }
+        if options['verbosity'] < 2:
+            # Per-item INFO logging is part of the cost in production, but drowns the report here.
+            logging.getLogger('api').setLevel(logging.WARNING)
+
+        self.stdout.write("Running benchmark...")
+        results = run_benchmark(bench_options)
+        self.report(results)
+
+        baseline_path = Path(options['baseline'])
+        regressions = []
+        if baseline_path.exists() and not options['save_baseline']:
+            baseline = json.loads(baseline_path.read_text())
+            if baseline.get('meta', {}).get('options') != bench_options:
+                self.stdout.write(self.style.WARNING("Baseline was recorded with different options; deltas are indicative only."))
+            regressions = self.report_comparison(compare(baseline, results, options['tolerance']), baseline_path)
+
+        for path in filter(None, [options['output'], baseline_path if options['save_baseline'] else None]):
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f"Results written to {path}")
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"{len(regressions)} metric(s) regressed beyond {options['tolerance']:.0%}.")
+
+    def report(self, results):
+        if 'startup' in results:
+            startup = results['startup']
+            self.stdout.write(
+                f"\nStartup: p50 {startup['p50_ms']} ms, min {startup['min_ms']} ms over {startup['runs']} cold starts; "
+                "imports: " + ', '.join(f"{package} {ms} ms" for package, ms in startup['imports'].items())
+            )
+        if 'html' in results:
+            self.stdout.write("\nHTML metadata extraction (BeautifulSoup -> streaming head-only):")
+            for size, page in results['html'].items():
+                soup, stream = page['soup'], page['stream']
+                self.stdout.write(
+                    f"  {size:>7}  read {soup['bytes_read']:>8} -> {stream['bytes_read']:>7} B  "
+                    f"cpu {soup['cpu_ms']:>8} -> {stream['cpu_ms']:>6} ms  "
+                    f"peak {soup['peak_kb']:>8} -> {stream['peak_kb']:>6} KB"
+                    + ("" if page['same_result'] else self.style.ERROR("  RESULTS DIFFER"))
+                )
+        if 'webhook' in results:
+            webhook, ingest = results['webhook'], results['ingest']
+            self.stdout.write(
+                f"\nWebhook: {webhook['requests']} POSTs, p50 {webhook['p50_ms']} ms, p99 {webhook['p99_ms']} ms, "
+                f"{webhook['rps']} req/s, {webhook['errors']} errors, {webhook['failed']} failed in processing"
+            )
+            status = self.style.SUCCESS('complete') if ingest['complete'] else self.style.ERROR('INCOMPLETE')
+            self.stdout.write(
+                f"Ingest: {ingest['saved']}/{ingest['links']} saved ({status}), {ingest['items_per_sec']} items/s, "
+                f"end-to-end p50 {ingest['p50_ms']} ms, p99 {ingest['p99_ms']} ms; "
+                f"fallbacks: {ingest['scrape_fallbacks']} scrape, {ingest['ai_fallbacks']} AI; "
+                f"{ingest['gemini_calls']} Gemini calls"
+            )
+            replies = results['replies']
+            self.stdout.write(
+                f"Replies: {replies['sent']}/{replies['queued']} sent in {replies['graph_posts']} Graph API messages"
+            )
+            thumbnails = results['thumbnails']
+            self.stdout.write(
+                f"Thumbnails: {thumbnails['items']}/{ingest['saved']} items in {thumbnails['files']} files; "
+                f"{thumbnails['source_kb']} KB JPEG -> {thumbnails['file_kb']} KB WebP"
+            )
+            self.stdout.write("Stages (mean):")
+            for name, stage in results['stages'].items():
+                self.stdout.write(f"  {name:<28} {stage['count']:>6} x {stage['mean_ms']:>9} ms")
+        if 'api' in results:
+            api = results['api']
+            self.stdout.write(f"\nAPI ({api['seeded_items']} items, seeded in {api['seed_seconds']} s):")
+            for name, scenario in api.items():
+                if isinstance(scenario, dict):
+                    self.stdout.write(
+                        f"  {name:<18} p50 {scenario['p50_ms']:>8} ms  p99 {scenario['p99_ms']:>8} ms  "
+                        f"{scenario['rps']:>7} req/s  {scenario['errors']} errors"
+                    )
+        if results.get('peak_rss_mb'):
+            self.stdout.write(
+                "\nPeak RSS: " + ', '.join(f"{phase} {mb} MB" for phase, mb in results['peak_rss_mb'].items())
+            )
+
+    def report_comparison(self, rows, baseline_path):
+        self.stdout.write(f"\nAgainst {baseline_path}:")
+        regressions = []
+        for name, old, new, change, regressed in rows:
+            line = f"  {name:<40} {old:>10} -> {new:>10}  {change:+.1%}"
+            if regressed:
+                regressions.append(name)
+                line = self.style.ERROR(line + "  REGRESSION")
+            self.stdout.write(line)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("No regressions."))
+        return regressions
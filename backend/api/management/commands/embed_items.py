@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.embeddings import EMBEDDED_FIELDS, get_embedder, item_text, to_blob
+from api.models import SavedItem
+
+
+class Command(BaseCommand):
+    help = "Compute embeddings for saved items that don't have one (backfill, or after switching backends)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true', dest='recompute',
+            help="Re-embed every item, not just the ones missing a vector.",
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        queryset = SavedItem.objects.order_by('id')
+        if not options['recompute']:
+            queryset = queryset.filter(embedding__isnull=True)
+
+        embedder = get_embedder()
+        batch_size = options['batch_size']
+        done = 0
+        last_id = 0
+        while True:
+            # Keyset pagination, so rows embedded by this run don't shift the pages.
+            batch = list(queryset.filter(id__gt=last_id).only('id', *EMBEDDED_FIELDS)[:batch_size])
+            if not batch:
+                break
+            vectors = embedder.embed([item_text(item) for item in batch])
+            now = timezone.now()
+            for item, vector in zip(batch, vectors):
+                item.embedding = to_blob(vector)
+                # bulk_update skips auto_now; bump it so the vector index and sync clients see the change.
+                item.updated_at = now
+            SavedItem.objects.bulk_update(batch, ['embedding', 'updated_at'])
+            done += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"Embedded {done} items...")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {done} items embedded with the '{embedder.name}' backend."))
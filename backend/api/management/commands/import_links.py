@@ -0,0 +1,60 @@
+import os
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import FORMATS, iter_links, run_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Import links from a bookmark export or chat history (txt, CSV, JSONL or a WhatsApp "
+        "chat export). URLs already saved are skipped, so an interrupted import can simply be re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import.")
+        parser.add_argument(
+            '--format', choices=FORMATS, default=None,
+            help="Input format. Defaults to guessing from the file extension.",
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help="Links scraped and enriched at the same time.",
+        )
+        parser.add_argument('--batch-size', type=int, default=50, help="Rows per bulk insert.")
+        parser.add_argument('--chunk-size', type=int, default=500, help="URLs per dedupe query.")
+
+    def handle(self, *args, **options):
+        if not os.path.isfile(options['path']):
+            raise CommandError(f"No such file: {options['path']}")
+        urls = iter_links(options['path'], options['format'])
+
+        stop_event = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping: finishing the links in flight and writing what's done...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        def progress(stats):
+            self.stdout.write(
+                f"{stats.imported} imported, {stats.duplicates} skipped, {stats.failed} failed "
+                f"of {stats.read} read ({stats.rate:.2f}/s)"
+            )
+
+        stats = run_import(
+            urls,
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            chunk_size=options['chunk_size'],
+            progress=progress,
+            stop_event=stop_event,
+        )
+        if stop_event.is_set():
+            self.stdout.write(self.style.WARNING("Interrupted; run the same command again to continue."))
+        self.stdout.write(self.style.SUCCESS(stats.report()))
+
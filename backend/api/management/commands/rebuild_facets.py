@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the facet counters and hashtag links from the saved items. They are kept "
+        "up to date on every write and rebuilt daily by the workers; run this after raw SQL edits."
+    )
+
+    def handle(self, *args, **options):
+        items, tags = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt facets for {items} items and {tags} hashtags."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.reenrich import reenrich_due
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-enrich degraded items (AI fallback, login-walled scrapes) that are due, worst first. "
+        "The workers also do this on a schedule; this runs passes now, e.g. to drain a backlog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Items per AI batch.")
+        parser.add_argument(
+            '--max-batches', type=int, default=1,
+            help="Batches to run before stopping (0 = until nothing is due).",
+        )
+
+    def handle(self, *args, **options):
+        batches = 0
+        total_picked = total_improved = 0
+        while not options['max_batches'] or batches < options['max_batches']:
+            picked, improved = reenrich_due(options['batch_size'])
+            if not picked:
+                break
+            batches += 1
+            total_picked += picked
+            total_improved += improved
+            self.stdout.write(f"Batch {batches}: {improved} of {picked} improved")
+        self.stdout.write(self.style.SUCCESS(f"Done: {total_improved} of {total_picked} items improved."))
@@ -0,0 +1,55 @@
+import asyncio
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.jobs import start_workers
+from api.pipeline import run_async_worker
+
+
+class Command(BaseCommand):
+    help = "Run a fixed-size pool of background job workers (scraping + AI + DB)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=None,
+            help="Number of jobs processed at the same time.",
+        )
+        parser.add_argument(
+            '--async', action='store_true', dest='use_async',
+            help="Run jobs on one asyncio event loop instead of a thread pool.",
+        )
+
+    def handle(self, *args, **options):
+        if options['use_async']:
+            concurrency = options['concurrency'] or settings.ASYNC_WORKER_CONCURRENCY
+            self.stdout.write(self.style.SUCCESS(f"Started async job worker ({concurrency} in flight)."))
+            asyncio.run(self.run_async(concurrency))
+            return
+
+        concurrency = options['concurrency'] or settings.JOB_WORKER_CONCURRENCY
+        stop_event = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping workers after their current jobs...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        threads = start_workers(concurrency, stop_event)
+        self.stdout.write(self.style.SUCCESS(f"Started {concurrency} job workers."))
+
+        while not stop_event.is_set():
+            stop_event.wait(1)
+        for thread in threads:
+            thread.join()
+
+    async def run_async(self, concurrency):
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop_event.set)
+        await run_async_worker(concurrency, stop_event)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_processedmessage_job_dedupe_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('namespace', models.CharField(max_length=50)),
+                ('key', models.CharField(max_length=500)),
+                ('value', models.JSONField()),
+                ('expires_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('namespace', 'key'), name='cacheentry_namespace_key_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+import logging
+
+from django.db import migrations, OperationalError
+
+logger = logging.getLogger(__name__)
+
+# No stemming: the dashboard searches as-you-type, and prefix queries ("fitn*")
+# can't match stemmed tokens ("fit").
+SQLITE_FTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS api_saveditem_fts USING fts5(
+        title, summary, caption, category, hashtags,
+        content='api_saveditem', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_saveditem_fts_ai AFTER INSERT ON api_saveditem BEGIN
+        INSERT INTO api_saveditem_fts(rowid, title, summary, caption, category, hashtags)
+        VALUES (new.id, new.title, new.summary, new.caption, new.category, new.hashtags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_saveditem_fts_ad AFTER DELETE ON api_saveditem BEGIN
+        INSERT INTO api_saveditem_fts(api_saveditem_fts, rowid, title, summary, caption, category, hashtags)
+        VALUES ('delete', old.id, old.title, old.summary, old.caption, old.category, old.hashtags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_saveditem_fts_au AFTER UPDATE ON api_saveditem BEGIN
+        INSERT INTO api_saveditem_fts(api_saveditem_fts, rowid, title, summary, caption, category, hashtags)
+        VALUES ('delete', old.id, old.title, old.summary, old.caption, old.category, old.hashtags);
+        INSERT INTO api_saveditem_fts(rowid, title, summary, caption, category, hashtags)
+        VALUES (new.id, new.title, new.summary, new.caption, new.category, new.hashtags);
+    END
+    """,
+    "INSERT INTO api_saveditem_fts(api_saveditem_fts) VALUES ('rebuild')",
+]
+
+SQLITE_FTS_REVERSE = [
+    "DROP TRIGGER IF EXISTS api_saveditem_fts_ai",
+    "DROP TRIGGER IF EXISTS api_saveditem_fts_ad",
+    "DROP TRIGGER IF EXISTS api_saveditem_fts_au",
+    "DROP TABLE IF EXISTS api_saveditem_fts",
+]
+
+POSTGRES_FTS = [
+    """
+    ALTER TABLE api_saveditem ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(category, '') || ' ' || coalesce(hashtags::text, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(summary, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(caption, '')), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS api_saveditem_search_idx ON api_saveditem USING GIN (search_vector)",
+]
+
+POSTGRES_FTS_REVERSE = [
+    "DROP INDEX IF EXISTS api_saveditem_search_idx",
+    "ALTER TABLE api_saveditem DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor)
+        if not statements:
+            # Other backends use the icontains fallback in api/search.py.
+            return
+        try:
+            for sql in statements:
+                schema_editor.execute(sql)
+        except OperationalError as e:
+            # SQLite builds without FTS5 ("no such module: fts5") also fall back
+            # to icontains; any other failure is a real schema error.
+            if 'fts5' not in str(e):
+                raise
+            logger.warning("Full-text index not created: %s", e)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_cacheentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FTS, 'postgresql': POSTGRES_FTS}),
+            run({'sqlite': SQLITE_FTS_REVERSE, 'postgresql': POSTGRES_FTS_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_saveditem_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='saveditem',
+            index=models.Index(fields=['-created_at', '-id'], name='item_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saveditem',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='item_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saveditem',
+            index=models.Index(fields=['item_type', '-created_at', '-id'], name='item_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saveditem',
+            index=models.Index(fields=['is_seen', '-created_at', '-id'], name='item_seen_created_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_saveditem_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='saveditem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # Existing rows haven't changed since they were created.
+        migrations.RunSQL('UPDATE api_saveditem SET updated_at = created_at', migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='saveditem',
+            index=models.Index(fields=['updated_at', 'id'], name='item_updated_idx'),
+        ),
+    ]
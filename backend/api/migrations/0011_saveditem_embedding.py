@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_saveditem_updated_at_deleteditem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saveditem',
+            name='embedding',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:03
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_provenance(apps, schema_editor):
+    """
+    Existing rows predate provenance. The emergency AI fallback left a
+    recognisable summary, and the restricted scrape a recognisable title;
+    anything degraded is made due for re-enrichment right away.
+    """
+    SavedItem = apps.get_model('api', 'SavedItem')
+    now = timezone.now()
+    batch = []
+    for item in SavedItem.objects.only('id', 'title', 'summary', 'category').iterator(chunk_size=500):
+        fallback = bool(item.summary) and item.summary.startswith('A link saved from ')
+        restricted = bool(item.title) and item.title.startswith('Saved ') and item.title.endswith(' Link')
+        quality = 100 - 60 * fallback - 25 * restricted
+        if not item.category or item.category == 'Other':
+            quality -= 10
+        if not item.summary:
+            quality -= 5
+        item.ai_source = 'fallback' if fallback else 'gemini'
+        item.scrape_source = 'restricted' if restricted else None
+        item.quality = max(quality, 0)
+        item.next_enrich_at = now if quality < 80 else None
+        batch.append(item)
+        if len(batch) >= 500:
+            SavedItem.objects.bulk_update(batch, ['ai_source', 'scrape_source', 'quality', 'next_enrich_at'])
+            batch = []
+    if batch:
+        SavedItem.objects.bulk_update(batch, ['ai_source', 'scrape_source', 'quality', 'next_enrich_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_saveditem_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saveditem',
+            name='ai_source',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='saveditem',
+            name='enrich_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='saveditem',
+            name='enriched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='saveditem',
+            name='next_enrich_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='saveditem',
+            name='quality',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='saveditem',
+            name='scrape_source',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.RunPython(backfill_provenance, migrations.RunPython.noop),
+    ]
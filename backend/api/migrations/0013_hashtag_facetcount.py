@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:08
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def backfill_facets(apps, schema_editor):
+    """Count the existing items into the facet cells and link their hashtags."""
+    SavedItem = apps.get_model('api', 'SavedItem')
+    Hashtag = apps.get_model('api', 'Hashtag')
+    FacetCount = apps.get_model('api', 'FacetCount')
+    ItemTag = SavedItem.tags.through
+
+    cells = Counter()
+    tags = Counter()
+    links = []
+    rows = SavedItem.objects.values_list('id', 'category', 'item_type', 'is_seen', 'hashtags')
+    for item_id, category, item_type, is_seen, hashtags in rows.iterator(chunk_size=500):
+        cells[(category or '', item_type, bool(is_seen))] += 1
+        names = set()
+        for tag in hashtags if isinstance(hashtags, list) else []:
+            name = str(tag).strip().lstrip('#').strip().lower()[:100]
+            if name:
+                names.add(name)
+        tags.update(names)
+        links.extend((item_id, name) for name in names)
+
+    FacetCount.objects.bulk_create([
+        FacetCount(category=category, item_type=item_type, is_seen=is_seen, count=count)
+        for (category, item_type, is_seen), count in cells.items()
+    ])
+    Hashtag.objects.bulk_create([Hashtag(name=name, item_count=count) for name, count in tags.items()], batch_size=500)
+    ids = dict(Hashtag.objects.values_list('name', 'id'))
+    ItemTag.objects.bulk_create(
+        [ItemTag(saveditem_id=item_id, hashtag_id=ids[name]) for item_id, name in links], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_saveditem_enrichment_provenance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hashtag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('item_count', models.IntegerField(db_index=True, default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, default='', max_length=100)),
+                ('item_type', models.CharField(max_length=20)),
+                ('is_seen', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'item_type', 'is_seen'), name='facetcount_cell_uniq')],
+            },
+        ),
+        migrations.AddField(
+            model_name='saveditem',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='items', to='api.hashtag'),
+        ),
+        migrations.RunPython(backfill_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+import logging
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+# 0010 and 0012 add columns to api_saveditem, which SQLite does by copying the
+# table into a new one. The copy doesn't carry over the triggers from 0008, so
+# the FTS index stopped following writes; put them back and reindex whatever
+# was saved in the meantime.
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS api_saveditem_fts_ai AFTER INSERT ON api_saveditem BEGIN
+        INSERT INTO api_saveditem_fts(rowid, title, summary, caption, category, hashtags)
+        VALUES (new.id, new.title, new.summary, new.caption, new.category, new.hashtags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_saveditem_fts_ad AFTER DELETE ON api_saveditem BEGIN
+        INSERT INTO api_saveditem_fts(api_saveditem_fts, rowid, title, summary, caption, category, hashtags)
+        VALUES ('delete', old.id, old.title, old.summary, old.caption, old.category, old.hashtags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_saveditem_fts_au AFTER UPDATE ON api_saveditem BEGIN
+        INSERT INTO api_saveditem_fts(api_saveditem_fts, rowid, title, summary, caption, category, hashtags)
+        VALUES ('delete', old.id, old.title, old.summary, old.caption, old.category, old.hashtags);
+        INSERT INTO api_saveditem_fts(rowid, title, summary, caption, category, hashtags)
+        VALUES (new.id, new.title, new.summary, new.caption, new.category, new.hashtags);
+    END
+    """,
+    "INSERT INTO api_saveditem_fts(api_saveditem_fts) VALUES ('rebuild')",
+]
+
+
+def restore_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if 'api_saveditem_fts' not in connection.introspection.table_names(cursor):
+            # 0008 couldn't create the index (no FTS5); search uses icontains.
+            logger.warning("Full-text index missing, triggers not restored")
+            return
+    for sql in SQLITE_TRIGGERS:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_outboundmessage'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# Reindex a row only when an indexed column changes. Marking an item seen,
+# stamping updated_at or saving an embedding used to rewrite its FTS entry too.
+SQLITE_NARROW = [
+    "DROP TRIGGER IF EXISTS api_saveditem_fts_au",
+    """
+    CREATE TRIGGER api_saveditem_fts_au
+    AFTER UPDATE OF title, summary, caption, category, hashtags ON api_saveditem BEGIN
+        INSERT INTO api_saveditem_fts(api_saveditem_fts, rowid, title, summary, caption, category, hashtags)
+        VALUES ('delete', old.id, old.title, old.summary, old.caption, old.category, old.hashtags);
+        INSERT INTO api_saveditem_fts(rowid, title, summary, caption, category, hashtags)
+        VALUES (new.id, new.title, new.summary, new.caption, new.category, new.hashtags);
+    END
+    """,
+]
+
+SQLITE_WIDEN = [
+    "DROP TRIGGER IF EXISTS api_saveditem_fts_au",
+    """
+    CREATE TRIGGER api_saveditem_fts_au AFTER UPDATE ON api_saveditem BEGIN
+        INSERT INTO api_saveditem_fts(api_saveditem_fts, rowid, title, summary, caption, category, hashtags)
+        VALUES ('delete', old.id, old.title, old.summary, old.caption, old.category, old.hashtags);
+        INSERT INTO api_saveditem_fts(rowid, title, summary, caption, category, hashtags)
+        VALUES (new.id, new.title, new.summary, new.caption, new.category, new.hashtags);
+    END
+    """,
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            if 'api_saveditem_fts' not in connection.introspection.table_names(cursor):
+                return  # no FTS5 index to maintain
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_saveditem_search_triggers'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(SQLITE_NARROW), run(SQLITE_WIDEN)),
+    ]
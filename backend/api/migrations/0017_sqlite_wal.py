@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def journal_mode(mode):
+    def operation(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != 'sqlite':
+            return
+        # The journal mode is stored in the database file, so setting it once is
+        # enough; doing it per connection rewrote the file on every manage.py run.
+        # In-memory databases (the test runner's) stay in 'memory' mode.
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={mode}')
+    return operation
+
+
+class Migration(migrations.Migration):
+    # The journal mode can't be changed inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('api', '0016_saveditem_search_update_trigger'),
+    ]
+
+    operations = [
+        migrations.RunPython(journal_mode('WAL'), journal_mode('DELETE')),
+    ]
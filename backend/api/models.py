@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class SavedItem(models.Model):
     URL_TYPE_CHOICES = [
@@ -16,9 +17,159 @@ class SavedItem(models.Model):
     summary = models.TextField(blank=True, null=True)
     category = models.CharField(max_length=100, blank=True, null=True)  # AI generated
     hashtags = models.JSONField(default=list, blank=True)
+    # Normalized, indexed copy of `hashtags`, kept in step by api/facets.py
+    tags = models.ManyToManyField('Hashtag', related_name='items', blank=True)
     media_url = models.URLField(max_length=500, blank=True, null=True)
     is_seen = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save(); queryset.update()/bulk_update() callers must set it themselves.
+    updated_at = models.DateTimeField(auto_now=True)
+    # float32 vector from api.embeddings, for semantic search and related items
+    embedding = models.BinaryField(null=True, editable=False)
+
+    # Enrichment provenance (see api/reenrich.py): which scrape layer and which
+    # AI path produced the metadata, and a 0-100 quality score derived from them.
+    scrape_source = models.CharField(max_length=20, null=True, blank=True)
+    ai_source = models.CharField(max_length=20, null=True, blank=True)
+    quality = models.PositiveSmallIntegerField(null=True, blank=True)
+    enriched_at = models.DateTimeField(null=True, blank=True)
+    enrich_attempts = models.PositiveSmallIntegerField(default=0)
+    # When the re-enrichment scheduler should retry a degraded item; null = nothing to do.
+    next_enrich_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        # Every list query is "filter, newest first": each index serves one filter
+        # plus the (created_at, id) cursor ordering without a sort step.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='item_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='item_category_created_idx'),
+            models.Index(fields=['item_type', '-created_at', '-id'], name='item_type_created_idx'),
+            models.Index(fields=['is_seen', '-created_at', '-id'], name='item_seen_created_idx'),
+            # Delta sync walks (updated_at, id) forward from the client's cursor.
+            models.Index(fields=['updated_at', 'id'], name='item_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title or self.url
+
+
+class Job(models.Model):
+    """A unit of background work, claimed by workers under a time-limited lease."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    # Held while the job is pending/running so the same work can't be queued twice.
+    dedupe_key = models.CharField(max_length=500, unique=True, blank=True, null=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, null=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}#{self.pk} ({self.status})"
+
+
+class ProcessedMessage(models.Model):
+    """Meta message IDs already handled, so webhook redeliveries are dropped early."""
+    message_id = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.message_id
+
+
+class OutboundMessage(models.Model):
+    """A WhatsApp reply waiting in the outbox (api/outbox.py), kept until it is sent or given up on."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to = models.CharField(max_length=32)
+    text = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The sender reads one recipient's pending messages in id order.
+            models.Index(fields=['status', 'to', 'id'], name='outbound_status_to_idx'),
+        ]
+
+    def __str__(self):
+        return f"to {self.to} ({self.status})"
+
+
+class CacheEntry(models.Model):
+    """Persistent tier of api.cache.TieredCache (scrape results, etc.)."""
+    namespace = models.CharField(max_length=50)
+    key = models.CharField(max_length=500)
+    value = models.JSONField()
+    expires_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['namespace', 'key'], name='cacheentry_namespace_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.namespace}:{self.key}"
+
+
+class DeletedItem(models.Model):
+    """Tombstone for a deleted SavedItem, so delta-sync clients learn about deletions."""
+    item_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"deleted #{self.item_id}"
+
+
+class Hashtag(models.Model):
+    """One normalized hashtag, with a maintained count of the items carrying it."""
+    name = models.CharField(max_length=100, unique=True)
+    item_count = models.IntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return f"#{self.name}"
+
+
+class FacetCount(models.Model):
+    """
+    Maintained item count per (category, item_type, is_seen) cell, so sidebar
+    facets are a read of a few dozen rows instead of a table scan.
+    Items without a category are counted under ''.
+    """
+    category = models.CharField(max_length=100, blank=True, default='')
+    item_type = models.CharField(max_length=20)
+    is_seen = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'item_type', 'is_seen'], name='facetcount_cell_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.category or '-'}/{self.item_type}/{'seen' if self.is_seen else 'unseen'}: {self.count}"
@@ -0,0 +1,303 @@
+"""
+Logging formatters and in-process metrics for the ingestion pipeline.
+
+Modules log through `logging.getLogger(__name__)` with structured context in
+`extra={...}`; the formatters here render that context as key=value pairs or
+one JSON object per line (LOG_FORMAT). Payload dumps are logged at DEBUG with
+%-style arguments, so below that level they are never formatted at all.
+
+Metrics are plain thread-safe counters and histograms rendered in the
+Prometheus text format by the /metrics view. `stage()` times one pipeline
+stage (scrape, ai, db_write, whatsapp_send, ...) labelled with its result.
+Every process keeps its own numbers: with several server processes, scrape
+each one, or run a single worker process per metrics target.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else came in through `extra`.
+RESERVED_ATTRS = frozenset(logging.LogRecord('', 0, '', 0, '', None, None).__dict__) | {'message', 'asctime'}
+
+
+def record_context(record):
+    return {k: v for k, v in record.__dict__.items() if k not in RESERVED_ATTRS and not k.startswith('_')}
+
+
+class KeyValueFormatter(logging.Formatter):
+    """`<time> <LEVEL> <logger>: <message> key=value ...` for humans."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        context = record_context(record)
+        if context:
+            line += ' ' + ' '.join(f"{k}={json.dumps(v, default=str, ensure_ascii=False)}" for k, v in context.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for log shippers."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            **record_context(record),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    kind = 'histogram'
+    # Seconds: from an LRU cache hit up to a slow Gemini batch.
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            entry = self._values.get(label_key(self.labelnames, labels))
+            return entry[-1] if entry else 0
+
+    def totals(self):
+        """{label values: (count, sum)} for every series."""
+        with self._lock:
+            return {key: (entry[-1], entry[-2]) for key, entry in self._values.items()}
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(entry) for key, entry in self._values.items()}
+        for key, entry in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, entry):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", format_labels(self.labelnames, key, [('le', format_value(float(bound)))]), cumulative
+            yield f"{self.name}_bucket", format_labels(self.labelnames, key, [('le', '+Inf')]), entry[-1]
+            yield f"{self.name}_sum", format_labels(self.labelnames, key), entry[-2]
+            yield f"{self.name}_count", format_labels(self.labelnames, key), entry[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=Histogram.DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """
+        Register a function computing point-in-time metrics at scrape time. It returns
+        [(name, kind, help, [(labels dict, value)])].
+        """
+        self._collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {format_value(value)}" for name, labels, value in metric.samples())
+        for func in self._collectors:
+            try:
+                families = func()
+            except Exception:
+                logger.exception("Metrics collector %s failed", func.__name__)
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{format_labels(names, tuple(str(labels[n]) for n in names))} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+logger = logging.getLogger(__name__)
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'hackthread_stage_duration_seconds',
+    "Time spent per pipeline stage, by result (scrape layer, AI source, send status...).",
+    ('stage', 'result'),
+)
+STAGE_ERRORS = registry.counter('hackthread_stage_errors_total', "Pipeline stage failures.", ('stage',))
+FALLBACKS = registry.counter(
+    'hackthread_fallbacks_total',
+    "Degraded results: restricted scrapes and emergency AI fallbacks.",
+    ('stage',),
+)
+SCRAPE_BYTES = registry.counter(
+    'hackthread_scrape_bytes_total', "Response body bytes read by the scrape layers.", ('layer',),
+)
+CACHE_REQUESTS = registry.counter(
+    'hackthread_cache_requests_total', "Tiered cache lookups by tier that answered.", ('cache', 'result'),
+)
+WRITE_BATCH_SIZE = registry.histogram(
+    'hackthread_write_batch_items', "SavedItem rows per transaction of the item writer.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+OUTBOX_COALESCED = registry.histogram(
+    'hackthread_outbox_messages_per_send', "Queued replies delivered per WhatsApp message sent.",
+    buckets=(1, 2, 3, 5, 10, 20, 50),
+)
+JOB_SECONDS = registry.histogram(
+    'hackthread_job_duration_seconds', "Job run time (handler plus queue bookkeeping) by outcome.", ('kind', 'outcome'),
+)
+
+
+class stage:
+    """
+    Time a pipeline stage into STAGE_SECONDS:
+
+        with stage('scrape') as timer:
+            data = ...
+            timer.result = data['source']
+
+    The result defaults to "ok". An exception escaping the block is counted in
+    STAGE_ERRORS (and recorded as result="error" unless a result was already
+    set); call timer.error() for failures the block handles itself.
+    """
+
+    def __init__(self, name, result=None):
+        self.name = name
+        self.result = result
+        self.seconds = None
+
+    def error(self, result=None):
+        self.result = result or self.result or 'error'
+        STAGE_ERRORS.inc(stage=self.name)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._started
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.error()
+        STAGE_SECONDS.observe(self.seconds, stage=self.name, result=self.result or 'ok')
+        return False
+
+
+@registry.collector
+def scrape_layer_metrics():
+    """The hedged scraper's own per-layer bookkeeping (see api/scraping.py)."""
+    from .scraping import layer_stats
+
+    snapshot = layer_stats.snapshot()
+    families = {'attempts': [], 'wins': [], 'failures': [], 'latency': []}
+    for key, entry in sorted(snapshot.items()):
+        platform, layer = key.split(':', 1)
+        labels = {'platform': platform, 'layer': layer}
+        for name in ('attempts', 'wins', 'failures'):
+            families[name].append((labels, entry[name]))
+        if entry['latency'] is not None:
+            families['latency'].append((labels, entry['latency']))
+    return [
+        ('hackthread_scrape_layer_attempts_total', 'counter', "Scrape layer starts.", families['attempts']),
+        ('hackthread_scrape_layer_wins_total', 'counter', "Races won by a scrape layer.", families['wins']),
+        ('hackthread_scrape_layer_failures_total', 'counter', "Scrape layer failures.", families['failures']),
+        ('hackthread_scrape_layer_latency_seconds', 'gauge',
+         "Smoothed latency of a scrape layer's winning responses.", families['latency']),
+    ]
+
+
+@registry.collector
+def job_queue_metrics():
+    """Jobs waiting or running, straight from the queue table (shared by all processes)."""
+    from django.db.models import Count
+
+    from .models import Job
+
+    rows = (
+        Job.objects.filter(status__in=('queued', 'running'))
+        .values_list('kind', 'status').annotate(n=Count('id')).order_by('kind', 'status')
+    )
+    return [('hackthread_jobs', 'gauge', "Jobs queued or running, by kind.",
+             [({'kind': kind, 'status': status}, n) for kind, status, n in rows])]
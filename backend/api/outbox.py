@@ -0,0 +1,178 @@
+"""
+Persistent outbox for WhatsApp replies.
+
+Replies are rows in OutboundMessage, queued in the same transaction as the work
+that produced them, and sent by a 'send_whatsapp' job per recipient. The job's
+dedupe key is the phone number, so at most one sender per recipient is queued
+or running: messages go out in the order they were queued. The job waits
+WHATSAPP_OUTBOX_DELAY seconds before its first send, and everything pending for
+the recipient by then (an ack plus "already saved" notes, a batch of saved
+links) is joined into as few WhatsApp messages as the length limit allows.
+Sends are express jobs, so they don't queue behind a backlog of links.
+
+Network errors and 429/5xx answers leave the messages pending and the job is
+retried with the queue's backoff; an open Graph circuit or an exhausted rate
+limit defers it without using up an attempt. A message is given up on after
+WHATSAPP_OUTBOX_MAX_ATTEMPTS failed sends, or at once when Meta rejects it
+with a 4xx. A periodic sweep requeues recipients whose messages were left
+behind, and purges old rows.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .jobs import RetryLater, enqueue_jobs, job_handler, periodic_job
+from .models import Job, OutboundMessage
+from .observability import OUTBOX_COALESCED
+from .resilience import UpstreamUnavailable
+from .utils import send_whatsapp_message
+
+logger = logging.getLogger(__name__)
+
+# Graph API limit on a text message body.
+TEXT_LIMIT = 4096
+SEPARATOR = '\n\n'
+
+
+def queue_messages(messages):
+    """
+    Queue (to, text) replies. Run inside the caller's transaction, they commit
+    (or roll back) together with it.
+    """
+    if not messages:
+        return
+    recipients = dict.fromkeys(to for to, _ in messages)
+    with transaction.atomic():
+        # Hold the recipients' current senders until we commit; see release_if_idle.
+        lock_senders(recipients)
+        OutboundMessage.objects.bulk_create([OutboundMessage(to=to, text=text) for to, text in messages])
+        enqueue_jobs(
+            'send_whatsapp', [{'to': to} for to in recipients],
+            delay=settings.WHATSAPP_OUTBOX_DELAY, dedupe_field='to',
+        )
+
+
+def queue_message(to, text):
+    queue_messages([(to, text)])
+
+
+def coalesce(messages, limit=TEXT_LIMIT):
+    """Join consecutive messages into texts of at most `limit` characters. Yields (text, ids)."""
+    text, ids = '', []
+    for message in messages:
+        body = message.text[:limit]
+        if ids and len(text) + len(SEPARATOR) + len(body) > limit:
+            yield text, ids
+            text, ids = '', []
+        text = f"{text}{SEPARATOR}{body}" if ids else body
+        ids.append(message.id)
+    if ids:
+        yield text, ids
+
+
+def pending_batches(to):
+    """The recipient's pending messages, oldest first, coalesced into sends."""
+    messages = OutboundMessage.objects.filter(to=to, status='pending').order_by('id')[:settings.WHATSAPP_OUTBOX_BATCH]
+    return list(coalesce(messages))
+
+
+def sender_key(to):
+    return f"send_whatsapp:{to}"
+
+
+def lock_senders(recipients):
+    """Lock the recipients' sender jobs (if any) for the rest of the transaction."""
+    keys = sorted(sender_key(to) for to in recipients)
+    list(Job.objects.select_for_update().filter(dedupe_key__in=keys).order_by('dedupe_key').values_list('id'))
+
+
+def release_if_idle(to):
+    """
+    Give up the recipient's dedupe key if nothing is pending. queue_messages
+    and this both lock the sender's row first, so a message queued
+    concurrently either is seen here (its transaction committed before we got
+    the lock) or finds the key free and queues a new sender. On SQLite, where
+    row locks don't exist, the IMMEDIATE transactions serialize them instead.
+    """
+    with transaction.atomic():
+        lock_senders([to])
+        if OutboundMessage.objects.filter(to=to, status='pending').exists():
+            return False
+        Job.objects.filter(dedupe_key=sender_key(to)).update(dedupe_key=None)
+    return True
+
+
+def record_sent(ids, status_code):
+    """Settle a batch after Meta answered without a back-off status."""
+    if status_code is None:
+        give_up(ids, "WhatsApp API credentials missing")
+    elif status_code != 200:
+        # A 4xx won't get better by retrying.
+        give_up(ids, f"Rejected by the Graph API (HTTP {status_code})")
+    else:
+        OutboundMessage.objects.filter(id__in=ids).update(
+            status='sent', sent_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+        OUTBOX_COALESCED.observe(len(ids))
+
+
+def give_up(ids, reason):
+    logger.error("Dropping %s outbound message(s): %s", len(ids), reason)
+    OutboundMessage.objects.filter(id__in=ids).update(
+        status='failed', attempts=F('attempts') + 1, last_error=reason,
+    )
+
+
+def record_failure(ids, error):
+    """
+    Account for a send that raised and return the exception the job should
+    raise: RetryLater when the call was never made, the error itself otherwise.
+    """
+    if isinstance(error, UpstreamUnavailable):
+        return RetryLater(error.retry_at - time.time(), str(error))
+    OutboundMessage.objects.filter(id__in=ids).update(attempts=F('attempts') + 1, last_error=str(error)[:2000])
+    OutboundMessage.objects.filter(id__in=ids, attempts__gte=settings.WHATSAPP_OUTBOX_MAX_ATTEMPTS).update(status='failed')
+    return error
+
+
+@job_handler('send_whatsapp', express=True)
+def send_whatsapp_job(payload):
+    """Send everything pending for one recipient, including messages queued while sending."""
+    to = payload['to']
+    while True:
+        batches = pending_batches(to)
+        if not batches:
+            if release_if_idle(to):
+                return
+            continue
+        for text, ids in batches:
+            try:
+                status_code = send_whatsapp_message(to, text)
+            except Exception as e:
+                raise record_failure(ids, e)
+            record_sent(ids, status_code)
+
+
+@periodic_job('outbox_sweep', settings.WHATSAPP_OUTBOX_SWEEP_INTERVAL)
+def sweep_outbox():
+    """
+    Requeue senders for messages still pending a sweep interval after they were
+    queued (their sender job failed for good), then purge settled messages.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.WHATSAPP_OUTBOX_SWEEP_INTERVAL)
+    recipients = list(
+        OutboundMessage.objects.filter(status='pending', created_at__lt=stale)
+        .values_list('to', flat=True).distinct()
+    )
+    if recipients:
+        logger.info("Outbox: requeueing %s recipient(s) with stale messages", len(recipients))
+        enqueue_jobs('send_whatsapp', [{'to': to} for to in recipients], dedupe_field='to')
+
+    cutoff = now - timedelta(seconds=settings.WHATSAPP_OUTBOX_RETENTION_SECONDS)
+    OutboundMessage.objects.filter(status__in=('sent', 'failed'), created_at__lt=cutoff).delete()
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class SavedItemCursorPagination(CursorPagination):
+    """
+    Newest first, keyed on (created_at, id) so each page is an index range scan
+    no matter how deep the client pages or how big the table grows.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
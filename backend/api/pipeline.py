@@ -0,0 +1,319 @@
+"""
+Async scrape -> AI -> reply pipeline.
+
+Each stage awaits network I/O instead of parking a thread on it, so a single
+worker process can keep hundreds of links in flight. Runs either inside the
+ASGI server (JOB_WORKER_MODE='asgi', see core/asgi.py) or standalone via
+`python manage.py run_worker --async`.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .htmlmeta import CHUNK_SIZE, aextract_head_meta, content_charset
+from .http import aclose_clients, get_async_client
+from .jobs import (
+    ASYNC_JOB_HANDLERS, EXPRESS_KINDS, RetryLater, async_job_handler, check_runnable,
+    claim_job, complete_job, defer_job, fail_job, leases, run_job, schedule_periodic_jobs,
+)
+from .enrichment import ai_batcher
+from .models import SavedItem
+from .observability import FALLBACKS, JOB_SECONDS, SCRAPE_BYTES, stage
+from .outbox import pending_batches, queue_message, record_failure, record_sent, release_if_idle
+from .resilience import aguarded, check_status
+from .scraping import arace_layers
+from .tasks import build_item, defer_while_ai_down, saved_reply_text
+from .thumbnails import queue_thumbnail
+from .utils import (
+    JINA_TIMEOUT, SOCIAL_HEADERS, SOCIAL_TIMEOUT, canonicalize_url,
+    get_url_type, handle_whatsapp_response, jina_reader_url,
+    parse_jina_response, parse_social_meta,
+    restricted_fallback, scrape_cache, scrape_cache_ttl, social_target_url,
+    whatsapp_request,
+)
+from .writer import item_writer
+
+logger = logging.getLogger(__name__)
+
+
+async def ascrape_social_metadata(url, platform, timeout=SOCIAL_TIMEOUT):
+    """Async twin of utils.scrape_social_metadata."""
+    target_url = social_target_url(url, platform)
+    try:
+        logger.debug("Bypassing login wall for %s", platform)
+        async with get_async_client(target_url).stream(
+            'GET', target_url, headers=SOCIAL_HEADERS, timeout=min(timeout, SOCIAL_TIMEOUT)
+        ) as response:
+            if response.status_code == 200:
+                meta, read = await aextract_head_meta(
+                    response.aiter_bytes(CHUNK_SIZE), content_charset(response.headers.get('Content-Type')),
+                )
+                SCRAPE_BYTES.inc(read, layer='social')
+                return parse_social_meta(meta)
+    except Exception as e:
+        logger.warning("Social bypass failed: %s", e, extra={'url': url, 'platform': platform})
+    return None
+
+
+async def ascrape_jina(url, timeout=JINA_TIMEOUT):
+    """Async twin of utils.scrape_jina."""
+    try:
+        jina_url = jina_reader_url(url)
+        logger.debug("Layer 2 attempting Jina: %s", jina_url)
+        async with aguarded('jina'):
+            response = await get_async_client(jina_url).get(
+                jina_url, headers={'X-Return-Format': 'markdown'}, timeout=min(timeout, JINA_TIMEOUT)
+            )
+            check_status('jina', response.status_code)
+        SCRAPE_BYTES.inc(len(response.content), layer='jina')
+        return parse_jina_response(response.status_code, response.text, url)
+    except Exception as e:
+        logger.warning("Jina layer failed: %s", e, extra={'url': url})
+    return None
+
+
+async def ascrape_metadata(url):
+    """Async twin of utils.scrape_metadata, served from the scrape cache when possible."""
+    with stage('scrape') as timer:
+        key = canonicalize_url(url)
+        cached = await sync_to_async(scrape_cache.get)(key)
+        if cached is not None:
+            logger.debug("Scrape cache hit: %s", key)
+            timer.result = 'cache'
+            return cached
+
+        data = await afetch_metadata(url)
+        timer.result = data['source']
+        await sync_to_async(scrape_cache.set)(key, data, ttl=scrape_cache_ttl(url, data))
+    logger.info("Scraped", extra={'url': url, 'layer': data['source'], 'seconds': round(timer.seconds, 3)})
+    return data
+
+
+async def afetch_metadata(url):
+    """Async twin of utils.fetch_metadata. Always returns a dict for the LLM to process."""
+    platform = get_url_type(url)
+    logger.debug("Scraping %s", url)
+
+    layers = {}
+    # Layer 1: Social Bypass
+    if platform in ['instagram', 'x', 'tiktok']:
+        layers['social'] = lambda timeout: ascrape_social_metadata(url, platform, timeout)
+    # Layer 2: Jina Reader
+    layers['jina'] = lambda timeout: ascrape_jina(url, timeout)
+
+    layer, data = await arace_layers(platform, layers)
+    if data:
+        logger.debug("Layer %s won: %s", layer, data['title'])
+        return {**data, 'source': layer}
+
+    # Layer 3: Fallback
+    logger.info("All scrape layers failed, falling back to restricted mode", extra={'url': url})
+    FALLBACKS.inc(stage='scrape')
+    return restricted_fallback(url, platform)
+
+
+async def aprocess_with_ai(url, scraped_data):
+    """Async twin of utils.process_with_ai: awaits the shared batcher instead of blocking on it."""
+    logger.debug("AI input data: %s", scraped_data)
+    with stage('ai') as timer:
+        future = await sync_to_async(ai_batcher.submit)(url, scraped_data)
+        ai_data = await asyncio.wait_for(asyncio.wrap_future(future), settings.AI_RESULT_TIMEOUT)
+        timer.result = ai_data.get('source', 'gemini')
+    return ai_data
+
+
+async def asave_item(url, item_type, scraped_data, ai_data):
+    """Async twin of tasks.save_item: awaits the item writer instead of parking a thread on it."""
+    item = await sync_to_async(build_item, thread_sensitive=False)(url, item_type, scraped_data, ai_data)
+    with stage('db_write') as timer:
+        future = await sync_to_async(item_writer.create)(item)
+        item = await asyncio.wrap_future(future)
+        if item is None:
+            timer.result = 'duplicate'
+            logger.info("Link was saved concurrently, skipping", extra={'url': url})
+            return None
+    logger.info("Saved item", extra={
+        'url': url, 'item_id': item.pk, 'quality': item.quality, 'seconds': round(timer.seconds, 3),
+    })
+    return item
+
+
+async def asend_whatsapp_message(to, text):
+    """Async twin of utils.send_whatsapp_message over the pooled graph.facebook.com client."""
+    request = whatsapp_request(to, text)
+    if request is None:
+        return None
+    url, headers, data = request
+
+    logger.debug("Sending message to %s", to)
+    with stage('whatsapp_send') as timer:
+        async with aguarded('graph'):
+            response = await get_async_client(url).post(url, headers=headers, json=data, timeout=10)
+            timer.result = str(response.status_code)
+            check_status('graph', response.status_code)
+        handle_whatsapp_response(to, response.status_code, response.text)
+    return response.status_code
+
+
+async def aprocess_link(url, from_number):
+    """Async twin of tasks.process_webhook_in_background."""
+    logger.info("Processing link", extra={'url': url})
+
+    if await SavedItem.objects.filter(url=url).aexists():
+        logger.info("Link already saved, skipping", extra={'url': url})
+        return
+
+    await sync_to_async(defer_while_ai_down)()
+
+    scraped_data = await ascrape_metadata(url)
+    ai_data = await aprocess_with_ai(url, scraped_data)
+
+    item = await asave_item(url, get_url_type(url), scraped_data, ai_data)
+    if item is None:
+        return
+    await sync_to_async(queue_thumbnail)(item, scraped_data)
+
+    logger.debug("Queueing reply to %s", from_number)
+    await sync_to_async(queue_message)(from_number, saved_reply_text(item))
+
+
+@async_job_handler('process_link')
+async def process_link_job(payload):
+    await aprocess_link(payload['url'], payload['from_number'])
+
+
+@async_job_handler('send_whatsapp')
+async def send_whatsapp_job(payload):
+    """Async twin of outbox.send_whatsapp_job."""
+    to = payload['to']
+    while True:
+        batches = await sync_to_async(pending_batches)(to)
+        if not batches:
+            if await sync_to_async(release_if_idle)(to):
+                return
+            continue
+        for text, ids in batches:
+            try:
+                status_code = await asend_whatsapp_message(to, text)
+            except Exception as e:
+                raise await sync_to_async(record_failure)(ids, e)
+            await sync_to_async(record_sent)(ids, status_code)
+
+
+async def arun_job(job):
+    handler = ASYNC_JOB_HANDLERS.get(job.kind)
+    if handler is None:
+        # No async version: run the sync handler off the event loop.
+        await sync_to_async(_run_sync_job, thread_sensitive=False)(job)
+        return
+
+    if not await sync_to_async(check_runnable)(job, ASYNC_JOB_HANDLERS):
+        return
+
+    started = time.perf_counter()
+    try:
+        with leases.hold(job):
+            await handler(job.payload)
+    except RetryLater as e:
+        outcome = 'deferred'
+        await sync_to_async(defer_job)(job, e.delay, str(e))
+    except Exception as e:
+        outcome = 'failed'
+        logger.exception("Job %s raised", job)
+        await sync_to_async(fail_job)(job, e)
+    else:
+        outcome = 'done'
+        await sync_to_async(complete_job)(job)
+    JOB_SECONDS.observe(time.perf_counter() - started, kind=job.kind, outcome=outcome)
+
+
+def _run_sync_job(job):
+    try:
+        run_job(job)
+    finally:
+        close_old_connections()
+
+
+def _claim(worker_id, kinds=None):
+    try:
+        return claim_job(worker_id, kinds)
+    finally:
+        close_old_connections()
+
+
+async def run_async_worker(concurrency, stop_event):
+    """
+    Claim jobs and run them as tasks, with at most `concurrency` in flight,
+    plus JOB_EXPRESS_WORKERS slots reserved for EXPRESS_KINDS.
+    Returns once stop_event is set and in-flight jobs have finished.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:async"
+    in_flight = set()
+
+    try:
+        await sync_to_async(schedule_periodic_jobs)()
+    except Exception as e:
+        logger.error("Worker %s could not schedule periodic jobs: %s", worker_id, e)
+
+    async def run(job, slots):
+        try:
+            await arun_job(job)
+        finally:
+            slots.release()
+
+    async def claim_loop(slots, kinds=None):
+        while not stop_event.is_set():
+            await slots.acquire()
+            try:
+                job = await sync_to_async(_claim)(worker_id, kinds)
+            except Exception as e:
+                logger.exception("Worker %s error: %s", worker_id, e)
+                job = None
+
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(stop_event.wait(), settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(run(job, slots))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+    loops = [claim_loop(asyncio.Semaphore(concurrency))]
+    if EXPRESS_KINDS and settings.JOB_EXPRESS_WORKERS:
+        loops.append(claim_loop(asyncio.Semaphore(settings.JOB_EXPRESS_WORKERS), sorted(EXPRESS_KINDS)))
+    await asyncio.gather(*loops)
+
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    await aclose_clients()
+
+
+async def asgi_lifespan(scope, receive, send):
+    """ASGI lifespan handler: runs the async worker alongside the server when JOB_WORKER_MODE='asgi'."""
+    stop_event = asyncio.Event()
+    worker = None
+
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if settings.JOB_WORKER_MODE == 'asgi':
+                worker = asyncio.create_task(
+                    run_async_worker(settings.ASYNC_WORKER_CONCURRENCY, stop_event)
+                )
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            stop_event.set()
+            if worker is not None:
+                await worker
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
@@ -0,0 +1,176 @@
+"""
+Enrichment provenance and the re-enrichment scheduler.
+
+Every item records where its metadata came from (scrape layer, real Gemini
+output or the emergency fallback) and a quality score derived from that.
+Items below REENRICH_QUALITY_THRESHOLD get a next_enrich_at; a periodic job
+picks the worst due items first, re-scrapes them and sends them through the AI
+batcher together. Only results that actually improved rewrite the metadata;
+the rest just record the attempt and back off. Neither touches an item that
+was saved by someone else in the meantime. The budget is REENRICH_BATCH_SIZE
+items per REENRICH_INTERVAL, and a run is skipped while Gemini's circuit is
+open or live links are waiting.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .embeddings import embed_item
+from .enrichment import ai_batcher
+from .jobs import periodic_job
+from .models import Job, SavedItem
+from .observability import stage
+from .resilience import circuit_retry_at
+from .thumbnails import queue_thumbnail
+from .utils import scrape_metadata
+from .writer import item_writer
+
+logger = logging.getLogger(__name__)
+
+# Fields a successful re-enrichment rewrites.
+ENRICHED_FIELDS = ('title', 'caption', 'summary', 'category', 'hashtags')
+PROVENANCE_FIELDS = ('scrape_source', 'ai_source', 'quality', 'enriched_at', 'enrich_attempts', 'next_enrich_at')
+# What an attempt that didn't improve anything records.
+BACKOFF_FIELDS = ('enrich_attempts', 'next_enrich_at')
+
+
+def enrichment_quality(scrape_source, ai_source, category, summary):
+    """0-100. The fallback AI path is the big loss; a login-walled scrape the next one."""
+    score = 100
+    if ai_source == 'fallback':
+        score -= 60
+    if scrape_source == 'restricted':
+        score -= 25
+    if not category or category == 'Other':
+        score -= 10
+    if not summary:
+        score -= 5
+    return max(score, 0)
+
+
+def retry_at(attempts, now=None):
+    """When a degraded item is next worth a try, or None once we've given up on it."""
+    if attempts >= settings.REENRICH_MAX_ATTEMPTS:
+        return None
+    delay = min(settings.REENRICH_RETRY_BASE_SECONDS * 2 ** attempts, settings.REENRICH_RETRY_MAX_SECONDS)
+    return (now or timezone.now()) + timedelta(seconds=delay)
+
+
+def provenance(scraped_data, ai_data, attempts=0, now=None):
+    """Provenance fields for a freshly enriched item."""
+    now = now or timezone.now()
+    scrape_source = scraped_data.get('source') or ('restricted' if scraped_data.get('status') == 'restricted' else None)
+    # Results cached before provenance existed are always real model output.
+    ai_source = ai_data.get('source', 'gemini')
+    quality = enrichment_quality(scrape_source, ai_source, ai_data.get('category'), ai_data.get('summary'))
+    degraded = quality < settings.REENRICH_QUALITY_THRESHOLD
+    return {
+        'scrape_source': scrape_source,
+        'ai_source': ai_source,
+        'quality': quality,
+        'enriched_at': now,
+        'enrich_attempts': attempts,
+        'next_enrich_at': retry_at(attempts, now) if degraded else None,
+    }
+
+
+def due_items(limit, now=None):
+    """Degraded items whose retry time has come, worst first."""
+    return list(
+        SavedItem.objects
+        .filter(next_enrich_at__lte=now or timezone.now())
+        .order_by('quality', 'next_enrich_at')[:limit]
+    )
+
+
+def live_backlog():
+    """New links waiting for a worker take precedence over polishing old ones."""
+    return Job.objects.filter(kind='process_link', status='queued', run_after__lte=timezone.now()).exists()
+
+
+def rescrape(item):
+    try:
+        return scrape_metadata(item.url)
+    finally:
+        close_old_connections()
+
+
+def reenrich_items(items):
+    """
+    Re-scrape and re-enrich `items` as one AI batch and update them in place.
+    Returns how many improved.
+    """
+    if not items:
+        return 0
+
+    # Scrapes are independent network waits; run them side by side.
+    with ThreadPoolExecutor(max_workers=len(items), thread_name_prefix='reenrich') as pool:
+        scraped = list(pool.map(rescrape, items))
+    # Submitting them together lets the batcher send a single request.
+    futures = [ai_batcher.submit(item.url, data) for item, data in zip(items, scraped)]
+
+    now = timezone.now()
+    better, unchanged = [], []
+    versions = {item.pk: item.updated_at for item in items}
+    for item, scraped_data, future in zip(items, scraped, futures):
+        ai_data = future.result(timeout=settings.AI_RESULT_TIMEOUT)
+        attempts = item.enrich_attempts + 1
+        fields = provenance(scraped_data, ai_data, attempts=attempts, now=now)
+        if fields['quality'] > (item.quality or 0):
+            better.append(item)
+            item.title = ai_data.get('title') or scraped_data.get('title')
+            item.caption = scraped_data.get('caption')
+            item.summary = ai_data.get('summary')
+            item.category = ai_data.get('category')
+            item.hashtags = ai_data.get('hashtags')
+            item.embedding = embed_item(item)
+            for name, value in fields.items():
+                setattr(item, name, value)
+            # bulk writes skip auto_now; sync clients and the vector index key off updated_at.
+            item.updated_at = now
+        else:
+            # No better this time: keep what we have and back off. Nothing a client
+            # shows has changed, so updated_at stays put and nobody re-syncs it.
+            unchanged.append(item)
+            item.enrich_attempts = attempts
+            item.next_enrich_at = retry_at(attempts, now)
+
+    # The writer applies the facet changes and wakes the live streams.
+    # Both are conditional on the updated_at read above: an edit made while we
+    # were scraping wins (and has taken the item off the schedule).
+    with stage('db_write', result='bulk'):
+        writes = [
+            item_writer.update(
+                better, ENRICHED_FIELDS + PROVENANCE_FIELDS + ('embedding', 'updated_at'), versions=versions,
+            ),
+            item_writer.update(unchanged, BACKOFF_FIELDS, versions=versions),
+        ]
+        written, _ = [write.result() for write in writes]
+    # A better scrape may have found the preview image the first one missed.
+    for item, scraped_data in zip(items, scraped):
+        queue_thumbnail(item, scraped_data)
+    return len(written)
+
+
+def reenrich_due(limit=None):
+    """One scheduler pass. Returns (picked, improved)."""
+    if circuit_retry_at('gemini') is not None:
+        logger.info("Re-enrichment: Gemini circuit open, skipping this run")
+        return 0, 0
+    if live_backlog():
+        logger.info("Re-enrichment: live links queued, skipping this run")
+        return 0, 0
+    items = due_items(limit or settings.REENRICH_BATCH_SIZE)
+    improved = reenrich_items(items)
+    if items:
+        logger.info("Re-enrichment: %s of %s items improved", improved, len(items))
+    return len(items), improved
+
+
+@periodic_job('reenrich', settings.REENRICH_INTERVAL)
+def reenrich_job():
+    reenrich_due()
@@ -0,0 +1,247 @@
+"""
+Shared rate limiting and circuit breaking for upstream APIs (Gemini, Jina, Graph).
+
+State lives in a small SQLite file next to the app DB rather than in memory,
+so every gunicorn worker and `run_worker` process draws from the same token
+buckets and sees the same open circuits. Each check is a single short
+BEGIN IMMEDIATE transaction.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses that mean "back off", as opposed to a bad request.
+BACKOFF_STATUSES = {429, 500, 502, 503, 504}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS circuits (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    opened_at REAL,
+    probe_started_at REAL
+);
+"""
+
+
+class UpstreamUnavailable(Exception):
+    """The call was not attempted. `retry_at` is a time.time() when it may succeed."""
+
+    def __init__(self, upstream, retry_at):
+        self.upstream = upstream
+        self.retry_at = retry_at
+        super().__init__(f"{upstream} unavailable, retry in {max(retry_at - time.time(), 0):.1f}s")
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    pass
+
+
+class RateLimitedError(UpstreamUnavailable):
+    pass
+
+
+class UpstreamError(Exception):
+    """The upstream answered with a back-off status (429/5xx)."""
+
+    def __init__(self, upstream, status_code):
+        self.upstream = upstream
+        self.status_code = status_code
+        super().__init__(f"{upstream} returned HTTP {status_code}")
+
+
+def check_status(upstream, status_code):
+    """Raise UpstreamError for 429/5xx so the surrounding guard counts it as a failure."""
+    if status_code in BACKOFF_STATUSES:
+        raise UpstreamError(upstream, status_code)
+
+
+_local = threading.local()
+
+
+def _connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(str(settings.RESILIENCE_DB_PATH), timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def _transaction():
+    conn = _connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    else:
+        conn.execute('COMMIT')
+
+
+def take_token(upstream):
+    """Take one token from the upstream's bucket. Returns 0, or seconds until a token is available."""
+    rate, burst = settings.UPSTREAM_RATE_LIMITS[upstream]
+    now = time.time()
+    with _transaction() as conn:
+        row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE name = ?', (upstream,)).fetchone()
+        tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        conn.execute(
+            'INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)',
+            (upstream, tokens, now),
+        )
+    return wait
+
+
+def _load_circuit(conn, upstream):
+    row = conn.execute(
+        'SELECT state, failures, opened_at, probe_started_at FROM circuits WHERE name = ?', (upstream,)
+    ).fetchone()
+    if row is None:
+        return {'state': 'closed', 'failures': 0, 'opened_at': None, 'probe_started_at': None}
+    return dict(zip(('state', 'failures', 'opened_at', 'probe_started_at'), row))
+
+
+def _save_circuit(conn, upstream, circuit):
+    conn.execute(
+        'INSERT OR REPLACE INTO circuits (name, state, failures, opened_at, probe_started_at) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (upstream, circuit['state'], circuit['failures'], circuit['opened_at'], circuit['probe_started_at']),
+    )
+
+
+def circuit_retry_at(upstream):
+    """When an open circuit will let a probe through, or None if calls are allowed now."""
+    now = time.time()
+    with _transaction() as conn:
+        circuit = _load_circuit(conn, upstream)
+    reset = settings.CIRCUIT_RESET_SECONDS
+    if circuit['state'] == 'open' and now < circuit['opened_at'] + reset:
+        return circuit['opened_at'] + reset
+    if circuit['state'] == 'half_open' and now < circuit['probe_started_at'] + reset:
+        return circuit['probe_started_at'] + reset
+    return None
+
+
+def allow_call(upstream):
+    """
+    Circuit check. Closed: allowed. Open: rejected until the reset timeout passes,
+    then exactly one caller is let through as the half-open probe.
+    """
+    now = time.time()
+    reset = settings.CIRCUIT_RESET_SECONDS
+    with _transaction() as conn:
+        circuit = _load_circuit(conn, upstream)
+        if circuit['state'] == 'closed':
+            return
+        started = circuit['opened_at'] if circuit['state'] == 'open' else circuit['probe_started_at']
+        if now < started + reset:
+            raise CircuitOpenError(upstream, started + reset)
+        # Become (or stay) half-open with this caller as the probe. A probe that never
+        # reported back is replaced after another reset timeout.
+        circuit['state'] = 'half_open'
+        circuit['probe_started_at'] = now
+        _save_circuit(conn, upstream, circuit)
+    logger.info("Circuit %s: half-open, sending probe", upstream)
+
+
+def record_success(upstream):
+    with _transaction() as conn:
+        circuit = _load_circuit(conn, upstream)
+        if circuit['state'] != 'closed':
+            logger.info("Circuit %s: closed", upstream)
+        if circuit['state'] != 'closed' or circuit['failures']:
+            _save_circuit(conn, upstream, {
+                'state': 'closed', 'failures': 0, 'opened_at': None, 'probe_started_at': None,
+            })
+
+
+def record_failure(upstream):
+    now = time.time()
+    with _transaction() as conn:
+        circuit = _load_circuit(conn, upstream)
+        circuit['failures'] += 1
+        if circuit['state'] == 'half_open' or circuit['failures'] >= settings.CIRCUIT_FAILURE_THRESHOLD:
+            if circuit['state'] != 'open':
+                logger.warning("Circuit %s: open after %s failures", upstream, circuit['failures'])
+            circuit['state'] = 'open'
+            circuit['opened_at'] = now
+        _save_circuit(conn, upstream, circuit)
+
+
+def before_call(upstream):
+    """Fail fast if the circuit is open; otherwise wait (briefly) for a rate-limit token."""
+    allow_call(upstream)
+    deadline = time.time() + settings.RATE_LIMIT_MAX_WAIT
+    while True:
+        wait = take_token(upstream)
+        if not wait:
+            return
+        if time.time() + wait > deadline:
+            raise RateLimitedError(upstream, time.time() + wait)
+        time.sleep(wait)
+
+
+async def abefore_call(upstream):
+    """
+    Async twin of before_call. The state checks wait on the SQLite lock (up to
+    its 5s timeout), so they run in a thread, and so does the token wait:
+    nothing here blocks the event loop.
+    """
+    await asyncio.to_thread(allow_call, upstream)
+    deadline = time.time() + settings.RATE_LIMIT_MAX_WAIT
+    while True:
+        wait = await asyncio.to_thread(take_token, upstream)
+        if not wait:
+            return
+        if time.time() + wait > deadline:
+            raise RateLimitedError(upstream, time.time() + wait)
+        await asyncio.sleep(wait)
+
+
+@contextmanager
+def guarded(upstream):
+    """
+    Wrap one upstream call. Raises UpstreamUnavailable without calling out when
+    the circuit is open or the budget is exhausted; records the outcome otherwise.
+    """
+    before_call(upstream)
+    try:
+        yield
+    except Exception:
+        record_failure(upstream)
+        raise
+    else:
+        record_success(upstream)
+
+
+@asynccontextmanager
+async def aguarded(upstream):
+    await abefore_call(upstream)
+    try:
+        yield
+    except Exception:
+        await asyncio.to_thread(record_failure, upstream)
+        raise
+    else:
+        await asyncio.to_thread(record_success, upstream)
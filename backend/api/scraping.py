@@ -0,0 +1,228 @@
+"""
+Hedged scraping: race the scrape layers instead of trying them one after another.
+
+The preferred layer starts first; if it hasn't answered within the hedge delay
+(or fails outright) the next layer is started alongside it. The first acceptable
+result wins and the rest are abandoned, all inside one overall deadline. Per
+platform win rate and latency decide which layer goes first next time; an
+abandoned layer neither won nor lost, so it doesn't count.
+
+A thread can't be cancelled, so sync layers are handed a threading.Event that
+is set once the race is decided, and stop at the next point they check it
+(before calling out, between body chunks) instead of running to their timeout.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the latency moving average.
+EWMA_ALPHA = 0.2
+
+
+class LayerStats:
+    """Thread-safe win/latency bookkeeping per (platform, layer)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _entry(self, platform, layer):
+        return self._stats.setdefault((platform, layer), {
+            'attempts': 0, 'wins': 0, 'failures': 0, 'abandoned': 0, 'latency': None,
+        })
+
+    def record(self, platform, layer, latency, won):
+        with self._lock:
+            entry = self._entry(platform, layer)
+            entry['attempts'] += 1
+            if won:
+                entry['wins'] += 1
+                if entry['latency'] is None:
+                    entry['latency'] = latency
+                else:
+                    entry['latency'] += EWMA_ALPHA * (latency - entry['latency'])
+            else:
+                entry['failures'] += 1
+
+    def record_abandoned(self, platform, layer):
+        """
+        The layer was still running when another one won. Not an attempt: a
+        hedge started late would otherwise lose every race it joined, and never
+        get to go first again.
+        """
+        with self._lock:
+            self._entry(platform, layer)['abandoned'] += 1
+
+    def latency(self, platform, layer):
+        with self._lock:
+            entry = self._stats.get((platform, layer))
+            return entry['latency'] if entry else None
+
+    def order(self, platform, layers):
+        """
+        Best layer first: highest (smoothed) win rate, then lowest latency.
+        Layers with no history keep their default position.
+        """
+        def score(indexed):
+            index, layer = indexed
+            entry = self._stats.get((platform, layer))
+            if not entry or not entry['attempts']:
+                return (0.5, index)
+            win_rate = (entry['wins'] + 1) / (entry['attempts'] + 2)
+            return (1 - win_rate, entry['latency'] or index)
+
+        with self._lock:
+            return [layer for _, layer in sorted(enumerate(layers), key=score)]
+
+    def snapshot(self):
+        with self._lock:
+            return {f"{p}:{l}": dict(v) for (p, l), v in self._stats.items()}
+
+
+layer_stats = LayerStats()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.SCRAPE_POOL_SIZE, thread_name_prefix='scrape'
+                )
+    return _executor
+
+
+def hedge_delay(platform, layer):
+    """Start the next layer once this one is running noticeably slower than it usually does."""
+    latency = layer_stats.latency(platform, layer)
+    if latency is None:
+        return settings.SCRAPE_HEDGE_DELAY
+    return max(settings.SCRAPE_HEDGE_MIN_DELAY, min(latency * 1.5, settings.SCRAPE_HEDGE_DELAY))
+
+
+def while_running(chunks, cancelled):
+    """Pass chunks through until `cancelled` (a threading.Event, or None) is set."""
+    for chunk in chunks:
+        if cancelled is not None and cancelled.is_set():
+            return
+        yield chunk
+
+
+def race_layers(platform, layers):
+    """
+    Race scrape layers in threads. `layers` maps name -> callable(timeout, cancelled)
+    returning scraped data or None; `cancelled` is set once the race is decided.
+    Returns (name, data) of the winner, or (None, None).
+    """
+    order = layer_stats.order(platform, list(layers))
+    deadline = time.monotonic() + settings.SCRAPE_DEADLINE
+    cancelled = threading.Event()
+    pending = {}
+    next_hedge = None
+
+    def launch():
+        nonlocal next_hedge
+        name = order.pop(0)
+        started = time.monotonic()
+        future = get_executor().submit(layers[name], max(deadline - started, 0.1), cancelled)
+        pending[future] = (name, started)
+        next_hedge = started + hedge_delay(platform, name)
+
+    try:
+        launch()
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if order:
+                timeout = min(timeout, max(next_hedge - now, 0))
+
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = pending.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    logger.warning("Scrape layer %s failed: %s", name, e, extra={'platform': platform})
+                    data = None
+                layer_stats.record(platform, name, time.monotonic() - started, won=bool(data))
+                if data:
+                    for other, _ in pending.values():
+                        layer_stats.record_abandoned(platform, other)
+                    return name, data
+
+            # Hedge: the running layer is slow, or everything running has already failed.
+            if order and (not pending or time.monotonic() >= next_hedge):
+                launch()
+
+        for name, _ in pending.values():
+            layer_stats.record(platform, name, settings.SCRAPE_DEADLINE, won=False)
+        return None, None
+    finally:
+        # Losers and stragglers stop at their next check; ones still queued never start.
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+
+
+async def arace_layers(platform, layers):
+    """Async twin of race_layers: `layers` maps name -> coroutine function(timeout)."""
+    order = layer_stats.order(platform, list(layers))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.SCRAPE_DEADLINE
+    pending = {}
+    next_hedge = None
+
+    def launch():
+        nonlocal next_hedge
+        name = order.pop(0)
+        started = loop.time()
+        task = asyncio.create_task(layers[name](max(deadline - started, 0.1)))
+        pending[task] = (name, started)
+        next_hedge = started + hedge_delay(platform, name)
+
+    try:
+        launch()
+        while pending:
+            now = loop.time()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if order:
+                timeout = min(timeout, max(next_hedge - now, 0))
+
+            done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name, started = pending.pop(task)
+                try:
+                    data = task.result()
+                except Exception as e:
+                    logger.warning("Scrape layer %s failed: %s", name, e, extra={'platform': platform})
+                    data = None
+                layer_stats.record(platform, name, loop.time() - started, won=bool(data))
+                if data:
+                    for other, _ in pending.values():
+                        layer_stats.record_abandoned(platform, other)
+                    return name, data
+
+            if order and (not pending or loop.time() >= next_hedge):
+                launch()
+
+        for name, _ in pending.values():
+            layer_stats.record(platform, name, settings.SCRAPE_DEADLINE, won=False)
+        return None, None
+    finally:
+        # Losers and stragglers are cancelled, closing their connections.
+        for task in pending:
+            task.cancel()
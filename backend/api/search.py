@@ -0,0 +1,153 @@
+"""
+Full-text search over SavedItem.
+
+SQLite uses the FTS5 table kept in sync by triggers (migrations 0008, 0015,
+0016); Postgres uses the generated, GIN-indexed `search_vector` column. Any
+other backend, SQLite without FTS5, or an FTS5 index that has fallen behind
+the table falls back to icontains filtering.
+"""
+import html
+import logging
+import re
+
+from django.db import DatabaseError, connection
+from django.db.models import Q
+
+from .models import SavedItem
+
+logger = logging.getLogger(__name__)
+
+# Control characters can't appear in stored text, so they are safe temporary
+# highlight markers; the text is HTML-escaped before they become <mark> tags.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+
+def highlight_html(text):
+    if not text:
+        return text
+    return html.escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def fts5_query(terms):
+    # Quote every term so user input can't inject FTS5 syntax; prefix-match the last one as-you-type.
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+class StaleIndex(Exception):
+    pass
+
+
+def _check_sqlite_index(cursor):
+    """
+    Raise StaleIndex if rows are missing from the FTS5 index. It has no content of
+    its own, so `count(*)` on it reads the table; the docsize shadow table holds
+    one row per document actually indexed. A schema change that rebuilds the table
+    drops the triggers, and from then on new items silently never match.
+    """
+    cursor.execute("SELECT count(*) FROM api_saveditem_fts_docsize")
+    indexed = cursor.fetchone()[0]
+    cursor.execute("SELECT count(*) FROM api_saveditem")
+    items = cursor.fetchone()[0]
+    if indexed != items:
+        raise StaleIndex(f"{indexed} of {items} items indexed")
+
+
+def _sqlite_search(terms, limit, offset):
+    match = fts5_query(terms)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM api_saveditem_fts WHERE api_saveditem_fts MATCH %s", [match])
+        total = cursor.fetchone()[0]
+        if not total:
+            # Only misses pay for the check, and a miss is what a stale index looks like.
+            _check_sqlite_index(cursor)
+        cursor.execute(
+            f"""
+            SELECT rowid,
+                   bm25(api_saveditem_fts, 10.0, 4.0, 1.0, 3.0, 3.0) AS score,
+                   highlight(api_saveditem_fts, 0, '{MARK_START}', '{MARK_END}'),
+                   snippet(api_saveditem_fts, -1, '{MARK_START}', '{MARK_END}', '…', 16)
+            FROM api_saveditem_fts
+            WHERE api_saveditem_fts MATCH %s
+            ORDER BY score, rowid DESC
+            LIMIT %s OFFSET %s
+            """,
+            [match, limit, offset],
+        )
+        # bm25() is "lower is better"; flip it so rank reads naturally.
+        hits = [(row[0], -row[1], row[2], row[3]) for row in cursor.fetchall()]
+    return total, hits
+
+
+def _postgres_search(terms, limit, offset):
+    query = ' '.join(terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM api_saveditem WHERE search_vector @@ websearch_to_tsquery('english', %s)",
+            [query],
+        )
+        total = cursor.fetchone()[0]
+        options = f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=24, MinWords=8"
+        cursor.execute(
+            """
+            SELECT id, rank,
+                   ts_headline('english', coalesce(title, ''), q, %s),
+                   ts_headline('english', coalesce(summary, '') || ' ' || coalesce(caption, ''), q, %s)
+            FROM (
+                SELECT id, title, summary, caption, q, ts_rank(search_vector, q) AS rank
+                FROM api_saveditem, websearch_to_tsquery('english', %s) AS q
+                WHERE search_vector @@ q
+                ORDER BY rank DESC, id DESC
+                LIMIT %s OFFSET %s
+            ) AS hits
+            ORDER BY rank DESC, id DESC
+            """,
+            [options + ', HighlightAll=true', options, query, limit, offset],
+        )
+        hits = [tuple(row) for row in cursor.fetchall()]
+    return total, hits
+
+
+def _fallback_search(terms, limit, offset):
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(title__icontains=term) | Q(summary__icontains=term) | Q(caption__icontains=term) |
+            Q(category__icontains=term) | Q(hashtags__icontains=term)
+        )
+    queryset = SavedItem.objects.filter(condition).order_by('-created_at', '-id')
+    total = queryset.count()
+    ids = queryset.values_list('id', flat=True)[offset:offset + limit]
+    return total, [(item_id, 0.0, None, None) for item_id in ids]
+
+
+def search_items(query, limit=20, offset=0):
+    """
+    Ranked full-text search. Returns (total, hits) where hits is a list of
+    (item_id, rank, highlighted_title, snippet), best match first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return 0, []
+
+    vendor = connection.vendor
+    try:
+        if vendor == 'sqlite':
+            return _sqlite_search(terms, limit, offset)
+        if vendor == 'postgresql':
+            return _postgres_search(terms, limit, offset)
+    except DatabaseError as e:
+        # e.g. SQLite without FTS5, or the index migration hasn't run.
+        logger.warning("Full-text search unavailable, falling back: %s", e)
+    except StaleIndex as e:
+        logger.error(
+            "Full-text index is out of step with the table (%s), falling back. Rebuild it with "
+            "INSERT INTO api_saveditem_fts(api_saveditem_fts) VALUES ('rebuild')", e,
+        )
+    return _fallback_search(terms, limit, offset)
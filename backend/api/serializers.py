@@ -1,7 +1,57 @@
+from django.db import models
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 from .models import SavedItem
 
 class SavedItemSerializer(serializers.ModelSerializer):
+    """Full representation, used for retrieve/create/update."""
     class Meta:
         model = SavedItem
-        fields = '__all__'
+        exclude = ('embedding',)
+
+# Everything a grid card needs. `caption` (up to 800 chars of scraped markdown)
+# is left to the detail endpoint unless a client asks for it via ?fields=.
+LIST_FIELDS = ('id', 'url', 'item_type', 'title', 'summary', 'category', 'hashtags', 'media_url', 'is_seen', 'created_at')
+ALL_FIELDS = tuple(field.name for field in SavedItem._meta.concrete_fields if field.name != 'embedding')
+DATETIME_FIELDS = frozenset(
+    field.name for field in SavedItem._meta.concrete_fields if isinstance(field, models.DateTimeField)
+)
+
+# Cursor pagination reads these from every row, requested or not.
+ORDERING_FIELDS = ('id', 'created_at')
+
+def requested_fields(params, default=LIST_FIELDS):
+    """Parse a ?fields=a,b,c sparse fieldset, rejecting unknown names."""
+    raw = params.get('fields')
+    if not raw:
+        return default
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in ALL_FIELDS]
+    if unknown:
+        raise ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(ALL_FIELDS)}."})
+    return fields
+
+def query_fields(fields):
+    return tuple(dict.fromkeys(fields + ORDERING_FIELDS))
+
+def format_datetime(value):
+    # Same output as DRF's DateTimeField with the default ISO 8601 format.
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+def serialize_rows(rows, fields):
+    """
+    Fast path for list endpoints: turns .values() dicts into response dicts
+    without instantiating models or DRF fields per row.
+    """
+    datetime_fields = [name for name in fields if name in DATETIME_FIELDS]
+    result = []
+    for row in rows:
+        data = {name: row[name] for name in fields}
+        for name in datetime_fields:
+            if data[name] is not None:
+                data[name] = format_datetime(data[name])
+        result.append(data)
+    return result
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .events import notify_change
+from .facets import record_deleted, record_saved, remember_state
+from .models import SavedItem
+from .sync import record_deletion
+
+
+@receiver(post_init, sender=SavedItem)
+def remember_facets(sender, instance, **kwargs):
+    # Facet counters are updated from the difference to what was loaded.
+    remember_state(instance)
+
+
+@receiver(post_delete, sender=SavedItem)
+def leave_tombstone(sender, instance, **kwargs):
+    """Remember deletions so delta-sync clients can drop the item too."""
+    record_deletion(instance.pk)
+    record_deleted(instance)
+    notify_change()
+
+
+@receiver(post_save, sender=SavedItem)
+def announce_save(sender, instance, created, **kwargs):
+    # Covers items finished by the job workers and PATCHes through the API alike.
+    record_saved(instance, created)
+    notify_change()
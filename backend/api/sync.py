@@ -0,0 +1,166 @@
+"""
+Collection versioning and delta sync for the items list.
+
+The version is the newest (updated_at, id) pair, the newest tombstone and the
+row count: every save bumps updated_at, every delete leaves a DeletedItem, and
+the count catches anything that bypassed both. It is served as the list ETag
+and, with the time it was issued, as an opaque sync cursor for
+/api/items/changes/?since=<cursor>.
+
+Timestamps and ids are assigned before a write commits, so a row can become
+visible behind a cursor that has already passed it. Cursors that end a sync
+therefore never point closer to the present than SYNC_OVERLAP_SECONDS: the
+next sync reads that window again, and clients apply rows and deletions by
+id, so seeing one twice is harmless.
+"""
+import base64
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import DeletedItem, SavedItem
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+_purge_lock = threading.Lock()
+_last_purge = 0.0
+
+
+class CursorExpired(APIException):
+    """Tombstones the cursor depends on were purged; the client must reload the list."""
+    status_code = 410
+    default_detail = 'Sync cursor expired, reload the collection.'
+    default_code = 'cursor_expired'
+
+
+def collection_version():
+    """(updated_at, id, tombstone_id, count) of the newest change. Index lookups plus a count."""
+    latest = SavedItem.objects.order_by('-updated_at', '-id').values_list('updated_at', 'id').first()
+    updated_at, item_id = latest or (EPOCH, 0)
+    tombstone_id = DeletedItem.objects.aggregate(last=Max('id'))['last'] or 0
+    return updated_at, item_id, tombstone_id, SavedItem.objects.count()
+
+
+def collection_etag(request, version):
+    """Weak ETag for one representation (URL + Accept) of the collection at `version`."""
+    basis = '|'.join(str(part) for part in version) + '|' + request.get_full_path() + '|' + request.META.get('HTTP_ACCEPT', '')
+    return 'W/"%s"' % hashlib.sha1(basis.encode('utf-8')).hexdigest()[:20]
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    # Weak comparison: W/"x" matches "x".
+    bare = etag[2:] if etag.startswith('W/') else etag
+    return '*' in candidates or any(tag == etag or tag == bare or tag == 'W/' + bare for tag in candidates)
+
+
+def encode_cursor(updated_at, item_id, tombstone_id, issued_at):
+    raw = f"{updated_at.isoformat()}|{item_id}|{tombstone_id}|{issued_at.isoformat()}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        updated_at, item_id, tombstone_id, issued_at = raw.split('|')
+        return (
+            datetime.fromisoformat(updated_at), int(item_id),
+            int(tombstone_id), datetime.fromisoformat(issued_at),
+        )
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationError({'since': 'Invalid sync cursor.'})
+
+
+def settled_position(updated_at, item_id, tombstone_id, now):
+    """
+    Step a position back to the start of the overlap window: rows stamped, and
+    tombstones written, inside it may still have uncommitted neighbours.
+    """
+    horizon = now - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+    if updated_at >= horizon:
+        updated_at, item_id = horizon, 0
+    if tombstone_id:
+        tombstone_id = DeletedItem.objects.filter(
+            id__lte=tombstone_id, deleted_at__lt=horizon,
+        ).aggregate(last=Max('id'))['last'] or 0
+    return updated_at, item_id, tombstone_id
+
+
+def current_cursor(version):
+    now = timezone.now()
+    updated_at, item_id, tombstone_id, _ = version
+    return encode_cursor(*settled_position(updated_at, item_id, tombstone_id, now), now)
+
+
+def changes_since(cursor, limit, fields):
+    """
+    Items created or updated, and IDs deleted, after `cursor` (None = from the
+    beginning). Returns (changed_rows, deleted_ids, next_cursor, has_more), with
+    changed rows as .values() dicts of `fields` in (updated_at, id) order. Keep
+    calling with the returned cursor while has_more is set.
+    """
+    started = timezone.now()
+    if cursor is None:
+        # A fresh client has nothing to delete; start tombstones at the current end.
+        updated_at, item_id, issued_at = EPOCH, 0, started
+        tombstone_id = DeletedItem.objects.aggregate(last=Max('id'))['last'] or 0
+    else:
+        updated_at, item_id, tombstone_id, issued_at = decode_cursor(cursor)
+        if issued_at < started - timedelta(seconds=settings.TOMBSTONE_TTL_SECONDS):
+            raise CursorExpired()
+
+    changed = list(
+        SavedItem.objects
+        .filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=item_id))
+        .order_by('updated_at', 'id')
+        .values(*dict.fromkeys(fields + ('id', 'updated_at')))[:limit + 1]
+    )
+    deleted = list(
+        DeletedItem.objects.filter(id__gt=tombstone_id).order_by('id').values_list('id', 'item_id')[:limit + 1]
+    )
+    has_more = len(changed) > limit or len(deleted) > limit
+    changed, deleted = changed[:limit], deleted[:limit]
+
+    if changed:
+        updated_at, item_id = changed[-1]['updated_at'], changed[-1]['id']
+    if deleted:
+        tombstone_id = deleted[-1][0]
+    if not has_more:
+        # Pages in between continue exactly where they stopped, so a burst
+        # bigger than a page inside the window can't loop; the last one settles.
+        updated_at, item_id, tombstone_id = settled_position(updated_at, item_id, tombstone_id, started)
+    # A partial page keeps the original issue time so tombstone expiry is judged
+    # from where the client actually is, not from its last page.
+    next_cursor = encode_cursor(updated_at, item_id, tombstone_id, issued_at if has_more else started)
+    return changed, [deleted_id for _, deleted_id in deleted], next_cursor, has_more
+
+
+def record_deletion(item_id):
+    DeletedItem.objects.create(item_id=item_id)
+    purge_expired_tombstones()
+
+
+def purge_expired_tombstones(force=False):
+    """Drop tombstones older than the TTL, at most once per purge interval per process."""
+    global _last_purge
+    now = time.monotonic()
+    if not force and now - _last_purge < settings.TOMBSTONE_PURGE_INTERVAL:
+        return 0
+
+    with _purge_lock:
+        if not force and now - _last_purge < settings.TOMBSTONE_PURGE_INTERVAL:
+            return 0
+        _last_purge = now
+
+    cutoff = timezone.now() - timedelta(seconds=settings.TOMBSTONE_TTL_SECONDS)
+    deleted, _ = DeletedItem.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,89 @@
+import logging
+import time
+
+from .jobs import RetryLater, job_handler
+from .observability import stage
+from .resilience import circuit_retry_at
+from .embeddings import embed_item
+from .reenrich import provenance
+from .models import SavedItem
+from .outbox import queue_message
+from .thumbnails import queue_thumbnail
+from .utils import get_url_type, scrape_metadata, process_with_ai
+from .writer import item_writer
+
+logger = logging.getLogger(__name__)
+
+
+def process_webhook_in_background(url, from_number):
+    """Heavy lifting (Scraping + AI + DB), run by a job worker."""
+    logger.info("Processing link", extra={'url': url})
+
+    # A retry may run after an earlier attempt already saved the item.
+    if SavedItem.objects.filter(url=url).exists():
+        logger.info("Link already saved, skipping", extra={'url': url})
+        return
+
+    defer_while_ai_down()
+
+    item_type = get_url_type(url)
+
+    scraped_data = scrape_metadata(url)
+    ai_data = process_with_ai(url, scraped_data)
+
+    item = save_item(url, item_type, scraped_data, ai_data)
+    if item is None:
+        return
+    queue_thumbnail(item, scraped_data)
+
+    logger.debug("Queueing reply to %s", from_number)
+    queue_message(from_number, saved_reply_text(item))
+
+
+def defer_while_ai_down():
+    """
+    Rather than saving fallback-quality metadata while Gemini's circuit is open,
+    put the job back until the circuit half-opens.
+    """
+    retry_at = circuit_retry_at('gemini')
+    if retry_at is not None:
+        raise RetryLater(retry_at - time.time(), "Gemini circuit open")
+
+
+def build_item(url, item_type, scraped_data, ai_data):
+    """Unsaved SavedItem from scrape + AI output (shared with the bulk importer)."""
+    fields = {
+        'title': ai_data.get('title') or scraped_data.get('title'),
+        'caption': scraped_data.get('caption'),
+        'summary': ai_data.get('summary'),
+        'category': ai_data.get('category'),
+        'hashtags': ai_data.get('hashtags'),
+    }
+    return SavedItem(
+        url=url, item_type=item_type, embedding=embed_item(fields),
+        **fields, **provenance(scraped_data, ai_data),
+    )
+
+
+def save_item(url, item_type, scraped_data, ai_data):
+    """Save to DB via the item writer. Returns None if another worker saved the same URL first."""
+    item = build_item(url, item_type, scraped_data, ai_data)
+    with stage('db_write') as timer:
+        item = item_writer.create(item).result()
+        if item is None:
+            timer.result = 'duplicate'
+            logger.info("Link was saved concurrently, skipping", extra={'url': url})
+            return None
+    logger.info("Saved item", extra={
+        'url': url, 'item_id': item.pk, 'quality': item.quality, 'seconds': round(timer.seconds, 3),
+    })
+    return item
+
+
+def saved_reply_text(item):
+    return f"Got it! Saved to your '{item.category}' bucket.\n\nView your collection here: https://hack-the-thread.pages.dev/"
+
+
+@job_handler('process_link')
+def process_link_job(payload):
+    process_webhook_in_background(payload['url'], payload['from_number'])
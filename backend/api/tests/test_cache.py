@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api.cache import LRUCache, TieredCache
+from api.models import CacheEntry
+
+
+class LRUCacheTests(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+
+    def test_entry_expires_after_its_ttl(self):
+        cache = LRUCache()
+        with mock.patch('api.cache.time.monotonic', return_value=100.0):
+            cache.set('a', 1, ttl=10)
+        with mock.patch('api.cache.time.monotonic', return_value=109.0):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('api.cache.time.monotonic', return_value=110.0):
+            self.assertIsNone(cache.get('a'))
+
+    def test_no_ttl_never_expires(self):
+        cache = LRUCache()
+        cache.set('a', 1)
+        with mock.patch('api.cache.time.monotonic', return_value=1e12):
+            self.assertEqual(cache.get('a'), 1)
+
+    def test_zero_ttl_stores_nothing(self):
+        cache = LRUCache(ttl=60)
+        cache.set('a', 1)
+        cache.set('a', 2, ttl=0)
+        cache.set('b', 1, ttl=-5)
+        self.assertNotIn('a', cache)
+        self.assertNotIn('b', cache)
+
+
+class TieredCacheTests(TestCase):
+    def test_survives_a_cold_lru(self):
+        cache = TieredCache('test')
+        cache.set('k', {'v': 1}, ttl=60)
+        cache.lru.clear()
+        self.assertEqual(cache.get('k'), {'v': 1})
+        self.assertIn('k', cache.lru)
+
+    def test_expired_row_is_a_miss(self):
+        cache = TieredCache('test')
+        cache.set('k', 1, ttl=60)
+        cache.lru.clear()
+        with mock.patch('api.cache.timezone.now', return_value=CacheEntry.objects.get().expires_at):
+            self.assertIsNone(cache.get('k'))
+
+    def test_no_ttl_row_never_expires(self):
+        cache = TieredCache('test')
+        cache.set('k', 1)
+        self.assertIsNone(CacheEntry.objects.get().expires_at)
+
+    def test_zero_ttl_stores_nothing_and_drops_the_old_value(self):
+        cache = TieredCache('test')
+        cache.set('k', 1, ttl=60)
+        cache.set('k', 2, ttl=0)
+        self.assertIsNone(cache.get('k'))
+        self.assertFalse(CacheEntry.objects.exists())
+
+    def test_long_keys_are_hashed(self):
+        cache = TieredCache('test')
+        cache.set('x' * 400, 1)
+        self.assertTrue(CacheEntry.objects.get().key.startswith('sha1:'))
+        cache.lru.clear()
+        self.assertEqual(cache.get('x' * 400), 1)
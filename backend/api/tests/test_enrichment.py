@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api import enrichment
+from api.enrichment import AIBatcher, content_key
+
+SCRAPED = {'status': 'ok', 'title': 'Same post', 'description': 'Same text', 'source': 'jina'}
+RESULT = {'title': 'T', 'category': 'Other', 'summary': 'S', 'hashtags': ['web'], 'source': 'ai'}
+
+
+class ContentKeyTests(TestCase):
+    def test_different_urls_with_the_same_content_get_different_keys(self):
+        self.assertNotEqual(
+            content_key('https://example.com/a', SCRAPED),
+            content_key('https://example.com/b', SCRAPED),
+        )
+
+    def test_tracking_parameters_and_provenance_do_not_change_the_key(self):
+        self.assertEqual(
+            content_key('https://example.com/a', SCRAPED),
+            content_key('https://example.com/a?utm_source=x', dict(SCRAPED, source='social')),
+        )
+
+
+class AIBatcherTests(TestCase):
+    def setUp(self):
+        self.batcher = AIBatcher(max_batch=4, window=0, concurrency=1)
+        # Keep submit() from starting the background flusher; batches are run by hand.
+        patcher = mock.patch.object(AIBatcher, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        enrichment.ai_cache.lru.clear()
+
+    def take_batch(self):
+        batch, self.batcher._pending = self.batcher._pending, []
+        return batch
+
+    def test_identical_requests_share_one_future(self):
+        first = self.batcher.submit('https://example.com/a', SCRAPED)
+        second = self.batcher.submit('https://example.com/a', SCRAPED)
+        self.assertIs(first, second)
+        self.assertEqual(len(self.batcher._pending), 1)
+
+    def test_cached_result_skips_the_model(self):
+        enrichment.ai_cache.set(content_key('https://example.com/a', SCRAPED), RESULT)
+        with mock.patch('api.enrichment.generate_one') as generate:
+            future = self.batcher.submit('https://example.com/a', SCRAPED)
+        self.assertEqual(future.result(timeout=1), RESULT)
+        generate.assert_not_called()
+
+    def test_crashing_batch_still_resolves_and_clears_in_flight(self):
+        futures = [
+            self.batcher.submit('https://example.com/a', SCRAPED),
+            self.batcher.submit('https://example.com/b', SCRAPED),
+        ]
+        batch = self.take_batch()
+        # A bug past the model call (here: results that can't be unpacked) must not strand anyone.
+        with mock.patch('api.enrichment.generate_batch', return_value=None):
+            self.batcher._run_batch(batch)
+        for future in futures:
+            self.assertEqual(future.result(timeout=1)['source'], 'fallback')
+        self.assertEqual(self.batcher._in_flight, {})
+
+    def test_failed_request_is_not_cached(self):
+        future = self.batcher.submit('https://example.com/a', SCRAPED)
+        with mock.patch('api.enrichment.generate_one', side_effect=RuntimeError('quota')):
+            self.batcher._run_batch(self.take_batch())
+        self.assertEqual(future.result(timeout=1)['source'], 'fallback')
+        self.assertIsNone(enrichment.ai_cache.get(content_key('https://example.com/a', SCRAPED)))
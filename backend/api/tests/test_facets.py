@@ -0,0 +1,75 @@
+from django.test import TestCase, override_settings
+
+from api.facets import rebuild_facets
+from api.models import SavedItem
+from api.writer import item_writer
+
+
+def make_item(n, **fields):
+    return SavedItem.objects.create(url=f'https://example.com/{n}', **fields)
+
+
+class FacetTests(TestCase):
+    def facets(self, **params):
+        response = self.client.get('/api/items/facets/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def counts(self, body, name):
+        return {entry['value']: entry['count'] for entry in body[name]}
+
+    def assert_matches_rebuild(self):
+        incremental = self.facets()
+        rebuild_facets()
+        self.assertEqual(incremental, self.facets())
+
+    def test_each_facet_ignores_its_own_filter(self):
+        make_item(0, category='Tech', item_type='youtube')
+        make_item(1, category='Tech', item_type='blog')
+        make_item(2, category='Food', item_type='youtube')
+        body = self.facets(category='Tech')
+        self.assertEqual(body['total'], 2)
+        self.assertEqual(self.counts(body, 'category'), {'Tech': 2, 'Food': 1})
+        self.assertEqual(self.counts(body, 'item_type'), {'youtube': 1, 'blog': 1})
+
+    def test_uncategorized_items_are_reported_as_null(self):
+        make_item(0)
+        self.assertEqual(self.counts(self.facets(), 'category'), {None: 1})
+
+    def test_hashtags_are_normalized_and_ranked(self):
+        make_item(0, hashtags=['#Python', 'django'])
+        make_item(1, hashtags=['python', ' PYTHON '])
+        body = self.facets(hashtags=1)
+        self.assertEqual(body['hashtags'], [{'value': 'python', 'count': 2}])
+
+    def test_saves_edits_and_deletes_keep_counts_exact(self):
+        item = make_item(0, category='Tech', hashtags=['a', 'b'])
+        other = make_item(1, category='Tech', hashtags=['b'])
+        item.category = 'Food'
+        item.hashtags = ['b', 'c']
+        item.is_seen = True
+        item.save()
+        other.delete()
+        body = self.facets()
+        self.assertEqual(self.counts(body, 'category'), {'Food': 1})
+        self.assertEqual(self.counts(body, 'hashtags'), {'b': 1, 'c': 1})
+        self.assertEqual(self.counts(body, 'is_seen'), {True: 1})
+        self.assert_matches_rebuild()
+
+    @override_settings(ITEM_WRITE_COALESCING=False)
+    def test_bulk_writes_keep_counts_exact(self):
+        for n in range(3):
+            make_item(n, category='Tech', hashtags=['a'])
+        items = list(SavedItem.objects.order_by('id'))
+        for item in items[:2]:
+            item.category, item.hashtags = 'Food', ['z']
+        item_writer.update(items, ('category', 'hashtags')).result()
+        self.assertEqual(self.counts(self.facets(), 'category'), {'Food': 2, 'Tech': 1})
+        self.assert_matches_rebuild()
+
+    def test_rebuild_heals_writes_that_bypass_the_counters(self):
+        make_item(0, category='Tech')
+        SavedItem.objects.update(category='Food')
+        self.assertEqual(self.counts(self.facets(), 'category'), {'Tech': 1})
+        rebuild_facets()
+        self.assertEqual(self.counts(self.facets(), 'category'), {'Food': 1})
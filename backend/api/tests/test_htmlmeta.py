@@ -0,0 +1,83 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from api.htmlmeta import aextract_head_meta, content_charset, extract_head_meta
+from api.utils import parse_social_meta
+
+PAGE = (
+    '<!doctype html><html><head>'
+    '<meta property="og:title" content="Caf&eacute; &amp; Bar">'
+    '<meta property="og:title" content="Second title">'
+    '<META NAME="Description" content="Plain description">'
+    '<meta property="og:image" content="https://cdn.example/a.jpg">'
+    '<meta name="viewport" content="width=device-width">'
+    '</head><body><meta property="og:description" content="From the body"></body></html>'
+)
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class HeadMetaTests(SimpleTestCase):
+    def test_collects_known_keys_first_one_wins(self):
+        meta, _ = extract_head_meta([PAGE.encode()])
+        self.assertEqual(meta, {
+            'og:title': 'Café & Bar',
+            'description': 'Plain description',
+            'og:image': 'https://cdn.example/a.jpg',
+        })
+
+    def test_stops_reading_at_the_end_of_the_head(self):
+        body = PAGE.encode() + b'x' * 100_000
+        chunks = split(body, 64)
+        consumed = []
+
+        def feed():
+            for chunk in chunks:
+                consumed.append(chunk)
+                yield chunk
+
+        meta, bytes_read = extract_head_meta(feed())
+        self.assertIn('og:image', meta)
+        self.assertLess(bytes_read, len(PAGE) + 64)
+        self.assertLess(len(consumed), len(chunks))
+
+    def test_byte_cap_bounds_pages_that_never_close_the_head(self):
+        page = b'<html><head>' + b'<link rel="x">' * 10_000
+        _, bytes_read = extract_head_meta(split(page, 1024), max_bytes=4096)
+        self.assertEqual(bytes_read, 4096)
+
+    def test_multibyte_characters_split_across_chunks(self):
+        page = '<head><meta property="og:title" content="Ünïcødé ☕"></head>'.encode('utf-8')
+        meta, _ = extract_head_meta(split(page, 1))
+        self.assertEqual(meta['og:title'], 'Ünïcødé ☕')
+
+    def test_declared_charset_is_used(self):
+        page = '<head><meta property="og:title" content="Café"></head>'.encode('latin-1')
+        meta, _ = extract_head_meta([page], encoding=content_charset('text/html; charset="ISO-8859-1"'))
+        self.assertEqual(meta['og:title'], 'Café')
+
+    def test_unknown_charset_falls_back_to_utf8(self):
+        meta, _ = extract_head_meta([PAGE.encode()], encoding='no-such-codec')
+        self.assertEqual(meta['og:title'], 'Café & Bar')
+
+    def test_async_variant_matches(self):
+        async def chunks():
+            for chunk in split(PAGE.encode(), 7):
+                yield chunk
+
+        self.assertEqual(asyncio.run(aextract_head_meta(chunks())), extract_head_meta(split(PAGE.encode(), 7)))
+
+
+class ParseSocialMetaTests(SimpleTestCase):
+    def test_prefers_secure_image_and_falls_back_to_twitter_tags(self):
+        data = parse_social_meta({
+            'twitter:title': 'T', 'og:image': 'http://a/i.jpg', 'og:image:secure_url': 'https://a/i.jpg',
+        })
+        self.assertEqual((data['title'], data['image'], data['caption']), ('T', 'https://a/i.jpg', ''))
+        self.assertNotIn('video', data)
+
+    def test_no_title_or_description_is_none(self):
+        self.assertIsNone(parse_social_meta({'og:image': 'https://a/i.jpg'}))
@@ -0,0 +1,92 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+
+from api.importer import iter_links, new_links, read_csv, read_jsonl, read_text, run_import
+from api.models import Hashtag, Job, SavedItem
+
+SCRAPED = {'status': 'ok', 'title': 'Scraped', 'description': 'Text', 'image': 'https://cdn.example/p.jpg'}
+AI = {'title': 'A title', 'category': 'Tech', 'summary': 'S', 'hashtags': ['tech'], 'source': 'ai'}
+
+
+class ReaderTests(TestCase):
+    def test_text_strips_sentence_punctuation(self):
+        text = io.StringIO("see https://a.example/x. and (https://b.example/y)\n12/01/24, 10:00 - Me: https://c.example\n")
+        self.assertEqual(list(read_text(text)), ['https://a.example/x', 'https://b.example/y', 'https://c.example'])
+
+    def test_csv_uses_the_url_column(self):
+        text = io.StringIO("Title,URL\nSee https://x.example/1,https://a.example/1\nb,https://a.example/2\n")
+        self.assertEqual(list(read_csv(text)), ['https://a.example/1', 'https://a.example/2'])
+
+    def test_csv_without_header_scans_every_cell(self):
+        text = io.StringIO("note,https://a.example/1\nhttps://a.example/2,x\n")
+        self.assertEqual(list(read_csv(text)), ['https://a.example/1', 'https://a.example/2'])
+
+    def test_jsonl_records_strings_and_broken_lines(self):
+        text = io.StringIO('{"href": "https://a.example/1"}\n"https://a.example/2"\n\n{broken https://a.example/3\n')
+        self.assertEqual(list(read_jsonl(text)), ['https://a.example/1', 'https://a.example/2', 'https://a.example/3'])
+
+    def test_format_comes_from_the_extension(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'links.csv')
+            with open(path, 'w', encoding='utf-8-sig') as handle:
+                handle.write("url\nhttps://a.example/1\n")
+            self.assertEqual(list(iter_links(path)), ['https://a.example/1'])
+
+
+class NewLinksTests(TestCase):
+    def test_drops_repeats_and_saved_urls_per_chunk(self):
+        SavedItem.objects.create(url='https://a.example/saved')
+        urls = ['https://a.example/1', 'https://a.example/saved', 'https://a.example/1', 'https://a.example/2']
+        chunks = list(new_links(urls, chunk_size=2))
+        self.assertEqual(chunks, [
+            ({'read': 2, 'duplicates': 1}, ['https://a.example/1']),
+            ({'read': 2, 'duplicates': 1}, ['https://a.example/2']),
+        ])
+
+
+@mock.patch('api.importer.circuit_retry_at', return_value=None)
+@mock.patch('api.importer.process_with_ai', return_value=AI)
+@mock.patch('api.importer.scrape_metadata', return_value=SCRAPED)
+class RunImportTests(TestCase):
+    def test_imports_new_links_once(self, scrape, ai, circuit):
+        SavedItem.objects.create(url='https://a.example/saved')
+        urls = ['https://a.example/1', 'https://a.example/2', 'https://a.example/1', 'https://a.example/saved']
+        with self.settings(THUMBNAILS_ENABLED=True):
+            stats = run_import(urls, concurrency=2, batch_size=10)
+        self.assertEqual((stats.read, stats.imported, stats.duplicates, stats.failed), (4, 2, 2, 0))
+        item = SavedItem.objects.get(url='https://a.example/1')
+        self.assertEqual((item.title, item.category), ('A title', 'Tech'))
+        self.assertEqual(scrape.call_count, 2)
+        # bulk_create skips signals; the importer keeps facets and thumbnails in step itself.
+        self.assertEqual(Job.objects.filter(kind='thumbnail').count(), 2)
+        self.assertEqual(Hashtag.objects.get(name='tech').item_count, 2)
+
+    def test_rerun_imports_nothing(self, scrape, ai, circuit):
+        urls = ['https://a.example/1', 'https://a.example/2']
+        run_import(urls, concurrency=2)
+        stats = run_import(urls, concurrency=2)
+        self.assertEqual((stats.imported, stats.duplicates), (0, 2))
+
+    def test_link_saved_meanwhile_counts_as_duplicate(self, scrape, ai, circuit):
+        # The dedupe pass saw the URL as new; the webhook saved it before the batch write.
+        checked = [({'read': 1, 'duplicates': 0}, ['https://a.example/1'])]
+        SavedItem.objects.create(url='https://a.example/1')
+        with mock.patch('api.importer.new_links', return_value=checked):
+            stats = run_import(['https://a.example/1'], concurrency=1)
+        self.assertEqual((stats.imported, stats.duplicates), (0, 1))
+        self.assertEqual(SavedItem.objects.count(), 1)
+
+    def test_failed_link_is_counted_and_the_rest_saved(self, scrape, ai, circuit):
+        def flaky(url):
+            if url.endswith('/bad'):
+                raise RuntimeError('boom')
+            return SCRAPED
+
+        scrape.side_effect = flaky
+        stats = run_import(['https://a.example/bad', 'https://a.example/ok'], concurrency=1)
+        self.assertEqual((stats.imported, stats.failed), (1, 1))
+        self.assertTrue(SavedItem.objects.filter(url='https://a.example/ok').exists())
@@ -0,0 +1,136 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from api import jobs
+from api.jobs import (
+    RetryLater, check_runnable, claim_job, complete_job, enqueue_jobs, fail_job, leases, run_job,
+)
+from api.models import Job
+
+
+def expire_lease(job):
+    Job.objects.filter(id=job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+
+class ClaimJobTests(TestCase):
+    def test_claimed_job_is_leased_to_one_worker(self):
+        enqueue_jobs('test', [{}])
+        job = claim_job('w1')
+        self.assertEqual((job.status, job.locked_by, job.attempts), ('running', 'w1', 1))
+        self.assertGreater(job.locked_until, timezone.now())
+        self.assertIsNone(claim_job('w2'))
+
+    def test_future_and_other_kinds_are_not_claimed(self):
+        enqueue_jobs('later', [{}], delay=60)
+        enqueue_jobs('other', [{}])
+        self.assertIsNone(claim_job('w1', ['later', 'test']))
+        self.assertEqual(claim_job('w1', ['other']).kind, 'other')
+
+    def test_stale_snapshot_loses_the_conditional_update(self):
+        enqueue_jobs('test', [{}])
+        real_filter = Job.objects.filter
+
+        def racing_filter(*args, **kwargs):
+            if 'id' in kwargs:
+                # Another worker claims the row between our candidate query and our UPDATE.
+                real_filter(id=kwargs['id']).update(
+                    status='running', locked_by='w2', locked_until=timezone.now() + timedelta(minutes=1),
+                )
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(Job.objects, 'filter', side_effect=racing_filter):
+            self.assertIsNone(claim_job('w1'))
+        self.assertEqual(Job.objects.get().locked_by, 'w2')
+
+    def test_expired_lease_is_reclaimed_and_fences_the_old_worker(self):
+        enqueue_jobs('test', [{}])
+        stale = claim_job('w1')
+        expire_lease(stale)
+        job = claim_job('w2')
+        self.assertEqual((job.locked_by, job.attempts), ('w2', 2))
+
+        complete_job(stale)
+        self.assertEqual(Job.objects.get().status, 'running')
+        complete_job(job)
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    def test_reclaim_after_final_attempt_fails_the_job(self):
+        enqueue_jobs('test', [{}])
+        Job.objects.update(attempts=5, max_attempts=5, status='running', locked_by='w1',
+                           locked_until=timezone.now() - timedelta(seconds=1))
+        job = claim_job('w2')
+        self.assertFalse(check_runnable(job, {'test': lambda payload: None}))
+        self.assertEqual(Job.objects.get().status, 'failed')
+
+    def test_held_lease_is_renewed(self):
+        enqueue_jobs('test', [{}])
+        job = claim_job('w1')
+        expire_lease(job)
+        with mock.patch.object(leases, '_renew_loop'), leases.hold(job):
+            leases.renew()
+        self.assertGreater(Job.objects.get().locked_until, timezone.now())
+        self.assertIsNone(claim_job('w2'))
+
+
+class RunJobTests(TestCase):
+    def run_with(self, handler, **job_fields):
+        enqueue_jobs('test', [{'n': 1}], dedupe_field='n')
+        if job_fields:
+            Job.objects.update(**job_fields)
+        job = claim_job('w1')
+        with mock.patch.dict(jobs.JOB_HANDLERS, {'test': handler}):
+            run_job(job)
+        return Job.objects.get()
+
+    def test_retry_later_does_not_use_an_attempt(self):
+        def handler(payload):
+            raise RetryLater(30, "upstream busy")
+
+        job = self.run_with(handler)
+        self.assertEqual((job.status, job.attempts), ('queued', 0))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=25))
+        self.assertEqual(job.dedupe_key, 'test:1')
+
+    def test_failure_uses_an_attempt_and_backs_off(self):
+        def handler(payload):
+            raise ValueError("boom")
+
+        job = self.run_with(handler)
+        self.assertEqual((job.status, job.attempts, job.last_error), ('queued', 1, 'boom'))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(job.dedupe_key, 'test:1')
+
+    def test_last_failed_attempt_fails_the_job(self):
+        def handler(payload):
+            raise ValueError("boom")
+
+        job = self.run_with(handler, attempts=4, max_attempts=5)
+        self.assertEqual((job.status, job.attempts), ('failed', 5))
+        self.assertIsNone(job.dedupe_key)
+
+    def test_success_completes_the_job(self):
+        job = self.run_with(lambda payload: None)
+        self.assertEqual((job.status, job.locked_by), ('done', None))
+
+
+class DedupeKeyTests(TestCase):
+    def test_held_key_drops_duplicates(self):
+        enqueue_jobs('test', [{'url': 'a'}, {'url': 'a'}, {'url': 'b'}], dedupe_field='url')
+        enqueue_jobs('test', [{'url': 'a'}], dedupe_field='url')
+        self.assertEqual(sorted(Job.objects.values_list('dedupe_key', flat=True)), ['test:a', 'test:b'])
+
+    def test_completed_job_releases_its_key(self):
+        enqueue_jobs('test', [{'url': 'a'}], dedupe_field='url')
+        complete_job(claim_job('w1'))
+        enqueue_jobs('test', [{'url': 'a'}], dedupe_field='url')
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_failed_job_releases_its_key(self):
+        enqueue_jobs('test', [{'url': 'a'}], dedupe_field='url')
+        Job.objects.update(max_attempts=1)
+        fail_job(claim_job('w1'), "boom")
+        enqueue_jobs('test', [{'url': 'a'}], dedupe_field='url')
+        self.assertEqual(Job.objects.filter(status='queued').count(), 1)
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import TestCase
+
+from api import outbox
+from api.jobs import enqueue_jobs
+from api.models import Job, OutboundMessage
+from api.outbox import TEXT_LIMIT, coalesce, queue_message, release_if_idle, send_whatsapp_job
+
+
+def messages(*texts):
+    return [SimpleNamespace(id=i, text=text) for i, text in enumerate(texts, 1)]
+
+
+class CoalesceTests(TestCase):
+    def test_joins_messages_that_fit(self):
+        self.assertEqual(list(coalesce(messages('a', 'b', 'c'))), [('a\n\nb\n\nc', [1, 2, 3])])
+
+    def test_splits_at_the_limit(self):
+        batches = list(coalesce(messages('a' * 5, 'b' * 5, 'c' * 5), limit=12))
+        self.assertEqual(batches, [('aaaaa\n\nbbbbb', [1, 2]), ('ccccc', [3])])
+
+    def test_oversized_message_is_truncated_and_sent_alone(self):
+        batches = list(coalesce(messages('a', 'x' * (TEXT_LIMIT + 10), 'b')))
+        self.assertEqual([ids for _, ids in batches], [[1], [2], [3]])
+        self.assertEqual(len(batches[1][0]), TEXT_LIMIT)
+        self.assertTrue(all(len(text) <= TEXT_LIMIT for text, _ in batches))
+
+    def test_nothing_pending(self):
+        self.assertEqual(list(coalesce([])), [])
+
+
+class OutboxHandoffTests(TestCase):
+    to = '15550002'
+
+    def sender_jobs(self):
+        return Job.objects.filter(kind='send_whatsapp', dedupe_key=f"send_whatsapp:{self.to}")
+
+    def test_release_if_idle_releases_the_key(self):
+        enqueue_jobs('send_whatsapp', [{'to': self.to}], dedupe_field='to')
+        self.assertTrue(release_if_idle(self.to))
+        self.assertFalse(self.sender_jobs().exists())
+
+    def test_release_if_idle_keeps_the_key_while_messages_are_pending(self):
+        queue_message(self.to, "hi")
+        self.assertFalse(release_if_idle(self.to))
+        self.assertTrue(self.sender_jobs().exists())
+
+    def test_message_queued_while_sending_is_sent_by_the_same_job(self):
+        queue_message(self.to, "first")
+
+        def send(to, text):
+            if text == "first":
+                # Arrives while the sender holds the key: no second sender is queued.
+                queue_message(self.to, "second")
+                self.assertEqual(self.sender_jobs().count(), 1)
+            return 200
+
+        with mock.patch.object(outbox, 'send_whatsapp_message', side_effect=send) as sent:
+            send_whatsapp_job({'to': self.to})
+        self.assertEqual([call.args[1] for call in sent.call_args_list], ["first", "second"])
+        self.assertFalse(OutboundMessage.objects.filter(status='pending').exists())
+        self.assertFalse(self.sender_jobs().exists())
+
+    def test_message_after_release_queues_a_new_sender(self):
+        queue_message(self.to, "first")
+        with mock.patch.object(outbox, 'send_whatsapp_message', return_value=200):
+            send_whatsapp_job({'to': self.to})
+        queue_message(self.to, "second")
+        self.assertEqual(self.sender_jobs().count(), 1)
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import TestCase
+
+from api.models import SavedItem
+
+START = datetime(2026, 1, 1, 12, tzinfo=dt_timezone.utc)
+
+
+def make_item(n, created_at=None, **fields):
+    item = SavedItem.objects.create(url=f'https://example.com/{n}', title=f'Item {n}', **fields)
+    SavedItem.objects.filter(pk=item.pk).update(created_at=created_at or START + timedelta(hours=n))
+    return item
+
+
+class CursorPaginationTests(TestCase):
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, params):
+        ids, url = [], '/api/items/'
+        while url:
+            page = self.get(url, params)
+            params = None  # the next link carries them
+            ids += [row['id'] for row in page['results']]
+            url = page['next']
+        return ids
+
+    def test_pages_cover_everything_newest_first(self):
+        items = [make_item(n) for n in range(7)]
+        self.assertEqual(self.walk({'page_size': 3}), [item.id for item in reversed(items)])
+
+    def test_ties_on_created_at_are_broken_by_id(self):
+        items = [make_item(n, created_at=START) for n in range(5)]
+        self.assertEqual(self.walk({'page_size': 2}), sorted((item.id for item in items), reverse=True))
+
+    def test_insert_during_paging_does_not_shift_later_pages(self):
+        items = [make_item(n) for n in range(4)]
+        first = self.get('/api/items/', {'page_size': 2})
+        make_item(10)  # newer than everything, lands before the cursor
+        second = self.get(first['next'])
+        self.assertEqual([row['id'] for row in second['results']], [items[1].id, items[0].id])
+
+    def test_page_size_is_capped(self):
+        SavedItem.objects.bulk_create(SavedItem(url=f'https://example.com/{n}') for n in range(205))
+        page = self.get('/api/items/', {'page_size': 10000})
+        self.assertEqual(len(page['results']), 200)
+
+    def test_sparse_fieldset(self):
+        make_item(0)
+        row = self.get('/api/items/', {'fields': 'id,title'})['results'][0]
+        self.assertEqual(set(row), {'id', 'title'})
+
+    def test_unknown_field_is_rejected(self):
+        self.assertEqual(self.client.get('/api/items/', {'fields': 'id,secret'}).status_code, 400)
+
+
+class FilterTests(TestCase):
+    def ids(self, **params):
+        response = self.client.get('/api/items/', params)
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.json()['results']}
+
+    def test_category_type_and_seen(self):
+        match = make_item(0, category='Tech', item_type='youtube', is_seen=False)
+        make_item(1, category='Tech', item_type='youtube', is_seen=True)
+        make_item(2, category='Food', item_type='youtube', is_seen=False)
+        make_item(3, category='Tech', item_type='blog', is_seen=False)
+        self.assertEqual(self.ids(category='Tech', item_type='youtube', is_seen='false'), {match.id})
+
+    def test_hashtag_is_normalized(self):
+        tagged = make_item(0, hashtags=['#Python', 'django'])
+        make_item(1, hashtags=['react'])
+        self.assertEqual(self.ids(hashtag='#PYTHON'), {tagged.id})
+
+    def test_created_range_accepts_dates_and_datetimes(self):
+        make_item(0)
+        inside = make_item(5)
+        make_item(30)
+        self.assertEqual(self.ids(created_after='2026-01-01T13:00:00Z', created_before='2026-01-02'), {inside.id})
+
+    def test_bad_parameters_are_400s(self):
+        for params in ({'is_seen': 'maybe'}, {'created_after': 'yesterday'}):
+            self.assertEqual(self.client.get('/api/items/', params).status_code, 400, params)
@@ -0,0 +1,99 @@
+import json
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.models import SavedItem
+from api.reenrich import due_items, enrichment_quality, reenrich_items, retry_at
+
+SCRAPED = {'status': 'ok', 'title': 'Scraped title', 'caption': 'Caption', 'source': 'jina'}
+GOOD = {'title': 'Better title', 'category': 'Tech', 'summary': 'Real summary', 'hashtags': ['tech'], 'source': 'gemini'}
+FALLBACK = {'title': 'Resource from Example', 'category': 'Other', 'summary': 'A link.', 'hashtags': ['web'],
+            'source': 'fallback'}
+
+
+def resolved(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def degraded_item(n=0):
+    item = SavedItem.objects.create(
+        url=f'https://example.com/{n}', title='Resource from Example', category='Other',
+        summary='A link.', ai_source='fallback', scrape_source='restricted', quality=15,
+        enrich_attempts=1, next_enrich_at=timezone.now() - timedelta(minutes=1),
+    )
+    return SavedItem.objects.get(pk=item.pk)
+
+
+class SchedulingTests(TestCase):
+    def test_quality_scores_the_fallback_lowest(self):
+        self.assertEqual(enrichment_quality('jina', 'gemini', 'Tech', 'S'), 100)
+        self.assertEqual(enrichment_quality('restricted', 'fallback', 'Other', ''), 0)
+
+    @override_settings(REENRICH_RETRY_BASE_SECONDS=10, REENRICH_RETRY_MAX_SECONDS=60, REENRICH_MAX_ATTEMPTS=5)
+    def test_backoff_doubles_up_to_the_cap_then_gives_up(self):
+        now = timezone.now()
+        self.assertEqual([retry_at(n, now) - now for n in (0, 1, 3)],
+                         [timedelta(seconds=10), timedelta(seconds=20), timedelta(seconds=60)])
+        self.assertIsNone(retry_at(5, now))
+
+    def test_worst_due_items_first(self):
+        bad, worse = degraded_item(0), degraded_item(1)
+        SavedItem.objects.filter(pk=worse.pk).update(quality=5)
+        SavedItem.objects.filter(pk=bad.pk).update(quality=40)
+        not_due = degraded_item(2)
+        SavedItem.objects.filter(pk=not_due.pk).update(next_enrich_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual([item.pk for item in due_items(10)], [worse.pk, bad.pk])
+
+
+@override_settings(ITEM_WRITE_COALESCING=False, THUMBNAILS_ENABLED=False)
+@mock.patch('api.reenrich.scrape_metadata', return_value=SCRAPED)
+class ReenrichItemsTests(TestCase):
+    def run_with(self, items, ai_result, meanwhile=None):
+        def submit(url, scraped_data):
+            if meanwhile:
+                meanwhile()
+            return resolved(ai_result)
+
+        with mock.patch('api.reenrich.ai_batcher') as batcher:
+            batcher.submit.side_effect = submit
+            return reenrich_items(items)
+
+    def test_improved_item_is_rewritten(self, scrape):
+        item = degraded_item()
+        self.assertEqual(self.run_with([item], GOOD), 1)
+        item.refresh_from_db()
+        self.assertEqual((item.title, item.category, item.ai_source), ('Better title', 'Tech', 'gemini'))
+        self.assertIsNone(item.next_enrich_at)
+        self.assertIsNotNone(item.embedding)
+
+    def test_no_improvement_only_backs_off(self, scrape):
+        scrape.return_value = {'status': 'restricted'}
+        item = degraded_item()
+        before = SavedItem.objects.values().get(pk=item.pk)
+        self.assertEqual(self.run_with([item], FALLBACK), 0)
+        after = SavedItem.objects.values().get(pk=item.pk)
+        self.assertEqual(after['enrich_attempts'], 2)
+        self.assertGreater(after['next_enrich_at'], before['next_enrich_at'])
+        unchanged = {name: value for name, value in after.items() if name not in ('enrich_attempts', 'next_enrich_at')}
+        self.assertEqual(unchanged, {name: before[name] for name in unchanged})
+
+    def test_edit_during_the_run_wins(self, scrape):
+        item = degraded_item()
+
+        def edit():
+            response = self.client.patch(
+                f'/api/items/{item.pk}/', json.dumps({'title': 'My own title'}), content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.run_with([item], GOOD, meanwhile=edit), 0)
+        item.refresh_from_db()
+        self.assertEqual((item.title, item.ai_source), ('My own title', 'fallback'))
+        # Hand-edited text is off the schedule for good.
+        self.assertIsNone(item.next_enrich_at)
@@ -0,0 +1,127 @@
+import asyncio
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from api import resilience
+from api.resilience import (
+    CircuitOpenError, RateLimitedError, UpstreamError, aguarded, allow_call, guarded,
+    record_failure, record_success, take_token,
+)
+
+
+class ResilienceTestCase(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(
+            RESILIENCE_DB_PATH=str(Path(tmp.name) / 'resilience.sqlite3'),
+            UPSTREAM_RATE_LIMITS={'test': (1.0, 2)},
+            RATE_LIMIT_MAX_WAIT=0,
+            CIRCUIT_FAILURE_THRESHOLD=2,
+            CIRCUIT_RESET_SECONDS=30,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(self.drop_connection)
+        self.drop_connection()
+        self.now = 1000.0
+        clock = mock.patch('api.resilience.time.time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    @staticmethod
+    def drop_connection():
+        conn = getattr(resilience._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            resilience._local.conn = None
+
+
+class TokenBucketTests(ResilienceTestCase):
+    def test_burst_then_wait_for_refill(self):
+        self.assertEqual(take_token('test'), 0)
+        self.assertEqual(take_token('test'), 0)
+        self.assertAlmostEqual(take_token('test'), 1.0)
+
+    def test_refills_at_the_configured_rate(self):
+        take_token('test')
+        take_token('test')
+        self.now += 1.0
+        self.assertEqual(take_token('test'), 0)
+
+    def test_exhausted_budget_raises_without_calling(self):
+        take_token('test')
+        take_token('test')
+        called = False
+        with self.assertRaises(RateLimitedError):
+            with guarded('test'):
+                called = True
+        self.assertFalse(called)
+
+
+class CircuitBreakerTests(ResilienceTestCase):
+    def open_circuit(self):
+        record_failure('test')
+        record_failure('test')
+
+    def test_opens_after_the_failure_threshold(self):
+        record_failure('test')
+        allow_call('test')
+        record_failure('test')
+        with self.assertRaises(CircuitOpenError) as cm:
+            allow_call('test')
+        self.assertEqual(cm.exception.retry_at, self.now + 30)
+
+    def test_success_resets_the_failure_count(self):
+        record_failure('test')
+        record_success('test')
+        record_failure('test')
+        allow_call('test')
+
+    def test_lets_exactly_one_probe_through_after_the_reset(self):
+        self.open_circuit()
+        self.now += 30
+        allow_call('test')
+        with self.assertRaises(CircuitOpenError):
+            allow_call('test')
+
+    def test_successful_probe_closes_the_circuit(self):
+        self.open_circuit()
+        self.now += 30
+        allow_call('test')
+        record_success('test')
+        allow_call('test')
+        allow_call('test')
+
+    def test_failed_probe_reopens_the_circuit(self):
+        self.open_circuit()
+        self.now += 30
+        allow_call('test')
+        record_failure('test')
+        self.now += 1
+        with self.assertRaises(CircuitOpenError):
+            allow_call('test')
+
+    def test_guard_counts_back_off_statuses_as_failures(self):
+        for _ in range(2):
+            self.now += 1  # let the bucket refill
+            with self.assertRaises(UpstreamError):
+                with guarded('test'):
+                    resilience.check_status('test', 503)
+        with self.assertRaises(CircuitOpenError):
+            allow_call('test')
+
+    def test_async_guard_shares_the_same_state(self):
+        async def failing_call():
+            async with aguarded('test'):
+                raise UpstreamError('test', 429)
+
+        for _ in range(2):
+            self.now += 1
+            with self.assertRaises(UpstreamError):
+                asyncio.run(failing_call())
+        with self.assertRaises(CircuitOpenError):
+            allow_call('test')
@@ -0,0 +1,93 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from api import scraping
+from api.scraping import LayerStats, race_layers, while_running
+
+
+@override_settings(SCRAPE_DEADLINE=2, SCRAPE_HEDGE_DELAY=0.05, SCRAPE_HEDGE_MIN_DELAY=0.01)
+class RaceLayersTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(scraping, 'layer_stats', LayerStats())
+        self.stats = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fast_first_layer_wins_without_a_hedge(self):
+        calls = []
+
+        def layer(name):
+            def run(timeout, cancelled):
+                calls.append(name)
+                return {'title': name}
+            return run
+
+        self.assertEqual(race_layers('x', {'social': layer('social'), 'jina': layer('jina')}),
+                         ('social', {'title': 'social'}))
+        self.assertEqual(calls, ['social'])
+
+    def test_slow_layer_is_hedged_and_told_to_stop(self):
+        stopped = threading.Event()
+
+        def slow(timeout, cancelled):
+            # Stands in for a layer reading its body chunk by chunk.
+            while not cancelled.wait(0.01):
+                pass
+            stopped.set()
+            return None
+
+        def fast(timeout, cancelled):
+            return {'title': 'jina'}
+
+        self.assertEqual(race_layers('x', {'social': slow, 'jina': fast})[0], 'jina')
+        self.assertTrue(stopped.wait(1))
+        social = self.stats.snapshot()['x:social']
+        self.assertEqual((social['attempts'], social['abandoned']), (0, 1))
+
+    def test_abandoned_hedges_keep_their_priority(self):
+        # Same win rate, so the faster layer goes first, however often it was cut off.
+        self.stats.record('x', 'social', 0.5, won=True)
+        self.stats.record('x', 'jina', 0.1, won=True)
+        for _ in range(5):
+            self.stats.record_abandoned('x', 'jina')
+        self.assertEqual(self.stats.order('x', ['social', 'jina']), ['jina', 'social'])
+
+    def test_winner_goes_first_next_time(self):
+        self.stats.record('x', 'social', 1.0, won=False)
+        self.stats.record('x', 'jina', 1.0, won=True)
+        self.assertEqual(self.stats.order('x', ['social', 'jina']), ['jina', 'social'])
+
+    def test_failed_layer_starts_the_next_at_once(self):
+        def broken(timeout, cancelled):
+            raise ConnectionError("reset")
+
+        started = time.monotonic()
+        result = race_layers('x', {'social': broken, 'jina': lambda timeout, cancelled: {'title': 'j'}})
+        self.assertEqual(result[0], 'jina')
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.stats.snapshot()['x:social']['failures'], 1)
+
+    @override_settings(SCRAPE_DEADLINE=0.2)
+    def test_nothing_within_the_deadline(self):
+        def hang(timeout, cancelled):
+            cancelled.wait(5)
+            return None
+
+        self.assertEqual(race_layers('x', {'social': hang, 'jina': hang}), (None, None))
+        self.assertEqual(self.stats.snapshot()['x:jina']['failures'], 1)
+
+
+class WhileRunningTests(SimpleTestCase):
+    def test_stops_at_cancellation(self):
+        cancelled = threading.Event()
+
+        def chunks():
+            yield b'a'
+            cancelled.set()
+            yield b'b'
+            yield b'c'
+
+        self.assertEqual(list(while_running(chunks(), cancelled)), [b'a'])
+        self.assertEqual(list(while_running([b'a', b'b'], None)), [b'a', b'b'])
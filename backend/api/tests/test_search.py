@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.db import OperationalError, connection
+from django.test import TestCase
+
+from api.models import SavedItem
+
+
+class SearchTests(TestCase):
+    """The test database is built by running every migration, like production."""
+
+    def search(self, q):
+        response = self.client.get('/api/items/search/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, q):
+        return [r['id'] for r in self.search(q)['results']]
+
+    def test_new_item_is_found_after_all_migrations(self):
+        item = SavedItem.objects.create(url='https://example.com/a', title='Sourdough starter guide')
+        self.assertEqual(self.ids('sourdough'), [item.id])
+
+    def test_updated_and_deleted_items_follow_the_index(self):
+        item = SavedItem.objects.create(url='https://example.com/a', title='Sourdough starter guide')
+        item.title = 'Focaccia basics'
+        item.save()
+        self.assertEqual(self.search('sourdough')['count'], 0)
+        self.assertEqual(self.search('focaccia')['count'], 1)
+        item.delete()
+        self.assertEqual(self.search('focaccia')['count'], 0)
+
+    def test_title_match_outranks_caption_match(self):
+        in_caption = SavedItem.objects.create(
+            url='https://example.com/a', title='Weekend notes', caption='Some thoughts on sourdough',
+        )
+        in_title = SavedItem.objects.create(url='https://example.com/b', title='Sourdough basics')
+        self.assertEqual(self.ids('sourdough'), [in_title.id, in_caption.id])
+
+    def test_all_terms_must_match(self):
+        both = SavedItem.objects.create(url='https://example.com/a', title='Sourdough pizza')
+        SavedItem.objects.create(url='https://example.com/b', title='Sourdough bread')
+        self.assertEqual(self.ids('pizza sourdough'), [both.id])
+
+    def test_last_term_matches_as_a_prefix(self):
+        item = SavedItem.objects.create(url='https://example.com/a', title='Sourdough starter guide')
+        self.assertEqual(self.ids('sourd'), [item.id])
+        self.assertEqual(self.ids('sourd starter'), [])
+
+    def test_highlight_and_snippet_are_escaped_html_with_marks(self):
+        SavedItem.objects.create(
+            url='https://example.com/a', title='<b>Sourdough</b> tips',
+            summary='How to keep a starter alive & bubbly.',
+        )
+        title = self.search('sourdough')['results'][0]['highlight']['title']
+        self.assertEqual(title, '&lt;b&gt;<mark>Sourdough</mark>&lt;/b&gt; tips')
+        snippet = self.search('starter')['results'][0]['highlight']['snippet']
+        self.assertIn('keep a <mark>starter</mark> alive &amp; bubbly', snippet)
+
+    def test_query_syntax_is_not_passed_through(self):
+        SavedItem.objects.create(url='https://example.com/a', title='Sourdough starter guide')
+        self.assertEqual(self.search('"sourdough" OR NEAR(')['count'], 0)
+        self.assertEqual(self.search('-- ; *')['count'], 0)
+
+    def test_falls_back_to_icontains_without_fts(self):
+        item = SavedItem.objects.create(url='https://example.com/a', title='Sourdough starter guide')
+        with mock.patch('api.search._sqlite_search', side_effect=OperationalError('no such module: fts5')):
+            body = self.search('dough')
+        self.assertEqual([r['id'] for r in body['results']], [item.id])
+
+    def test_stale_index_falls_back_and_logs(self):
+        with connection.cursor() as cursor:
+            # What a table rebuild does to the triggers.
+            cursor.execute('DROP TRIGGER api_saveditem_fts_ai')
+        item = SavedItem.objects.create(url='https://example.com/a', title='Sourdough starter guide')
+        with self.assertLogs('api.search', 'ERROR'):
+            self.assertEqual(self.ids('sourdough'), [item.id])
+
+    def test_update_trigger_only_watches_indexed_columns(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'api_saveditem_fts_au'")
+            self.assertIn('UPDATE OF title, summary, caption, category, hashtags', cursor.fetchone()[0])
@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+from django.test import TestCase
+
+from api.embeddings import HashingEmbedder, embed_item, vector_index
+from api.models import SavedItem
+
+
+def make_item(n, title, embedded=True, **fields):
+    item = SavedItem(url=f'https://example.com/{n}', title=title, **fields)
+    if embedded:
+        item.embedding = embed_item(item)
+    item.save()
+    return item
+
+
+class HashingEmbedderTests(TestCase):
+    def test_vectors_are_unit_length(self):
+        vectors = HashingEmbedder(dim=64).embed(['glute workout', ''])
+        self.assertAlmostEqual(float(np.linalg.norm(vectors[0])), 1.0, places=5)
+        self.assertEqual(float(np.linalg.norm(vectors[1])), 0.0)
+
+    def test_word_forms_are_closer_than_unrelated_text(self):
+        near, far, base = HashingEmbedder().embed(['glutes workouts', 'sourdough bread', 'glute workout'])
+        self.assertGreater(float(near @ base), float(far @ base) + 0.2)
+
+
+class SemanticSearchTests(TestCase):
+    def setUp(self):
+        # The index is process-wide; test rollbacks reuse ids it still holds.
+        with vector_index._lock:
+            vector_index._reset()
+
+    def semantic(self, q, **params):
+        response = self.client.get('/api/items/semantic/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def related(self, item):
+        response = self.client.get(f'/api/items/{item.id}/related/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_best_match_first_and_noise_dropped(self):
+        workout = make_item(0, 'Glute workout for beginners', category='Fitness')
+        make_item(1, 'Weekly leg day routine', category='Fitness')
+        make_item(2, 'Zzz qqq xxv', category='Misc')
+        results = self.semantic('glutes workouts')
+        self.assertEqual(results[0]['id'], workout.id)
+        self.assertGreater(results[0]['score'], 0.1)
+        self.assertNotIn('Zzz qqq xxv', [row['title'] for row in results])
+
+    def test_empty_query_returns_nothing(self):
+        make_item(0, 'Glute workout')
+        self.assertEqual(self.semantic(''), [])
+
+    def test_related_excludes_the_item_itself(self):
+        item = make_item(0, 'Sourdough starter guide', category='Food')
+        similar = make_item(1, 'Sourdough bread basics', category='Food')
+        make_item(2, 'Kubernetes networking deep dive', category='Tech')
+        results = self.related(item)
+        self.assertNotIn(item.id, [row['id'] for row in results])
+        self.assertEqual(results[0]['id'], similar.id)
+
+    def test_item_without_embedding_has_no_related(self):
+        make_item(0, 'Sourdough bread basics')
+        self.assertEqual(self.related(make_item(1, 'Sourdough starter', embedded=False)), [])
+
+    def test_edit_reembeds_and_delete_drops_from_the_index(self):
+        item = make_item(0, 'Sourdough starter guide')
+        self.semantic('sourdough')  # load the index
+        response = self.client.patch(
+            f'/api/items/{item.id}/', json.dumps({'title': 'Kettlebell swings'}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in self.semantic('kettlebell')], [item.id])
+        SavedItem.objects.get(pk=item.id).delete()
+        self.assertEqual(self.semantic('kettlebell'), [])
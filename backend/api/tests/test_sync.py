@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.models import DeletedItem, SavedItem
+from api.sync import changes_since, decode_cursor, encode_cursor
+
+
+def make_item(n, **fields):
+    return SavedItem.objects.create(url=f'https://example.com/{n}', title=f'Item {n}', **fields)
+
+
+class ConditionalListTests(TestCase):
+    def test_unchanged_collection_answers_304(self):
+        make_item(0)
+        first = self.client.get('/api/items/')
+        again = self.client.get('/api/items/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        self.assertEqual(again['ETag'], first['ETag'])
+
+    def test_any_change_invalidates_the_etag(self):
+        item = make_item(0)
+        etags = [self.client.get('/api/items/')['ETag']]
+        item.is_seen = True
+        item.save()
+        etags.append(self.client.get('/api/items/')['ETag'])
+        make_item(1)
+        etags.append(self.client.get('/api/items/')['ETag'])
+        item.delete()
+        etags.append(self.client.get('/api/items/')['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_etag_depends_on_the_query(self):
+        make_item(0)
+        etag = self.client.get('/api/items/')['ETag']
+        response = self.client.get('/api/items/', {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class ChangesTests(TestCase):
+    def changes(self, since=None):
+        response = self.client.get('/api/items/changes/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_reports_saves_and_deletes_since_the_list_cursor(self):
+        kept, doomed = make_item(0), make_item(1)
+        cursor = self.client.get('/api/items/')['X-Sync-Cursor']
+        kept.title = 'Renamed'
+        kept.save()
+        doomed_id = doomed.id
+        doomed.delete()
+        added = make_item(2)
+
+        body = self.changes(cursor)
+        changed = {row['id']: row for row in body['changed']}
+        self.assertEqual(changed[kept.id]['title'], 'Renamed')
+        self.assertIn(added.id, changed)
+        self.assertEqual(body['deleted'], [doomed_id])
+        self.assertFalse(body['has_more'])
+
+    def test_late_commit_behind_the_cursor_is_not_skipped(self):
+        make_item(0)
+        cursor = self.changes()['cursor']
+        # Stamped before the first item's transaction committed, visible only now.
+        late = make_item(1)
+        SavedItem.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(seconds=2))
+        self.assertIn(late.id, [row['id'] for row in self.changes(cursor)['changed']])
+
+    @override_settings(SYNC_OVERLAP_SECONDS=0)
+    def test_settled_changes_are_not_repeated(self):
+        make_item(0)
+        cursor = self.changes()['cursor']
+        body = self.changes(cursor)
+        self.assertEqual((body['changed'], body['deleted']), ([], []))
+
+    def test_burst_larger_than_a_page_inside_the_window_terminates(self):
+        items = [make_item(n) for n in range(5)]
+        seen, cursor, pages = [], None, 0
+        while True:
+            changed, _, cursor, has_more = changes_since(cursor, 2, ('id',))
+            seen += [row['id'] for row in changed]
+            pages += 1
+            if not has_more:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, [item.id for item in items])
+
+    def test_old_cursor_is_410(self):
+        updated_at, item_id, tombstone_id, _ = decode_cursor(self.changes()['cursor'])
+        stale = encode_cursor(updated_at, item_id, tombstone_id, timezone.now() - timedelta(days=365))
+        self.assertEqual(self.client.get('/api/items/changes/', {'since': stale}).status_code, 410)
+
+    def test_garbage_cursor_is_400(self):
+        self.assertEqual(self.client.get('/api/items/changes/', {'since': 'nope'}).status_code, 400)
+
+    def test_old_tombstones_are_not_resent(self):
+        item = make_item(0)
+        item.delete()
+        DeletedItem.objects.update(deleted_at=timezone.now() - timedelta(minutes=5))
+        cursor = self.changes()['cursor']
+        self.assertEqual(self.changes(cursor)['deleted'], [])
@@ -0,0 +1,137 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from api.models import SavedItem
+from api.thumbnails import (
+    ThumbnailError, collect_thumbnails, download_image, make_thumbnail, store_thumbnail, thumbnail_job,
+    thumbnail_source, thumbnail_url,
+)
+
+PUBLIC = {'93.184.215.14'}
+
+
+def image_bytes(size=(1200, 630), fmt='JPEG'):
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new('RGB', size, (200, 40, 40)).save(out, fmt)
+    return out.getvalue()
+
+
+def reply(status=200, body=b'', **headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update({'Content-Type': 'image/jpeg', **headers})
+    response.raw = io.BytesIO(body)
+    return response
+
+
+@mock.patch('api.thumbnails.resolve_host', return_value=PUBLIC)
+@mock.patch('api.thumbnails.get_session')
+class DownloadImageTests(SimpleTestCase):
+    def test_returns_the_image(self, session, resolve):
+        session.return_value.get.return_value = reply(body=b'jpeg')
+        self.assertEqual(download_image('https://cdn.example/a.jpg'), b'jpeg')
+        self.assertFalse(session.return_value.get.call_args.kwargs['allow_redirects'])
+
+    def test_private_loopback_and_link_local_hosts_are_refused(self, session, resolve):
+        for address in ('10.0.0.5', '127.0.0.1', '169.254.169.254', '::1', 'fe80::1%eth0', '::ffff:192.168.1.1'):
+            resolve.return_value = {'93.184.215.14', address}
+            with self.subTest(address=address), self.assertRaisesRegex(ThumbnailError, 'non-public'):
+                download_image('http://cdn.example/a.jpg')
+        session.return_value.get.assert_not_called()
+
+    def test_redirect_to_a_private_host_is_refused(self, session, resolve):
+        session.return_value.get.return_value = reply(302, Location='http://internal.example/secret')
+        resolve.side_effect = lambda host, port: PUBLIC if host == 'cdn.example' else {'192.168.0.10'}
+        with self.assertRaisesRegex(ThumbnailError, 'internal.example'):
+            download_image('https://cdn.example/a.jpg')
+        self.assertEqual(session.return_value.get.call_count, 1)
+
+    def test_public_redirects_are_followed_up_to_a_limit(self, session, resolve):
+        session.return_value.get.side_effect = [reply(301, Location='/b.jpg'), reply(body=b'jpeg')]
+        self.assertEqual(download_image('https://cdn.example/a.jpg'), b'jpeg')
+        self.assertEqual(session.return_value.get.call_args.args[0], 'https://cdn.example/b.jpg')
+        session.return_value.get.side_effect = lambda *args, **kwargs: reply(302, Location='/again')
+        with self.assertRaisesRegex(ThumbnailError, 'redirects'):
+            download_image('https://cdn.example/a.jpg')
+
+    def test_non_http_and_unresolvable_urls_are_refused(self, session, resolve):
+        with self.assertRaisesRegex(ThumbnailError, 'http'):
+            download_image('file:///etc/passwd')
+        resolve.side_effect = OSError('Name or service not known')
+        with self.assertRaisesRegex(ThumbnailError, 'resolve'):
+            download_image('https://nowhere.example/a.jpg')
+
+    @override_settings(THUMBNAIL_MAX_SOURCE_BYTES=1000)
+    def test_size_cap_applies_to_declared_and_streamed_length(self, session, resolve):
+        session.return_value.get.return_value = reply(body=b'x', **{'Content-Length': '5000'})
+        with self.assertRaisesRegex(ThumbnailError, 'larger'):
+            download_image('https://cdn.example/a.jpg')
+        session.return_value.get.return_value = reply(body=b'x' * 5000)
+        with self.assertRaisesRegex(ThumbnailError, 'larger'):
+            download_image('https://cdn.example/a.jpg')
+
+    def test_non_images_are_skipped(self, session, resolve):
+        session.return_value.get.return_value = reply(body=b'<html>', **{'Content-Type': 'text/html'})
+        with self.assertRaisesRegex(ThumbnailError, 'not an image'):
+            download_image('https://cdn.example/a.jpg')
+
+
+class MakeThumbnailTests(SimpleTestCase):
+    @override_settings(THUMBNAIL_MAX_SIZE=64)
+    def test_shrinks_to_webp(self):
+        from PIL import Image
+
+        with Image.open(io.BytesIO(make_thumbnail(image_bytes(fmt='PNG')))) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (64, 34)))
+
+    def test_garbage_is_a_thumbnail_error(self):
+        with self.assertRaises(ThumbnailError):
+            make_thumbnail(b'not an image')
+
+    def test_source_prefers_the_page_image_then_the_youtube_still(self):
+        self.assertEqual(thumbnail_source('https://a.example/p/', 'blog', {'image': '/i.jpg'}), 'https://a.example/i.jpg')
+        self.assertIn('/vi/abc/', thumbnail_source('https://youtu.be/abc', 'youtube', {}))
+        self.assertIsNone(thumbnail_source('https://a.example/', 'blog', {}))
+
+
+class StoreTests(TestCase):
+    def setUp(self):
+        self.store = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store)
+        settings_override = override_settings(THUMBNAIL_DIR=self.store, ITEM_WRITE_COALESCING=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_store_is_content_addressed(self):
+        name = store_thumbnail(b'webp')
+        self.assertEqual(store_thumbnail(b'webp'), name)
+        with open(os.path.join(self.store, name), 'rb') as f:
+            self.assertEqual(f.read(), b'webp')
+
+    @mock.patch('api.thumbnails.download_image', return_value=image_bytes())
+    def test_job_sets_media_url(self, download):
+        item = SavedItem.objects.create(url='https://a.example/1')
+        thumbnail_job({'item_id': item.pk, 'image_url': 'https://cdn.example/a.jpg'})
+        item.refresh_from_db()
+        self.assertTrue(item.media_url.startswith('/thumbs/'))
+
+    def test_collect_drops_orphans_and_clears_evicted_items(self):
+        kept, orphan = store_thumbnail(b'kept'), store_thumbnail(b'orphan')
+        old = time.time() - 7200
+        os.utime(os.path.join(self.store, orphan), (old, old))
+        item = SavedItem.objects.create(url='https://a.example/1', media_url=thumbnail_url(kept))
+        gone = SavedItem.objects.create(url='https://a.example/2', media_url=thumbnail_url('ab/missing.webp'))
+        self.assertEqual(collect_thumbnails(), (1, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.store, orphan)))
+        item.refresh_from_db()
+        gone.refresh_from_db()
+        self.assertEqual((item.media_url, gone.media_url), (thumbnail_url(kept), None))
@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.db import OperationalError, transaction
+from django.test import TestCase
+
+from api.idempotency import claim_message
+from api.models import OutboundMessage, ProcessedMessage
+
+
+WEBHOOK_URL = '/api/webhook/whatsapp/'
+
+
+def webhook_payload(message_id, text="hello"):
+    return {'entry': [{'changes': [{'value': {'messages': [
+        {'id': message_id, 'from': '15550001', 'type': 'text', 'text': {'body': text}},
+    ]}}]}]}
+
+
+class ClaimMessageTests(TestCase):
+    def test_redelivery_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(claim_message('wamid.1'))
+        self.assertFalse(claim_message('wamid.1'))
+
+    def test_redelivery_is_dropped_by_another_process(self):
+        # Not in this process's memory: the unique row decides.
+        ProcessedMessage.objects.create(message_id='wamid.2')
+        self.assertFalse(claim_message('wamid.2'))
+
+    def test_rolled_back_claim_can_be_made_again(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.assertTrue(claim_message('wamid.3'))
+            raise ValueError
+        self.assertTrue(claim_message('wamid.3'))
+
+    def test_missing_id_is_always_new(self):
+        self.assertTrue(claim_message(None))
+        self.assertTrue(claim_message(None))
+
+    def test_webhook_counts_a_redelivery_once(self):
+        for _ in range(2):
+            response = self.client.post(WEBHOOK_URL, webhook_payload('wamid.4'), content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(OutboundMessage.objects.count(), 2)  # the ack and the "send me a link" hint, once
+
+    def test_failed_webhook_asks_meta_to_redeliver(self):
+        with mock.patch('api.views.queue_messages', side_effect=OperationalError("database is locked")):
+            response = self.client.post(WEBHOOK_URL, webhook_payload('wamid.5'), content_type='application/json')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(ProcessedMessage.objects.filter(message_id='wamid.5').exists())
+
+    def test_malformed_payload_is_acknowledged(self):
+        for payload in ({'entry': 'bad'}, [1, 2], {'entry': [{'changes': [{'value': {'messages': [
+                {'id': 'wamid.6', 'type': 'text', 'text': {'body': 42}}]}}]}]}):
+            response = self.client.post(WEBHOOK_URL, payload, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        self.assertFalse(ProcessedMessage.objects.exists())
+
+    def test_bug_is_not_redelivered_forever(self):
+        with mock.patch('api.views.queue_messages', side_effect=KeyError('oops')):
+            response = self.client.post(WEBHOOK_URL, webhook_payload('wamid.7'), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,27 @@
+from django.test import TestCase
+
+from api.models import SavedItem
+from api.writer import Write, write_batch
+
+
+class ItemWriterTests(TestCase):
+    def test_batch_writes_every_item(self):
+        writes = [Write([SavedItem(url=f"https://example.com/{i}")]) for i in range(3)]
+        write_batch(writes)
+        self.assertTrue(all(write.future.result().pk for write in writes))
+        self.assertEqual(SavedItem.objects.count(), 3)
+
+    def test_duplicate_url_resolves_to_none(self):
+        SavedItem.objects.create(url='https://example.com/taken')
+        writes = [Write([SavedItem(url='https://example.com/taken')]), Write([SavedItem(url='https://example.com/new')])]
+        write_batch(writes)
+        self.assertIsNone(writes[0].future.result())
+        self.assertEqual(writes[1].future.result().url, 'https://example.com/new')
+
+    def test_failed_batch_falls_back_to_one_write_at_a_time(self):
+        good = Write([SavedItem(url='https://example.com/good')])
+        bad = Write([SavedItem(url='https://example.com/bad', item_type=None)])
+        write_batch([good, bad])
+        self.assertEqual(good.future.result().url, 'https://example.com/good')
+        self.assertIsNotNone(bad.future.exception())
+        self.assertEqual(list(SavedItem.objects.values_list('url', flat=True)), ['https://example.com/good'])
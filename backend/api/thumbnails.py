@@ -0,0 +1,354 @@
+"""
+Server-side card thumbnails.
+
+After an item is saved, a 'thumbnail' job downloads its preview image (the
+page's og:image / twitter:image, or the video still for YouTube links),
+shrinks it to THUMBNAIL_MAX_SIZE and re-encodes it as WebP. The file name is a
+hash of the encoded bytes, so the store is content-addressed: identical images
+are kept once, and a name never changes meaning. That is what lets
+ThumbnailMiddleware serve them with an immutable, year-long Cache-Control.
+The item's media_url points at the file.
+
+The image URL comes from the page, so it is only fetched from public
+addresses: every hop of a redirect chain is resolved first and refused if any
+address is private, loopback, link-local or otherwise not globally routable.
+
+Files never change but can go away: a periodic job deletes thumbnails no item
+uses, then the least recently stored ones until the store fits in
+THUMBNAIL_DISK_BUDGET_MB, and clears media_url on items whose file is gone
+(evicted, or lost with an ephemeral disk) so the dashboard falls back.
+
+Pillow is imported on first use, to keep it out of cold starts.
+"""
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urljoin, urlsplit
+
+from django.conf import settings
+from django.utils import timezone
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import MissingFileError
+
+from .http import get_session
+from .jobs import enqueue_jobs, job_handler, periodic_job
+from .models import SavedItem
+from .observability import stage
+from .resilience import check_status
+from .utils import SOCIAL_HEADERS
+from .writer import item_writer
+
+logger = logging.getLogger(__name__)
+
+IMAGE_HEADERS = {
+    'User-Agent': SOCIAL_HEADERS['User-Agent'],
+    'Accept': 'image/webp,image/avif,image/*;q=0.8',
+}
+IMAGE_TIMEOUT = 15
+MAX_REDIRECTS = 5
+CHUNK_SIZE = 64 * 1024
+# A file this young may belong to an item update that hasn't committed yet.
+ORPHAN_GRACE_SECONDS = 3600
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+class ThumbnailError(Exception):
+    """The image can't be turned into a thumbnail; retrying won't help."""
+
+
+def youtube_thumbnail(url):
+    """The video still of a YouTube link, or None."""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').removeprefix('www.').removeprefix('m.')
+    video_id = None
+    if host == 'youtu.be':
+        video_id = parts.path.strip('/').split('/')[0]
+    elif host.endswith('youtube.com'):
+        if parts.path.startswith('/shorts/'):
+            video_id = parts.path.split('/')[2]
+        else:
+            video_id = parse_qs(parts.query).get('v', [None])[0]
+    return settings.YOUTUBE_THUMBNAIL_URL.format(id=video_id) if video_id else None
+
+
+def thumbnail_source(url, item_type, scraped_data):
+    """Absolute URL of the image to thumbnail an item with, or None."""
+    image = scraped_data.get('image')
+    if image:
+        return urljoin(url, image)
+    if item_type == 'youtube':
+        return youtube_thumbnail(url)
+    # A bare og:video stream has no still to take without decoding it.
+    return None
+
+
+def queue_thumbnails(saved):
+    """Queue thumbnails for freshly saved [(item, scraped_data)] whose pages named a preview image."""
+    if not settings.THUMBNAILS_ENABLED:
+        return
+    payloads = []
+    for item, scraped_data in saved:
+        source = None if item.media_url else thumbnail_source(item.url, item.item_type, scraped_data)
+        if source:
+            payloads.append({'item_id': item.pk, 'image_url': source})
+    enqueue_jobs('thumbnail', payloads, dedupe_field='item_id')
+
+
+def queue_thumbnail(item, scraped_data):
+    queue_thumbnails([(item, scraped_data)])
+
+
+def thumbnail_url(name):
+    return f"{settings.THUMBNAIL_URL}{name}"
+
+
+def resolve_host(host, port):
+    """Every address `host` resolves to."""
+    return {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+
+
+def check_public_url(url):
+    """Raise ThumbnailError unless `url` is http(s) on a host with only public addresses."""
+    parts = urlsplit(url)
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError as e:
+        raise ThumbnailError(f"bad URL: {e}") from e
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ThumbnailError(f"not an http(s) URL: {url}")
+    try:
+        addresses = resolve_host(parts.hostname, port)
+    except (OSError, UnicodeError) as e:
+        raise ThumbnailError(f"can't resolve {parts.hostname}: {e}") from e
+    for address in addresses:
+        # Scoped IPv6 addresses carry a %interface suffix.
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if not ip.is_global or ip.is_multicast:
+            raise ThumbnailError(f"{parts.hostname} resolves to non-public address {ip}")
+
+
+def download_image(url):
+    """The image's bytes. Raises ThumbnailError when it isn't a usable image."""
+    session = get_session()
+    # Redirects are followed by hand so every hop is checked before it is fetched.
+    for _ in range(MAX_REDIRECTS + 1):
+        check_public_url(url)
+        response = session.get(url, headers=IMAGE_HEADERS, timeout=IMAGE_TIMEOUT, stream=True, allow_redirects=False)
+        if not response.is_redirect:
+            break
+        response.close()
+        url = urljoin(url, response.headers['Location'])
+    else:
+        raise ThumbnailError(f"more than {MAX_REDIRECTS} redirects")
+    with response:
+        # 429/5xx raise, so the job is retried with backoff.
+        check_status('thumbnail', response.status_code)
+        if response.status_code != 200:
+            raise ThumbnailError(f"HTTP {response.status_code}")
+        content_type = response.headers.get('Content-Type', '')
+        if not content_type.startswith('image/'):
+            raise ThumbnailError(f"not an image ({content_type or 'no Content-Type'})")
+        declared = response.headers.get('Content-Length', '')
+        if declared.isdigit() and int(declared) > settings.THUMBNAIL_MAX_SOURCE_BYTES:
+            raise ThumbnailError(f"larger than {settings.THUMBNAIL_MAX_SOURCE_BYTES} bytes")
+        data = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            data += chunk
+            if len(data) > settings.THUMBNAIL_MAX_SOURCE_BYTES:
+                raise ThumbnailError(f"larger than {settings.THUMBNAIL_MAX_SOURCE_BYTES} bytes")
+    return bytes(data)
+
+
+def make_thumbnail(data):
+    """Shrink and re-encode image bytes as WebP."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    size = (settings.THUMBNAIL_MAX_SIZE, settings.THUMBNAIL_MAX_SIZE)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # JPEGs can be decoded straight at a fraction of their size.
+            image.draft('RGB', size)
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+            out = io.BytesIO()
+            image.save(out, 'WEBP', quality=settings.THUMBNAIL_QUALITY, method=4)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+        raise ThumbnailError(f"can't decode image: {e}") from e
+    return out.getvalue()
+
+
+def get_encoder():
+    """
+    The few threads that decode and encode images. Pillow's buffers come from
+    the calling thread's malloc arena, so letting every job worker do it grows
+    each of their arenas by the size of a decoded image.
+    """
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = ThreadPoolExecutor(
+                    max_workers=settings.THUMBNAIL_ENCODER_THREADS, thread_name_prefix='thumbnail',
+                )
+    return _encoder
+
+
+def store_thumbnail(webp):
+    """Write WebP bytes to the store under their content hash. Returns the name."""
+    digest = hashlib.sha256(webp).hexdigest()[:32]
+    name = f"{digest[:2]}/{digest}.webp"
+    path = os.path.join(settings.THUMBNAIL_DIR, name)
+    if os.path.exists(path):
+        # Already stored for another item; count it as fresh for eviction.
+        os.utime(path)
+        return name
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Readers must never see a half-written file.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(webp)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return name
+
+
+@job_handler('thumbnail')
+def thumbnail_job(payload):
+    item = SavedItem.objects.filter(pk=payload['item_id'], media_url__isnull=True).only('id').first()
+    if item is None:
+        return
+    with stage('thumbnail') as timer:
+        try:
+            data = download_image(payload['image_url'])
+            name = store_thumbnail(get_encoder().submit(make_thumbnail, data).result())
+        except ThumbnailError as e:
+            timer.result = 'skipped'
+            logger.info("No thumbnail: %s", e, extra={'item_id': item.pk, 'url': payload['image_url']})
+            return
+    item.media_url = thumbnail_url(name)
+    # bulk_update skips auto_now; sync clients key off updated_at.
+    item.updated_at = timezone.now()
+    item_writer.update([item], ('media_url', 'updated_at')).result()
+
+
+def scan_store():
+    """{media_url: (path, size, mtime)} for every file in the store."""
+    files = {}
+    root = settings.THUMBNAIL_DIR
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not filename.endswith('.webp'):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            files[thumbnail_url(name)] = (path, st.st_size, st.st_mtime)
+    return files
+
+
+def clear_media_urls(urls):
+    """Unlink items from thumbnails that are gone. Returns how many were updated."""
+    urls = list(urls)
+    items = []
+    now = timezone.now()
+    for i in range(0, len(urls), 500):
+        for item in SavedItem.objects.filter(media_url__in=urls[i:i + 500]).only('id'):
+            item.media_url = None
+            item.updated_at = now
+            items.append(item)
+    if items:
+        item_writer.update(items, ('media_url', 'updated_at')).result()
+    return len(items)
+
+
+def collect_thumbnails(budget_bytes=None):
+    """
+    Delete unused thumbnails, then the oldest until the store fits the disk
+    budget, and unlink items from files that are gone. Returns (deleted, cleared).
+    """
+    budget = settings.THUMBNAIL_DISK_BUDGET_MB * 1024 * 1024 if budget_bytes is None else budget_bytes
+    # Items first: a thumbnail stored after this query is younger than the grace period.
+    used = set(
+        SavedItem.objects.filter(media_url__startswith=settings.THUMBNAIL_URL)
+        .values_list('media_url', flat=True).distinct()
+    )
+    files = scan_store()
+    missing = used - files.keys()
+
+    now = time.time()
+    doomed = [url for url, (_, _, mtime) in files.items() if url not in used and now - mtime > ORPHAN_GRACE_SECONDS]
+    total = sum(size for url, (_, size, _) in files.items() if url not in doomed)
+    evicted = []
+    if total > budget:
+        # Oldest first; store_thumbnail refreshes the mtime of a file it reuses.
+        for url in sorted((url for url in files if url not in doomed), key=lambda url: files[url][2]):
+            if total <= budget:
+                break
+            evicted.append(url)
+            total -= files[url][1]
+
+    deleted = 0
+    for url in doomed + evicted:
+        try:
+            os.unlink(files[url][0])
+            deleted += 1
+        except FileNotFoundError:
+            pass
+    cleared = clear_media_urls(missing | set(evicted))
+    if deleted or cleared:
+        logger.info("Thumbnails: deleted %s files, cleared %s items", deleted, cleared)
+    return deleted, cleared
+
+
+@periodic_job('collect_thumbnails', settings.THUMBNAIL_GC_INTERVAL)
+def collect_thumbnails_job():
+    collect_thumbnails()
+
+
+class ThumbnailMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, plus the thumbnail store under THUMBNAIL_URL. The store gains
+    files at runtime, so those are looked up per request instead of indexed
+    at startup, and marked immutable: a name is a hash of its contents.
+    """
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        # Trailing separator, as path_is_child_of expects.
+        self.thumbnail_root = os.path.join(os.path.abspath(settings.THUMBNAIL_DIR), '')
+        self.thumbnail_prefix = urlsplit(settings.THUMBNAIL_URL).path
+
+    def __call__(self, request):
+        url = request.path_info
+        if url.startswith(self.thumbnail_prefix) and url.endswith('.webp') and self.url_is_canonical(url):
+            path = os.path.join(self.thumbnail_root, url[len(self.thumbnail_prefix):])
+            if self.path_is_child_of(path, self.thumbnail_root):
+                try:
+                    return self.serve(self.get_static_file(path, url), request)
+                except (MissingFileError, FileNotFoundError):
+                    # Evicted; fall through to a 404.
+                    pass
+        return super().__call__(request)
+
+    def immutable_file_test(self, path, url):
+        if url.startswith(self.thumbnail_prefix):
+            return True
+        return super().immutable_file_test(path, url)
@@ -1,11 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SavedItemViewSet, whatsapp_webhook
+from .views import SavedItemViewSet, healthz, item_events, item_export, whatsapp_webhook
 
 router = DefaultRouter()
 router.register(r'items', SavedItemViewSet)
 
 urlpatterns = [
+    # Ahead of the router, whose items/<pk>/ route would otherwise claim it
+    path('items/events/', item_events, name='item_events'),
+    path('items/export/', item_export, name='item_export'),
     path('', include(router.urls)),
     path('webhook/whatsapp/', whatsapp_webhook, name='whatsapp_webhook'),
+    path('healthz', healthz, name='healthz'),
 ]
@@ -1,16 +1,42 @@
 import os
-import requests
-from bs4 import BeautifulSoup
-from google import genai
-from urllib.parse import urlparse
+import threading
+from urllib.parse import urlparse, urlsplit, urlunsplit, parse_qsl, urlencode
+from django.conf import settings
 import re
 import time
+import logging
+from .http import get_session
+from .cache import TieredCache
+from .scraping import race_layers, while_running
+from .resilience import check_status, guarded
+from .htmlmeta import CHUNK_SIZE, content_charset, extract_head_meta
+from .observability import FALLBACKS, SCRAPE_BYTES, stage
+
+logger = logging.getLogger(__name__)
 
 # Configure Gemini - Using verified models
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "YOUR_GEMINI_API_KEY")
-client = genai.Client(api_key=GEMINI_API_KEY)
 MODEL_NAME = "gemini-3-flash-preview"
 
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The shared Gemini client, built on first use. google.genai pulls in
+    pydantic and its own HTTP stack, which is most of our import time, so
+    cold starts that only serve the API never pay for it.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+                _client = genai.Client(api_key=GEMINI_API_KEY)
+    return _client
+
+
 def get_url_type(url):
     domain = urlparse(url).netloc.lower()
     if 'instagram.com' in domain:
@@ -24,98 +50,219 @@ def get_url_type(url):
     else:
         return 'web'
 
-def scrape_social_metadata(url, platform):
-    """Specialized scraping for social media to avoid login walls."""
-    headers = {
-        'User-Agent': 'facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-    }
-    
-    target_url = url
+# Query parameters that only track where a link was shared from.
+TRACKING_PARAMS = {
+    'igsh', 'igshid', 'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid',
+    'ref', 'ref_src', 'ref_url', 'si', 'feature', 'share_id', 'is_from_webapp', 'sender_device',
+}
+# Extra per-platform share parameters (e.g. x.com's ?s=20&t=..., YouTube start offsets)
+PLATFORM_TRACKING_PARAMS = {
+    'x': {'s', 't'},
+    'youtube': {'t', 'pp'},
+    'tiktok': {'_r', '_t'},
+}
+
+def canonicalize_url(url):
+    """
+    Normalize a URL so the same content shared different ways maps to one key:
+    drops tracking params and fragments, folds twitter.com into x.com and
+    youtu.be into youtube.com/watch.
+    """
+    parts = urlsplit(url.strip())
+    platform = get_url_type(url)
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.') or host.startswith('m.') or host.startswith('mobile.'):
+        host = host.split('.', 1)[1]
+    path = parts.path or '/'
+    query = parse_qsl(parts.query, keep_blank_values=True)
+
+    if host in ('twitter.com', 'x.com'):
+        host = 'x.com'
+    elif host == 'youtu.be':
+        video_id = path.strip('/').split('/')[0]
+        host, path = 'youtube.com', '/watch'
+        query = [('v', video_id)] + query
+
+    drop = TRACKING_PARAMS | PLATFORM_TRACKING_PARAMS.get(platform, set())
+    query = sorted(
+        (k, v) for k, v in query
+        if k.lower() not in drop and not k.lower().startswith('utm_')
+    )
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    return urlunsplit(('https', host, path, urlencode(query), ''))
+
+def scrape_cache_ttl(url, data):
+    """Per-platform freshness; restricted results are cached briefly so a failing link isn't hammered."""
+    if data.get('status') == 'restricted':
+        return settings.SCRAPE_CACHE_NEGATIVE_TTL
+    return settings.SCRAPE_CACHE_TTLS.get(get_url_type(url), settings.SCRAPE_CACHE_DEFAULT_TTL)
+
+scrape_cache = TieredCache('scrape', maxsize=settings.SCRAPE_CACHE_LRU_SIZE)
+
+SOCIAL_HEADERS = {
+    'User-Agent': 'facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+}
+SOCIAL_TIMEOUT = 15
+JINA_TIMEOUT = 12
+
+def social_target_url(url, platform):
     if platform == 'x':
-        target_url = url.replace('twitter.com', 'vxtwitter.com').replace('x.com', 'vxtwitter.com')
-    
+        return url.replace('twitter.com', 'vxtwitter.com').replace('x.com', 'vxtwitter.com')
+    return url
+
+def first_meta(meta, *keys):
+    return next((meta[key] for key in keys if meta.get(key)), None)
+
+def parse_social_meta(meta):
+    """Scraped data from a page's OpenGraph/Twitter card tags (see htmlmeta). Returns None if there are none."""
+    title = first_meta(meta, 'og:title', 'twitter:title')
+    description = first_meta(meta, 'og:description', 'twitter:description')
+    if not (title or description):
+        return None
+    data = {
+        'title': title,
+        'caption': description or "",
+        'body_text': f"Site: {meta.get('og:site_name')}\nDescription: {description}",
+        'status': 'ok'
+    }
+    media = {
+        'image': first_meta(meta, 'og:image:secure_url', 'og:image', 'twitter:image', 'twitter:image:src'),
+        'video': first_meta(meta, 'og:video:secure_url', 'og:video:url', 'og:video', 'twitter:player:stream'),
+        'published_at': meta.get('article:published_time'),
+    }
+    data.update({key: value for key, value in media.items() if value})
+    return data
+
+def jina_reader_url(url):
+    return f"{settings.JINA_READER_URL}{url}"
+
+def parse_jina_response(status_code, content, url):
+    """Turn a Jina Reader markdown response into scraped data, or None if it hit a wall."""
+    if status_code != 200 or "Log In" in content[:400]:
+        return None
+    return {
+        'title': content.split('\n')[0].strip('# ') if content else url,
+        'caption': content[:800],
+        'body_text': content[:3000],
+        'status': 'ok'
+    }
+
+def restricted_fallback(url, platform):
+    return {
+        'title': f"Saved {platform.capitalize()} Link",
+        'caption': "",
+        'body_text': f"URL: {url}",
+        'status': 'restricted',
+        'source': 'restricted',
+    }
+
+def scrape_social_metadata(url, platform, timeout=SOCIAL_TIMEOUT, cancelled=None):
+    """Specialized scraping for social media to avoid login walls. Gives up once `cancelled` is set."""
+    if cancelled is not None and cancelled.is_set():
+        return None
     try:
-        print(f"Bypassing login wall for {platform}")
-        response = requests.get(target_url, headers=headers, timeout=15)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            meta_data = {
-                'title': soup.find('meta', property='og:title') or soup.find('meta', name='twitter:title'),
-                'description': soup.find('meta', property='og:description') or soup.find('meta', name='twitter:description'),
-                'site_name': soup.find('meta', property='og:site_name'),
-            }
-            
-            info = {k: v['content'] if v and v.has_attr('content') else None for k, v in meta_data.items()}
-            
-            if info['title'] or info['description']:
-                return {
-                    'title': info['title'],
-                    'caption': info['description'] or "",
-                    'body_text': f"Site: {info['site_name']}\nDescription: {info['description']}",
-                    'status': 'ok'
-                }
+        logger.debug("Bypassing login wall for %s", platform)
+        # Streamed: the card tags are in the head, so stop reading there.
+        with get_session().get(
+            social_target_url(url, platform), headers=SOCIAL_HEADERS, timeout=min(timeout, SOCIAL_TIMEOUT), stream=True,
+        ) as response:
+            if response.status_code == 200:
+                meta, read = extract_head_meta(
+                    while_running(response.iter_content(CHUNK_SIZE), cancelled),
+                    content_charset(response.headers.get('Content-Type')),
+                )
+                SCRAPE_BYTES.inc(read, layer='social')
+                if cancelled is not None and cancelled.is_set():
+                    return None
+                return parse_social_meta(meta)
     except Exception as e:
-        print(f"Social bypass failed: {e}")
+        logger.warning("Social bypass failed: %s", e, extra={'url': url, 'platform': platform})
     
     return None
 
-def scrape_metadata(url):
-    """Robust multi-layered scraping. Always returns a dict for the LLM to process."""
-    platform = get_url_type(url)
-    print(f"\n--- SCRAPING START: {url} ---")
-    
+def scrape_jina(url, timeout=JINA_TIMEOUT, cancelled=None):
+    """Jina Reader: renders the page server-side and returns markdown. Gives up once `cancelled` is set."""
+    # Checked before the guard, so a layer that lost while queued spends no rate-limit token.
+    if cancelled is not None and cancelled.is_set():
+        return None
+    try:
+        jina_url = jina_reader_url(url)
+        logger.debug("Layer 2 attempting Jina: %s", jina_url)
+        with guarded('jina'):
+            response = get_session().get(
+                jina_url, headers={'X-Return-Format': 'markdown'}, timeout=min(timeout, JINA_TIMEOUT), stream=True,
+            )
+            check_status('jina', response.status_code)
+        with response:
+            body = b''.join(while_running(response.iter_content(CHUNK_SIZE), cancelled))
+        if cancelled is not None and cancelled.is_set():
+            return None
+        SCRAPE_BYTES.inc(len(body), layer='jina')
+        return parse_jina_response(response.status_code, body.decode(response.encoding or 'utf-8', errors='replace'), url)
+    except Exception as e:
+        logger.warning("Jina layer failed: %s", e, extra={'url': url})
+    return None
+
+def scrape_layers(url, platform):
+    """Scrape layers applicable to this URL, in default priority order."""
+    layers = {}
     # Layer 1: Social Bypass
     if platform in ['instagram', 'x', 'tiktok']:
-        social_data = scrape_social_metadata(url, platform)
-        if social_data:
-            print(f"Layer 1 (Social) Success: {social_data['title']}")
-            return social_data
-
+        layers['social'] = lambda timeout, cancelled: scrape_social_metadata(url, platform, timeout, cancelled)
     # Layer 2: Jina Reader
-    try:
-        jina_url = f"https://r.jina.ai/{url}"
-        print(f"Layer 2 attempting Jina: {jina_url}")
-        response = requests.get(jina_url, headers={'X-Return-Format': 'markdown'}, timeout=12)
-        
-        if response.status_code == 200 and "Log In" not in response.text[:400]:
-            content = response.text
-            data = {
-                'title': content.split('\n')[0].strip('# ') if content else url,
-                'caption': content[:800],
-                'body_text': content[:3000],
-                'status': 'ok'
-            }
-            print(f"Layer 2 (Jina) Success: {data['title']}")
-            return data
-    except Exception as e:
-        print(f"Layer 2 Error: {e}")
+    layers['jina'] = lambda timeout, cancelled: scrape_jina(url, timeout, cancelled)
+    return layers
+
+def scrape_metadata(url):
+    """Robust multi-layered scraping, served from the scrape cache when possible."""
+    with stage('scrape') as timer:
+        key = canonicalize_url(url)
+        cached = scrape_cache.get(key)
+        if cached is not None:
+            logger.debug("Scrape cache hit: %s", key)
+            timer.result = 'cache'
+            return cached
+
+        data = fetch_metadata(url)
+        timer.result = data['source']
+        scrape_cache.set(key, data, ttl=scrape_cache_ttl(url, data))
+    logger.info("Scraped", extra={'url': url, 'layer': data['source'], 'seconds': round(timer.seconds, 3)})
+    return data
+
+def fetch_metadata(url):
+    """
+    Multi-layered scrape straight from the network. Layers are raced with hedging
+    (see api/scraping.py) rather than tried serially. Always returns a dict for the LLM to process.
+    """
+    platform = get_url_type(url)
+    logger.debug("Scraping %s", url)
+
+    layer, data = race_layers(platform, scrape_layers(url, platform))
+    if data:
+        logger.debug("Layer %s won: %s", layer, data['title'])
+        return {**data, 'source': layer}
 
     # Layer 3: Fallback
-    fallback_data = {
-        'title': f"Saved {platform.capitalize()} Link",
-        'caption': "",
-        'body_text': f"URL: {url}",
-        'status': 'restricted'
-    }
-    print("Layer 3: Falling back to restricted mode")
-    return fallback_data
+    logger.info("All scrape layers failed, falling back to restricted mode", extra={'url': url})
+    FALLBACKS.inc(stage='scrape')
+    return restricted_fallback(url, platform)
 
-def process_with_ai(url, scraped_data):
-    """Generates high-quality metadata using LLM. Always called regardless of scrape result."""
+CATEGORIES = [
+    "AI & Machine Learning", "Coding & Development", "Design & Creative", 
+    "Business & Startups", "Marketing & Growth", "Finance & Crypto", 
+    "Health & Fitness", "Food & Cooking", "Travel & Adventure", 
+    "Personal Development", "News & Politics", "Entertainment & Pop Culture",
+    "Science & Tech", "Gaming", "Productivity", "Social Media Trends", "Other"
+]
+
+def build_ai_prompt(url, scraped_data):
     platform = get_url_type(url)
-    print(f"AI Input Data: {scraped_data}")
-    
-    categories_list = [
-        "AI & Machine Learning", "Coding & Development", "Design & Creative", 
-        "Business & Startups", "Marketing & Growth", "Finance & Crypto", 
-        "Health & Fitness", "Food & Cooking", "Travel & Adventure", 
-        "Personal Development", "News & Politics", "Entertainment & Pop Culture",
-        "Science & Tech", "Gaming", "Productivity", "Social Media Trends", "Other"
-    ]
+    categories_list = CATEGORIES
     
-    prompt = f"""
+    return f"""
     You are an expert Content Curator. Transform the following data into a premium entry.
     
     SOURCE URL: {url}
@@ -140,30 +287,86 @@ def process_with_ai(url, scraped_data):
       "hashtags": ["tag1", "tag2"]
     }}
     """
+
+def normalize_ai_output(ai_output, url, scraped_data):
+    platform = get_url_type(url)
+    return {
+        'title': ai_output.get('title', scraped_data.get('title')),
+        'category': ai_output.get('category', 'Other'),
+        'summary': ai_output.get('summary', 'Curated content saved for later review.'),
+        'hashtags': ai_output.get('hashtags', [platform]),
+        'source': 'gemini',
+    }
+
+def ai_fallback(url):
+    """Final emergency fallback if even the LLM fails"""
+    platform = get_url_type(url)
+    domain = urlparse(url).netloc.split('.')[-2].capitalize() if '.' in url else "Web"
+    return {
+        'title': f"Resource from {domain}",
+        'category': "Other",
+        'summary': f"A link saved from {domain}. Click source to view.",
+        'hashtags': [platform, domain.lower()],
+        'source': 'fallback',
+    }
+
+def process_with_ai(url, scraped_data):
+    """
+    Generates high-quality metadata using LLM. Always called regardless of scrape result.
+    Goes through the batcher in api/enrichment.py, which caches and coalesces requests.
+    """
+    from .enrichment import ai_batcher
+    logger.debug("AI input data: %s", scraped_data)
+    with stage('ai') as timer:
+        ai_data = ai_batcher.submit(url, scraped_data).result(timeout=settings.AI_RESULT_TIMEOUT)
+        timer.result = ai_data.get('source', 'gemini')
+    return ai_data
+
+def whatsapp_request(to, text):
+    """Build (url, headers, body) for a Graph API text message, or None without credentials."""
+    access_token = os.environ.get("WHATSAPP_ACCESS_TOKEN")
+    phone_number_id = os.environ.get("WHATSAPP_PHONE_NUMBER_ID")
     
-    import json
-    try:
-        response = client.models.generate_content(
-            model=MODEL_NAME, 
-            contents=prompt,
-            config={'response_mime_type': 'application/json'}
-        )
-        print(f"Raw AI Response: {response.text}")
-        ai_output = json.loads(response.text)
-            
-        return {
-            'title': ai_output.get('title', scraped_data.get('title')),
-            'category': ai_output.get('category', 'Other'),
-            'summary': ai_output.get('summary', 'Curated content saved for later review.'),
-            'hashtags': ai_output.get('hashtags', [platform])
-        }
-    except Exception as e:
-        print(f"LLM Processing Failed: {e}")
-        # Final emergency fallback if even the LLM fails
-        domain = urlparse(url).netloc.split('.')[-2].capitalize() if '.' in url else "Web"
-        return {
-            'title': f"Resource from {domain}",
-            'category': "Other",
-            'summary': f"A link saved from {domain}. Click source to view.",
-            'hashtags': [platform, domain.lower()]
-        }
+    if not access_token or not phone_number_id:
+        logger.error("Missing WhatsApp API credentials in environment variables")
+        return None
+
+    url = f"{settings.WHATSAPP_API_URL}{phone_number_id}/messages"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+    }
+    data = {
+        "messaging_product": "whatsapp",
+        "to": to,
+        "type": "text",
+        "text": {"body": text},
+    }
+    return url, headers, data
+
+def handle_whatsapp_response(to, status_code, body):
+    logger.debug("Meta API response %s: %s", status_code, body)
+    
+    if status_code != 200:
+        logger.warning("Failed to send WhatsApp message", extra={'to': to, 'status': status_code})
+
+def send_whatsapp_message(to, text):
+    """
+    Send one message via the Meta WhatsApp Cloud API. Returns the HTTP status,
+    or None without credentials. Network errors and back-off statuses (429/5xx)
+    raise, so the outbox (api/outbox.py) can retry; callers queue replies there
+    rather than calling this directly.
+    """
+    request = whatsapp_request(to, text)
+    if request is None:
+        return None
+    url, headers, data = request
+
+    logger.debug("Sending message to %s", to)
+    with stage('whatsapp_send') as timer:
+        with guarded('graph'):
+            response = get_session().post(url, headers=headers, json=data, timeout=10)
+            timer.result = str(response.status_code)
+            check_status('graph', response.status_code)
+        handle_whatsapp_response(to, response.status_code, response.text)
+    return response.status_code
@@ -1,94 +1,386 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import ValidationError
 from .models import SavedItem
-from .serializers import SavedItemSerializer
-from .utils import get_url_type, scrape_metadata, process_with_ai
+from .serializers import SavedItemSerializer, query_fields, requested_fields, serialize_rows
+from .http import get_session
+from .utils import get_client
+from .jobs import enqueue_jobs
+from .outbox import queue_messages
+from .idempotency import claim_message
+from .search import highlight_html, search_items
+from .pagination import SavedItemCursorPagination
+from .sync import changes_since, collection_etag, collection_version, current_cursor, decode_cursor, etag_matches
+from .events import aevent_stream, event_stream
+from .embeddings import EMBEDDED_FIELDS, embed_item, embed_query, vector_index
+from .export import FORMATS as EXPORT_FORMATS, aexport_stream, export_stream
+from .facets import facet_counts, normalize_tag
+from .observability import registry, stage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time
+from time import perf_counter
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 import requests
 import re
 import os
 import json
-import threading
-from django.db import close_old_connections
+import hmac
+import logging
+
+logger = logging.getLogger(__name__)
 
 class SavedItemViewSet(viewsets.ModelViewSet):
-    queryset = SavedItem.objects.all().order_by('-created_at')
+    queryset = SavedItem.objects.all().order_by('-created_at', '-id')
     serializer_class = SavedItemSerializer
+    pagination_class = SavedItemCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_items(queryset, self.request.query_params)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        Slim rows (see LIST_FIELDS), or a sparse fieldset via ?fields=; retrieve returns everything.
+        Conditional: an unchanged collection answers If-None-Match with an empty 304.
+        """
+        # Read the version before the rows, so a change racing this request
+        # shows up again on the next sync rather than being skipped.
+        version = collection_version()
+        etag = collection_etag(request, version)
+        sync_headers = {
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+            'X-Sync-Cursor': current_cursor(version),
+        }
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=sync_headers)
+
+        fields = requested_fields(request.query_params)
+        queryset = self.filter_queryset(self.get_queryset()).values(*query_fields(fields))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            response = Response(serialize_rows(queryset, fields))
+        else:
+            response = self.get_paginated_response(serialize_rows(page, fields))
+        for name, value in sync_headers.items():
+            response[name] = value
+        return response
+
+    def perform_update(self, serializer):
+        item = serializer.save()
+        # Keep the vector in step with the text it was computed from.
+        if any(name in serializer.validated_data for name in EMBEDDED_FIELDS):
+            item.embedding = embed_item(item)
+            # Hand-edited text is no longer the re-enrichment scheduler's to rewrite.
+            item.next_enrich_at = None
+            item.save(update_fields=['embedding', 'next_enrich_at', 'updated_at'])
+
+    @action(detail=False, methods=['get'])
+    def semantic(self, request):
+        """Semantic search by embedding similarity: /api/items/semantic/?q=<text>&limit=<n>&fields=<a,b>"""
+        query = request.query_params.get('q', '').strip()
+        limit = min(parse_positive_int(request.query_params.get('limit'), 20), 100)
+        fields = requested_fields(request.query_params)
+        if not query:
+            return Response({'results': []})
+        hits = vector_index.search(embed_query(query), k=limit)
+        # Below this the match is noise (unrelated items still share a few n-grams).
+        hits = [(item_id, score) for item_id, score in hits if score >= settings.SEMANTIC_MIN_SCORE]
+        return Response({'results': scored_rows(hits, fields)})
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """Items most similar to this one: /api/items/<id>/related/?limit=<n>&fields=<a,b>"""
+        item = self.get_object()
+        limit = min(parse_positive_int(request.query_params.get('limit'), 10), 100)
+        fields = requested_fields(request.query_params)
+        vector = vector_index.vector(item.id)
+        if vector is None:
+            return Response({'results': []})
+        hits = vector_index.search(vector, k=limit, exclude=(item.id,))
+        return Response({'results': scored_rows(hits, fields)})
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Delta sync: /api/items/changes/?since=<cursor>&fields=<a,b>
+        Returns items created or updated and IDs deleted since the cursor (taken from
+        a previous response or the list's X-Sync-Cursor header). Without `since`,
+        pages through the whole collection. 410 means the cursor is too old: reload.
+        """
+        since = request.query_params.get('since') or None
+        fields = requested_fields(request.query_params)
+        changed, deleted, cursor, has_more = changes_since(since, settings.CHANGES_PAGE_SIZE, fields)
+        return Response({
+            'changed': serialize_rows(changed, fields),
+            'deleted': deleted,
+            'cursor': cursor,
+            'has_more': has_more,
+        })
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Sidebar filter counts: /api/items/facets/?category=&item_type=&is_seen=&hashtags=<n>
+        Read from maintained counters, so the cost doesn't grow with the collection.
+        Each facet applies the other facets' filters, not its own.
+        """
+        params = request.query_params
+        filters = {}
+        if params.get('category'):
+            filters['category'] = params['category']
+        if params.get('item_type'):
+            filters['item_type'] = params['item_type']
+        if params.get('is_seen'):
+            filters['is_seen'] = parse_bool_param(params, 'is_seen')
+        hashtag_limit = min(parse_positive_int(params.get('hashtags'), 30), 200)
+        return Response(facet_counts(filters, hashtag_limit))
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Ranked full-text search: /api/items/search/?q=<terms>&page=<n>&page_size=<n>&fields=<a,b>"""
+        query = request.query_params.get('q', '').strip()
+        page = parse_positive_int(request.query_params.get('page'), 1)
+        page_size = min(parse_positive_int(request.query_params.get('page_size'), 20), 100)
+
+        fields = requested_fields(request.query_params)
+
+        total, hits = search_items(query, limit=page_size, offset=(page - 1) * page_size)
+        rows = list(SavedItem.objects.filter(id__in=[hit[0] for hit in hits]).values(*query_fields(fields)))
+        items = {row['id']: data for row, data in zip(rows, serialize_rows(rows, fields))}
+
+        results = []
+        for item_id, rank, title_highlight, snippet in hits:
+            data = items.get(item_id)
+            if data is None:
+                continue
+            data['rank'] = rank
+            data['highlight'] = {
+                'title': highlight_html(title_highlight),
+                'snippet': highlight_html(snippet),
+            }
+            results.append(data)
+
+        return Response({
+            'count': total,
+            'page': page,
+            'page_size': page_size,
+            'results': results,
+        })
+
+def scored_rows(hits, fields):
+    """[(item_id, score)] -> serialized rows with a `score`, in hit order."""
+    rows = list(SavedItem.objects.filter(id__in=[item_id for item_id, _ in hits]).values(*query_fields(fields)))
+    items = {row['id']: data for row, data in zip(rows, serialize_rows(rows, fields))}
+    results = []
+    for item_id, score in hits:
+        data = items.get(item_id)
+        if data is not None:
+            data['score'] = round(score, 4)
+            results.append(data)
+    return results
 
-def send_whatsapp_message(to, text):
-    """Utility to send message via Meta WhatsApp Cloud API"""
-    access_token = os.environ.get("WHATSAPP_ACCESS_TOKEN")
-    phone_number_id = os.environ.get("WHATSAPP_PHONE_NUMBER_ID")
-    
-    if not access_token or not phone_number_id:
-        print("ERROR: Missing WhatsApp API credentials in environment variables!")
-        return None
-
-    url = f"https://graph.facebook.com/v22.0/{phone_number_id}/messages"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-    }
-    data = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "type": "text",
-        "text": {"body": text},
-    }
-    
-    print(f"Sending message to {to}...")
+@require_GET
+def item_events(request):
+    """
+    Server-Sent Events: /api/items/events/?since=<cursor>
+    Emits a 'changes' event ({changed, deleted}) whenever items are saved or deleted,
+    and 'reset' when the cursor is too old to resume from. Reconnects resume from
+    Last-Event-ID. Under WSGI an open stream would hold a worker for
+    SSE_MAX_STREAM_SECONDS, so unless SSE_ON_WSGI is set the answer is 204, which
+    tells EventSource not to reconnect; the dashboard then polls /changes/.
+    """
+    is_asgi = isinstance(request, ASGIRequest)
+    if not is_asgi and not settings.SSE_ON_WSGI:
+        return HttpResponse(status=204)
+    cursor = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('since') or None
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValidationError:
+            return HttpResponseBadRequest("Invalid sync cursor.")
+
+    stream = aevent_stream(cursor) if is_asgi else event_stream(cursor)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let a proxy sit on the events
+    return response
+
+@require_GET
+def item_export(request):
+    """
+    Download the collection: /api/items/export/?format=jsonl|csv|md&gzip=1
+    Accepts the list filters (category, item_type, is_seen, created_after, created_before).
+    A plain Django view: DRF would treat ?format= as a renderer override.
+    """
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown format. Choose from: {', '.join(EXPORT_FORMATS)}.")
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=10)
-        resp_json = response.json()
-        print(f"Meta API Response Status: {response.status_code}")
-        print(f"Meta API Response Body: {json.dumps(resp_json, indent=2)}")
-        
-        if response.status_code != 200:
-            print(f"FAILED to send message to {to}. Status: {response.status_code}")
-        
-        return resp_json
-    except Exception as e:
-        print(f"Critical Error sending WhatsApp message: {e}")
-        return None
+        queryset = filter_items(SavedItem.objects.all(), request.GET)
+    except ValidationError as e:
+        return HttpResponseBadRequest(json.dumps(e.detail), content_type='application/json')
+
+    use_gzip = request.GET.get('gzip', '').lower() in ('1', 'true')
+    content_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"hack-the-thread-{timezone.now():%Y%m%d}.{extension}"
+    if use_gzip:
+        content_type, filename = 'application/gzip', filename + '.gz'
+
+    # Under ASGI a sync generator would be read to the end before the first byte goes out.
+    make_stream = aexport_stream if isinstance(request, ASGIRequest) else export_stream
+    response = StreamingHttpResponse(make_stream(queryset, fmt, gzip=use_gzip), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@require_GET
+def metrics(request):
+    """Prometheus text exposition for this process (see api/observability.py)."""
+    if settings.METRICS_TOKEN:
+        supplied = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), settings.METRICS_TOKEN.encode()):
+            return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def warm_db():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+# Subsystems /api/healthz?warm= can load ahead of the first real request.
+WARMERS = {
+    'db': warm_db,
+    'ai': get_client,
+    'scraper': get_session,
+    'vectors': lambda: vector_index.refresh(),
+}
+
+@require_GET
+def healthz(request):
+    """
+    Liveness check that never touches the items table. ?warm=db,ai,scraper,vectors
+    (or ?warm=all) initializes those subsystems first and reports how long each took,
+    so a keep-alive ping or deploy hook leaves the process ready to serve.
+    """
+    names = [name for name in request.GET.get('warm', '').split(',') if name]
+    if names == ['all']:
+        names = list(WARMERS)
+    unknown = sorted(set(names) - set(WARMERS))
+    if unknown:
+        return JsonResponse({'error': f"Unknown warm target(s): {', '.join(unknown)}"}, status=400)
+
+    warmed, errors = {}, {}
+    for name in names:
+        started = perf_counter()
+        try:
+            WARMERS[name]()
+        except Exception as e:
+            logger.exception("Warm-up of %s failed", name)
+            errors[name] = str(e)
+        else:
+            warmed[name] = round((perf_counter() - started) * 1000, 2)
+    body = {'status': 'error' if errors else 'ok', 'warmed': warmed}
+    if errors:
+        body['errors'] = errors
+    return JsonResponse(body, status=503 if errors else 200)
 
-def process_webhook_in_background(url, from_number):
-    """Heavy lifting (Scraping + AI + DB) in a background thread."""
+def filter_items(queryset, params):
+    """
+    Server-side filters for the items list:
+    ?category=&item_type=&is_seen=true|false&hashtag=&created_after=&created_before= (ISO date or datetime)
+    """
+    if params.get('category'):
+        queryset = queryset.filter(category=params['category'])
+    if params.get('item_type'):
+        queryset = queryset.filter(item_type=params['item_type'])
+    if params.get('is_seen'):
+        queryset = queryset.filter(is_seen=parse_bool_param(params, 'is_seen'))
+    if params.get('hashtag'):
+        queryset = queryset.filter(tags__name=normalize_tag(params['hashtag']) or '')
+    if params.get('created_after'):
+        queryset = queryset.filter(created_at__gte=parse_time_param(params, 'created_after'))
+    if params.get('created_before'):
+        queryset = queryset.filter(created_at__lt=parse_time_param(params, 'created_before'))
+    return queryset
+
+def parse_bool_param(params, name):
+    value = params[name].lower()
+    if value not in ('true', 'false', '1', '0'):
+        raise ValidationError({name: "Expected 'true' or 'false'."})
+    return value in ('true', '1')
+
+def parse_time_param(params, name):
+    value = params[name].strip().replace(' ', '+')  # '+' in a tz offset arrives as a space
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.combine(day, time.min)
+    if parsed is None:
+        raise ValidationError({name: "Expected an ISO 8601 date or datetime."})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+def parse_positive_int(value, default):
     try:
-        print(f"Background: Processing URL {url}")
-        item_type = get_url_type(url)
-        
-        print("Background: Scraping metadata...")
-        scraped_data = scrape_metadata(url)
-        
-        print("Background: Processing with AI...")
-        ai_data = process_with_ai(url, scraped_data)
-        
-        # Save to DB
-        print("Background: Saving to database...")
-        item = SavedItem.objects.create(
-            url=url,
-            item_type=item_type,
-            title=ai_data.get('title') or scraped_data.get('title'),
-            caption=scraped_data.get('caption'),
-            summary=ai_data.get('summary'),
-            category=ai_data.get('category'),
-            hashtags=ai_data.get('hashtags')
-        )
-        
-        reply_text = f"Got it! Saved to your '{item.category}' bucket.\n\nView your collection here: https://hack-the-thread.pages.dev/"
-        print(f"Background: Sending reply to {from_number}")
-        send_whatsapp_message(from_number, reply_text)
-        
-    except Exception as e:
-        print(f"Background process error: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        # Crucial for long-running threads in Django
-        close_old_connections()
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return default
+
+def iter_text_messages(data):
+    """Yield (message_id, from_number, text) for every text message in a (possibly batched) Meta payload."""
+    for entry in data.get('entry', []):
+        for change in entry.get('changes', []):
+            value = change.get('value', {})
+            for message in value.get('messages', []):
+                if message.get('type') != 'text':
+                    continue
+                yield message.get('id'), message.get('from'), message.get('text', {}).get('body', '').strip()
+
+def extract_urls(text):
+    """Simple URL extraction"""
+    url_pattern = r'https?://[^\s]+'
+    return re.findall(url_pattern, text)
+
+def ingest_links(links):
+    """
+    Queue a batch of (url, from_number) pairs as one unit.
+    URLs are deduped across the batch and checked against the DB in a single query.
+    Returns the (to, text) replies for the outbox.
+    """
+    # --- Duplicate Protection ---
+
+    # 1. First sender wins if the same URL appears twice in one payload
+    unique_links = {}
+    for url, from_number in links:
+        unique_links.setdefault(url, from_number)
+
+    # 2. Check which URLs already exist
+    existing = set(
+        SavedItem.objects.filter(url__in=unique_links).values_list('url', flat=True)
+    )
+    replies = [(unique_links[url], "This link is already in your collection.") for url in existing]
+
+    # 3. Queue the heavy processing for the worker pool
+    # The "Processing" ack is already queued above. The URL is claimed as the
+    # job's dedupe key, so concurrent deliveries of the same link queue it once.
+    payloads = [
+        {'url': url, 'from_number': from_number}
+        for url, from_number in unique_links.items()
+        if url not in existing
+    ]
+    enqueue_jobs('process_link', payloads, dedupe_field='url')
+    return replies
 
 @csrf_exempt
 @api_view(['GET', 'POST'])
@@ -96,7 +388,7 @@ def process_webhook_in_background(url, from_number):
 def whatsapp_webhook(request):
     # 1. Webhook Verification (GET)
     if request.method == 'GET':
-        print("--- Webhook Verification (GET) ---")
+        logger.info("Webhook verification request")
         verify_token = os.environ.get("WHATSAPP_VERIFY_TOKEN")
         mode = request.query_params.get('hub.mode')
         token = request.query_params.get('hub.verify_token')
@@ -111,63 +403,59 @@ def whatsapp_webhook(request):
     # 2. Handle Incoming Message (POST)
     if request.method == 'POST':
         data = request.data
-        print("--- Incoming Webhook (POST) ---")
-        print(f"Payload from Meta: {json.dumps(data, indent=2)}")
-        
+        # Lazy %-formatting: the dump is only built when DEBUG logging is on.
+        logger.debug("Payload from Meta: %s", data)
+
         try:
-            entries = data.get('entry', [])
-            if not entries:
-                return Response(status=status.HTTP_200_OK)
+            messages = list(iter_text_messages(data))
+        except (AttributeError, TypeError, ValueError):
+            # A payload we can't read won't read better when redelivered: acknowledge it.
+            logger.warning("Ignoring malformed webhook payload", exc_info=True)
+            return Response(status=status.HTTP_200_OK)
 
-            changes = entries[0].get('changes', [])
-            if not changes:
-                return Response(status=status.HTTP_200_OK)
+        timer = stage('webhook')
+        try:
+            with timer:
+                # Message claims, queued jobs and queued replies commit together,
+                # so after a failure (answered with a 5xx, which Meta redelivers)
+                # the retry is processed from scratch. Replies are sent by the
+                # outbox (api/outbox.py), never from here: no HTTP call runs while
+                # this transaction holds the write lock.
+                with transaction.atomic():
+                    links = []
+                    replies = []
+                    for message_id, from_number, text_body in messages:
+                        # 0. Meta retry of a message we already handled: drop it before any API call
+                        if not claim_message(message_id):
+                            logger.info("Skipping duplicate delivery", extra={'message_id': message_id})
+                            timer.result = 'duplicate'
+                            continue
 
-            value = changes[0].get('value', {})
-            messages = value.get('messages', [])
-            
-            if not messages:
-                return Response(status=status.HTTP_200_OK)
+                        # 1a. Immediate Acknowledgement (User requested this happen first)
+                        replies.append((from_number, f"Received: \"{text_body}\"\n\nProcessing..."))
 
-            message = messages[0]
-            from_number = message.get('from')
-            
-            if message.get('type') != 'text':
-                return Response(status=status.HTTP_200_OK)
+                        urls = extract_urls(text_body)
+                        if not urls:
+                            replies.append((from_number, "I'm ready. Send me a link from Instagram, Twitter, or a Blog, and I'll save it for you."))
+                            continue
 
-            text_body = message.get('text', {}).get('body', '').strip()
-            
-            # 1a. Immediate Acknowledgement (User requested this happen first)
-            ack_text = f"Received: \"{text_body}\"\n\nProcessing..."
-            send_whatsapp_message(from_number, ack_text)
+                        links.extend((url, from_number) for url in urls)
+
+                    if links:
+                        replies.extend(ingest_links(links))
+
+                    queue_messages(replies)
 
-            # Simple URL extraction
-            url_pattern = r'https?://[^\s]+'
-            urls = re.findall(url_pattern, text_body)
-            
-            if not urls:
-                send_whatsapp_message(from_number, "I'm ready. Send me a link from Instagram, Twitter, or a Blog, and I'll save it for you.")
-                return Response(status=status.HTTP_200_OK)
-            
-            url = urls[0]
-            
-            # --- Duplicate Protection ---
-            
-            # 1. Check if URL already exists
-            if SavedItem.objects.filter(url=url).exists():
-                send_whatsapp_message(from_number, "This link is already in your collection.")
-                return Response(status=status.HTTP_200_OK)
-
-            # 3. Launch background thread for heavy processing
-            # We already sent the "Processing" message above
-            thread = threading.Thread(target=process_webhook_in_background, args=(url, from_number))
-            thread.start()
-            
             # Return 200 OK immediately
             return Response(status=status.HTTP_200_OK)
             
-        except Exception as e:
-            print(f"Webhook error: {e}")
+        except DatabaseError:
+            # Nothing was committed, so ask Meta to deliver the batch again.
+            logger.exception("Webhook processing failed")
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except Exception:
+            # A bug, not a transient failure: a redelivery would fail the same way, forever.
+            logger.exception("Webhook processing failed")
             return Response(status=status.HTTP_200_OK)
 
     return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -0,0 +1,194 @@
+"""
+Single-writer coalescing of background SavedItem writes.
+
+SQLite takes one writer at a time, so a burst of links with every job worker
+inserting its own row turns into a queue of tiny transactions contending for
+the database lock. ItemWriter funnels those writes through one thread instead:
+whatever arrives within ITEM_WRITER_WINDOW is committed as one transaction of
+bulk_create / bulk_update, and the facet counters and live streams are updated
+once per batch (bulk writes skip post_save). Callers get a Future per write.
+
+With ITEM_WRITE_COALESCING off, writes run inline on the caller's thread
+through the same code, one per transaction.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .events import notify_change
+from .facets import record_bulk_created, record_bulk_updated, remember_state
+from .models import SavedItem
+from .observability import WRITE_BATCH_SIZE, stage
+
+logger = logging.getLogger(__name__)
+
+
+class Write:
+    """
+    A pending insert of one item (fields None) or a bulk_update of `items`.
+    With `versions` ({pk: updated_at as read}) the update is conditional: rows
+    saved by someone else since are left alone.
+    """
+
+    def __init__(self, items, fields=None, versions=None):
+        self.items = items
+        self.fields = fields
+        self.versions = versions
+        self.future = Future()
+
+
+def apply_writes(writes):
+    """
+    Run `writes` in the current transaction. Returns each one's result: the saved
+    item for an insert (None if its URL was taken), None for an update, and the
+    items actually written for a conditional update.
+    """
+    inserts = [write for write in writes if write.fields is None]
+    urls = {write.items[0].url for write in inserts}
+    # One row per URL: already-saved URLs and repeats within the batch are duplicates.
+    taken = set(SavedItem.objects.filter(url__in=urls).values_list('url', flat=True)) if urls else set()
+    results = {}
+    new = []
+    for write in inserts:
+        item = write.items[0]
+        if item.url in taken:
+            results[write] = None
+            continue
+        taken.add(item.url)
+        new.append(item)
+        results[write] = item
+
+    if new:
+        SavedItem.objects.bulk_create(new)
+        if any(item.pk is None for item in new):
+            # Backends that can't return ids from a bulk insert.
+            ids = dict(SavedItem.objects.filter(url__in=[item.url for item in new]).values_list('url', 'id'))
+            for item in new:
+                item.pk = ids[item.url]
+        record_bulk_created([item.url for item in new])
+        for item in new:
+            remember_state(item)
+
+    updated = []
+    for write in writes:
+        if write.fields is None:
+            continue
+        if write.versions is None:
+            SavedItem.objects.bulk_update(write.items, write.fields)
+            updated.extend(write.items)
+            continue
+        written = []
+        for item in write.items:
+            rows = SavedItem.objects.filter(pk=item.pk, updated_at=write.versions[item.pk])
+            if rows.update(**{name: getattr(item, name) for name in write.fields}):
+                written.append(item)
+        results[write] = written
+        updated.extend(written)
+    if updated:
+        record_bulk_updated(updated)
+
+    if new or updated:
+        notify_change()
+    return [results.get(write) for write in writes]
+
+
+def write_batch(writes):
+    """Commit `writes` together and resolve their futures. A failed batch is retried one write at a time."""
+    try:
+        with stage('db_batch'), transaction.atomic():
+            results = apply_writes(writes)
+    except Exception as e:
+        for write in writes:
+            if write.fields is None:
+                # Rolled back: forget the ids bulk_create handed out.
+                write.items[0].pk = None
+                write.items[0]._state.adding = True
+        if len(writes) == 1:
+            writes[0].future.set_exception(e)
+            return
+        logger.warning("Batch of %s writes failed, retrying them one by one: %s", len(writes), e)
+        for write in writes:
+            write_batch([write])
+        return
+    WRITE_BATCH_SIZE.observe(sum(len(write.items) for write in writes))
+    for write, result in zip(writes, results):
+        write.future.set_result(result)
+
+
+class ItemWriter:
+    """Collects SavedItem writes and commits them from a single thread in batches."""
+
+    def __init__(self, max_batch, window):
+        self.max_batch = max_batch
+        self.window = window
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = []
+        self._flusher = None
+
+    def create(self, item):
+        """Insert `item`. The future resolves to it (with its pk), or None if its URL is already saved."""
+        return self._submit(Write([item]))
+
+    def update(self, items, fields, versions=None):
+        """
+        bulk_update `fields` of `items`; callers set updated_at themselves. Resolves to None,
+        or with `versions` ({pk: updated_at as read}) to the items whose row was still unchanged.
+        """
+        return self._submit(Write(list(items), tuple(fields), versions))
+
+    def _submit(self, write):
+        if not settings.ITEM_WRITE_COALESCING:
+            write_batch([write])
+            return write.future
+        with self._lock:
+            self._pending.append(write)
+            self._ensure_flusher()
+            self._wakeup.notify()
+        return write.future
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name='item-writer', daemon=True)
+            self._flusher.start()
+
+    def _pending_items(self):
+        return sum(len(write.items) for write in self._pending)
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                # Give the batch a short window to fill up, unless it already has.
+                deadline = time.monotonic() + self.window
+                while self._pending_items() < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                batch, size = [], 0
+                while self._pending and (not batch or size + len(self._pending[0].items) <= self.max_batch):
+                    write = self._pending.pop(0)
+                    batch.append(write)
+                    size += len(write.items)
+            try:
+                write_batch(batch)
+            except Exception as e:
+                # write_batch resolves every future itself; this is a bug, but don't strand the callers.
+                logger.exception("Item writer failed")
+                for write in batch:
+                    if not write.future.done():
+                        write.future.set_exception(e)
+            finally:
+                close_old_connections()
+
+
+item_writer = ItemWriter(
+    max_batch=settings.ITEM_WRITER_BATCH_SIZE,
+    window=settings.ITEM_WRITER_WINDOW,
+)
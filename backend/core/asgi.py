@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    # Django's handler only speaks HTTP; lifespan events start/stop the async job worker.
+    if scope['type'] == 'lifespan':
+        from api.pipeline import asgi_lifespan
+        await asgi_lifespan(scope, receive, send)
+        return
+    await django_application(scope, receive, send)
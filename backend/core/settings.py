@@ -43,7 +43,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise, plus the runtime thumbnail store (api/thumbnails.py)
+    'api.thumbnails.ThumbnailMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +85,192 @@ DATABASES = {
     )
 }
 
+# SQLite tuning. WAL lets readers (the API) run while a write is in progress;
+# it is a property of the database file, switched on once by migration 0017.
+# The rest applies to every new connection: busy_timeout makes writers queue for the
+# lock instead of failing with "database is locked"; synchronous=NORMAL is
+# durable across app crashes in WAL mode and skips most fsyncs. IMMEDIATE
+# transactions take the write lock up front, since a deferred one that has
+# to upgrade from read to write fails at once instead of waiting.
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '20000'))
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': (
+            f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS};'
+            f'PRAGMA synchronous={SQLITE_SYNCHRONOUS};'
+        ),
+    })
+
+# Background SavedItem inserts/updates go through one writer thread that commits
+# them in batches (see api/writer.py): up to ITEM_WRITER_BATCH_SIZE items, waiting
+# at most ITEM_WRITER_WINDOW seconds for a batch to fill
+ITEM_WRITE_COALESCING = os.environ.get('ITEM_WRITE_COALESCING', 'True') == 'True'
+ITEM_WRITER_BATCH_SIZE = int(os.environ.get('ITEM_WRITER_BATCH_SIZE', '50'))
+ITEM_WRITER_WINDOW = float(os.environ.get('ITEM_WRITER_WINDOW', '0.05'))
+
+
+# Background jobs
+# 'inprocess' runs a worker thread pool inside each web process; 'asgi' runs the
+# async worker on the ASGI server's event loop (core/asgi.py); 'external' expects
+# `python manage.py run_worker` to be running separately.
+
+JOB_WORKER_MODE = os.environ.get('JOB_WORKER_MODE', 'inprocess')
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', '4'))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '120'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS', '10'))
+JOB_RETRY_MAX_SECONDS = float(os.environ.get('JOB_RETRY_MAX_SECONDS', '600'))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '1.0'))
+ASYNC_WORKER_CONCURRENCY = int(os.environ.get('ASYNC_WORKER_CONCURRENCY', '200'))
+# Extra workers that only run short express jobs (outbox sends), so replies
+# don't wait behind a backlog of links
+JOB_EXPRESS_WORKERS = int(os.environ.get('JOB_EXPRESS_WORKERS', '1'))
+
+# Scrape result cache (seconds), keyed by canonical URL
+SCRAPE_CACHE_TTLS = {
+    'instagram': int(os.environ.get('SCRAPE_CACHE_TTL_INSTAGRAM', str(6 * 3600))),
+    'tiktok': int(os.environ.get('SCRAPE_CACHE_TTL_TIKTOK', str(6 * 3600))),
+    'x': int(os.environ.get('SCRAPE_CACHE_TTL_X', str(3600))),
+    'youtube': int(os.environ.get('SCRAPE_CACHE_TTL_YOUTUBE', str(24 * 3600))),
+}
+SCRAPE_CACHE_DEFAULT_TTL = int(os.environ.get('SCRAPE_CACHE_DEFAULT_TTL', str(24 * 3600)))
+SCRAPE_CACHE_NEGATIVE_TTL = int(os.environ.get('SCRAPE_CACHE_NEGATIVE_TTL', '600'))
+SCRAPE_CACHE_LRU_SIZE = int(os.environ.get('SCRAPE_CACHE_LRU_SIZE', '2048'))
+
+# Hedged scraping (seconds): overall budget per link, and how long the preferred
+# layer gets before the next one is raced against it
+SCRAPE_DEADLINE = float(os.environ.get('SCRAPE_DEADLINE', '15'))
+SCRAPE_HEDGE_DELAY = float(os.environ.get('SCRAPE_HEDGE_DELAY', '3'))
+SCRAPE_HEDGE_MIN_DELAY = float(os.environ.get('SCRAPE_HEDGE_MIN_DELAY', '0.5'))
+SCRAPE_POOL_SIZE = int(os.environ.get('SCRAPE_POOL_SIZE', '16'))
+# The social layer reads a page only up to its </head>, and never more than this
+SOCIAL_HEAD_MAX_BYTES = int(os.environ.get('SOCIAL_HEAD_MAX_BYTES', str(512 * 1024)))
+
+# Gemini enrichment batching and response cache
+AI_BATCH_SIZE = int(os.environ.get('AI_BATCH_SIZE', '8'))
+AI_BATCH_WINDOW = float(os.environ.get('AI_BATCH_WINDOW', '0.5'))
+AI_BATCH_CONCURRENCY = int(os.environ.get('AI_BATCH_CONCURRENCY', '4'))
+AI_RESULT_TIMEOUT = float(os.environ.get('AI_RESULT_TIMEOUT', '120'))
+AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', str(30 * 24 * 3600)))
+AI_CACHE_LRU_SIZE = int(os.environ.get('AI_CACHE_LRU_SIZE', '2048'))
+
+# Upstream rate limits (requests/second, burst) and circuit breakers, shared by
+# every process through a small SQLite file
+RESILIENCE_DB_PATH = os.environ.get('RESILIENCE_DB_PATH', str(BASE_DIR / 'resilience.sqlite3'))
+UPSTREAM_RATE_LIMITS = {
+    'gemini': (float(os.environ.get('GEMINI_RATE_PER_SEC', '1')), int(os.environ.get('GEMINI_BURST', '5'))),
+    'jina': (float(os.environ.get('JINA_RATE_PER_SEC', '3')), int(os.environ.get('JINA_BURST', '10'))),
+    'graph': (float(os.environ.get('GRAPH_RATE_PER_SEC', '20')), int(os.environ.get('GRAPH_BURST', '40'))),
+}
+RATE_LIMIT_MAX_WAIT = float(os.environ.get('RATE_LIMIT_MAX_WAIT', '10'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', '30'))
+
+# Upstream endpoints (overridable for self-hosted readers, Graph API upgrades
+# and the offline benchmark)
+JINA_READER_URL = os.environ.get('JINA_READER_URL', 'https://r.jina.ai/')
+WHATSAPP_API_URL = os.environ.get('WHATSAPP_API_URL', 'https://graph.facebook.com/v22.0/')
+YOUTUBE_THUMBNAIL_URL = os.environ.get('YOUTUBE_THUMBNAIL_URL', 'https://img.youtube.com/vi/{id}/hqdefault.jpg')
+
+# WhatsApp replies go through a persistent outbox (api/outbox.py). A recipient's
+# sender waits WHATSAPP_OUTBOX_DELAY seconds so replies queued meanwhile go out
+# as one message; failed sends are retried up to WHATSAPP_OUTBOX_MAX_ATTEMPTS times
+WHATSAPP_OUTBOX_DELAY = float(os.environ.get('WHATSAPP_OUTBOX_DELAY', '1.0'))
+WHATSAPP_OUTBOX_BATCH = int(os.environ.get('WHATSAPP_OUTBOX_BATCH', '50'))
+WHATSAPP_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('WHATSAPP_OUTBOX_MAX_ATTEMPTS', '5'))
+WHATSAPP_OUTBOX_SWEEP_INTERVAL = int(os.environ.get('WHATSAPP_OUTBOX_SWEEP_INTERVAL', '60'))
+WHATSAPP_OUTBOX_RETENTION_SECONDS = int(os.environ.get('WHATSAPP_OUTBOX_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+# Outbound HTTP connection pooling
+HTTP_POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', '16'))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '32'))
+
+# Webhook idempotency (Meta redelivers for up to 7 days)
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', str(7 * 24 * 3600)))
+IDEMPOTENCY_LRU_SIZE = int(os.environ.get('IDEMPOTENCY_LRU_SIZE', '10000'))
+IDEMPOTENCY_PURGE_INTERVAL = int(os.environ.get('IDEMPOTENCY_PURGE_INTERVAL', '3600'))
+
+# Delta sync: how long deletions are remembered for /api/items/changes/ clients
+TOMBSTONE_TTL_SECONDS = int(os.environ.get('TOMBSTONE_TTL_SECONDS', str(30 * 24 * 3600)))
+TOMBSTONE_PURGE_INTERVAL = int(os.environ.get('TOMBSTONE_PURGE_INTERVAL', '3600'))
+CHANGES_PAGE_SIZE = int(os.environ.get('CHANGES_PAGE_SIZE', '200'))
+# updated_at is stamped before the write commits, so a cursor handed out now
+# stays this far behind the clock: slow transactions are re-read, not skipped.
+SYNC_OVERLAP_SECONDS = float(os.environ.get('SYNC_OVERLAP_SECONDS', '10'))
+
+# Embeddings for semantic search / related items. EMBEDDING_BACKEND is a dotted
+# path; 'api.embeddings.GeminiEmbedder' trades the offline model for the API.
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'api.embeddings.HashingEmbedder')
+EMBEDDING_DIM = int(os.environ.get('EMBEDDING_DIM', '512'))
+EMBEDDING_LOAD_BATCH = int(os.environ.get('EMBEDDING_LOAD_BATCH', '2000'))
+SEMANTIC_MIN_SCORE = float(os.environ.get('SEMANTIC_MIN_SCORE', '0.1'))
+
+# Re-enrichment of fallback-quality items: up to REENRICH_BATCH_SIZE items
+# every REENRICH_INTERVAL seconds, retried with exponential backoff
+REENRICH_INTERVAL = int(os.environ.get('REENRICH_INTERVAL', '300'))
+REENRICH_BATCH_SIZE = int(os.environ.get('REENRICH_BATCH_SIZE', '8'))
+REENRICH_QUALITY_THRESHOLD = int(os.environ.get('REENRICH_QUALITY_THRESHOLD', '80'))
+REENRICH_RETRY_BASE_SECONDS = int(os.environ.get('REENRICH_RETRY_BASE_SECONDS', '1800'))
+REENRICH_RETRY_MAX_SECONDS = int(os.environ.get('REENRICH_RETRY_MAX_SECONDS', str(7 * 24 * 3600)))
+REENRICH_MAX_ATTEMPTS = int(os.environ.get('REENRICH_MAX_ATTEMPTS', '6'))
+
+# Rows fetched per round trip by /api/items/export/
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '1000'))
+
+# Facet counters are kept up to date on every write; this full rebuild only
+# repairs drift from writes that bypass the ORM
+FACETS_REBUILD_INTERVAL = int(os.environ.get('FACETS_REBUILD_INTERVAL', str(24 * 3600)))
+
+# Card thumbnails (api/thumbnails.py): preview images are shrunk to
+# THUMBNAIL_MAX_SIZE px, re-encoded as WebP and served from THUMBNAIL_DIR under
+# THUMBNAIL_URL; the store is trimmed to THUMBNAIL_DISK_BUDGET_MB every THUMBNAIL_GC_INTERVAL
+THUMBNAILS_ENABLED = os.environ.get('THUMBNAILS_ENABLED', 'True') == 'True'
+THUMBNAIL_DIR = os.environ.get('THUMBNAIL_DIR', str(BASE_DIR / 'thumbnails'))
+THUMBNAIL_URL = os.environ.get('THUMBNAIL_URL', '/thumbs/')
+THUMBNAIL_MAX_SIZE = int(os.environ.get('THUMBNAIL_MAX_SIZE', '640'))
+THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', '72'))
+THUMBNAIL_ENCODER_THREADS = int(os.environ.get('THUMBNAIL_ENCODER_THREADS', '1'))
+THUMBNAIL_MAX_SOURCE_BYTES = int(os.environ.get('THUMBNAIL_MAX_SOURCE_BYTES', str(10 * 1024 * 1024)))
+THUMBNAIL_DISK_BUDGET_MB = int(os.environ.get('THUMBNAIL_DISK_BUDGET_MB', '512'))
+THUMBNAIL_GC_INTERVAL = int(os.environ.get('THUMBNAIL_GC_INTERVAL', '3600'))
+
+# Server-Sent Events (/api/items/events/). Streams are only served under ASGI:
+# a WSGI worker would be tied up for SSE_MAX_STREAM_SECONDS per open dashboard,
+# so there the endpoint answers 204 and the dashboard polls ?since= instead.
+# SSE_ON_WSGI=True serves them anyway (threaded workers with threads to spare)
+SSE_ON_WSGI = os.environ.get('SSE_ON_WSGI', 'False') == 'True'
+SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', '5'))
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_MAX_STREAM_SECONDS = float(os.environ.get('SSE_MAX_STREAM_SECONDS', '300'))
+SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', '3000'))
+
+
+# Logging: LOG_LEVEL gates the app's own loggers (payload dumps are DEBUG);
+# LOG_FORMAT is 'text' (key=value context) or 'json' (one object per line)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'text': {'()': 'api.observability.KeyValueFormatter'},
+        'json': {'()': 'api.observability.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': LOG_FORMAT},
+    },
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+    'loggers': {
+        'api': {'level': LOG_LEVEL},
+        'django': {'level': os.environ.get('DJANGO_LOG_LEVEL', 'INFO')},
+    },
+}
+
+# Prometheus scrape endpoint (/metrics); when METRICS_TOKEN is set, scrapers
+# must send it as a bearer token
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -136,6 +323,8 @@ STORAGES = {
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
+# Let the dashboard read the sync cursor and validator off list responses
+CORS_EXPOSE_HEADERS = ['ETag', 'X-Sync-Cursor']
 
 # Production CSRF settings
 CSRF_TRUSTED_ORIGINS = [
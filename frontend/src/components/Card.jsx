@@ -2,12 +2,15 @@ import React, { useMemo } from 'react';
 import { motion } from 'framer-motion';
 import { ExternalLink, Tag, Clock, Trash2, Play } from 'lucide-react';
 import moment from 'moment';
+import { mediaUrl } from '../services/api';
 import './Card.css';
 
 const Card = ({ item, onDelete, onClick }) => {
     const isVideo = ['youtube', 'instagram', 'x'].includes(item.item_type);
 
     const getThumbnail = () => {
+        if (item.media_url) return mediaUrl(item.media_url);
+        // Items saved before server-side thumbnails, or whose thumbnail was evicted.
         if (item.item_type === 'youtube') {
             const videoId = item.url.split('v=')[1]?.split('&')[0] || item.url.split('shorts/')[1]?.split('?')[0] || item.url.split('youtu.be/')[1];
             if (videoId) return `https://img.youtube.com/vi/${videoId}/mqdefault.jpg`;
@@ -47,7 +50,7 @@ const Card = ({ item, onDelete, onClick }) => {
 
             <div className="card-preview">
                 {thumbnail ? (
-                    <img src={thumbnail} alt={item.title} className="preview-img" />
+                    <img src={thumbnail} alt={item.title} className="preview-img" loading="lazy" decoding="async" />
                 ) : (
                     <div className="preview-placeholder">
                         <Play className="play-icon" size={40} />
@@ -1,16 +1,28 @@
-import React, { useState, useEffect } from 'react';
-import { getItems, deleteItem, updateItem } from '../services/api';
+import React, { useState, useEffect, useRef } from 'react';
+import { getItems, getItemsPage, getItem, exportUrl, getFacets, getChanges, itemEventsUrl, searchItems, semanticSearch, deleteItem, updateItem } from '../services/api';
 import Card from './Card';
 import VideoModal from './VideoModal';
-import { Search, Loader2, RefreshCw, Menu, X, Filter, BarChart2, Calendar, Globe, Clock as ClockIcon } from 'lucide-react';
+import { Search, Loader2, RefreshCw, Download, Menu, X, Filter, BarChart2, Calendar, Globe, Clock as ClockIcon } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
 import moment from 'moment';
 import './Dashboard.css';
 
+// How often to pull /changes/ when the server doesn't stream them.
+const CHANGES_POLL_MS = 30000;
+
 const Dashboard = () => {
     const [items, setItems] = useState([]);
+    const [nextPage, setNextPage] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+    const [facets, setFacets] = useState(null);
+    // Sync cursor from the last list load / change event; a ref so the event stream doesn't reconnect on every event.
+    const syncCursor = useRef(null);
+    const [streamEpoch, setStreamEpoch] = useState(0);
+    const nextPageRef = useRef(null);
+    nextPageRef.current = nextPage;
     const [loading, setLoading] = useState(true);
     const [searchTerm, setSearchTerm] = useState('');
+    const [searchResults, setSearchResults] = useState(null);
     const [refreshing, setRefreshing] = useState(false);
     const [selectedCategory, setSelectedCategory] = useState('All');
     const [selectedPlatform, setSelectedPlatform] = useState('All');
@@ -20,7 +32,12 @@ const Dashboard = () => {
     const [isMobile, setIsMobile] = useState(window.innerWidth <= 1024);
     const [selectedItemForModal, setSelectedItemForModal] = useState(null);
 
-    const categories = ['All', ...new Set(items.map(item => item.category).filter(Boolean))];
+    // Category options with counts for the selected platform; the selected one stays listed even at zero.
+    const categoryCounts = new Map((facets ? facets.category : [])
+        .filter(facet => facet.value).map(facet => [facet.value, facet.count]));
+    if (selectedCategory !== 'All' && !categoryCounts.has(selectedCategory)) categoryCounts.set(selectedCategory, 0);
+    const categories = ['All', ...categoryCounts.keys()];
+    const platformCounts = new Map((facets ? facets.item_type : []).map(facet => [facet.value, facet.count]));
     const platforms = ['All', 'instagram', 'x', 'youtube', 'blog', 'other'];
     const timeRanges = ['All Time', 'Today', 'This Week', 'This Month'];
 
@@ -35,11 +52,38 @@ const Dashboard = () => {
         return () => window.removeEventListener('resize', handleResize);
     }, []);
 
+    // Platform, category and time filters are applied server-side; the list arrives a page at a time.
+    const filterParams = () => {
+        const params = {};
+        if (selectedPlatform !== 'All') params.item_type = selectedPlatform;
+        if (selectedCategory !== 'All') params.category = selectedCategory;
+        if (selectedTimeRange === 'Today') params.created_after = moment().startOf('day').toISOString();
+        if (selectedTimeRange === 'This Week') params.created_after = moment().subtract(7, 'days').toISOString();
+        if (selectedTimeRange === 'This Month') params.created_after = moment().subtract(1, 'month').toISOString();
+        return params;
+    };
+
+    const fetchFacets = async () => {
+        try {
+            const params = {};
+            if (selectedPlatform !== 'All') params.item_type = selectedPlatform;
+            if (selectedCategory !== 'All') params.category = selectedCategory;
+            const response = await getFacets(params);
+            setFacets(response.data);
+        } catch (error) {
+            console.error("Error fetching facets:", error);
+        }
+    };
+
     const fetchItems = async () => {
         try {
             setRefreshing(true);
-            const response = await getItems();
-            setItems(response.data);
+            const response = await getItems(filterParams());
+            setItems(response.data.results);
+            setNextPage(response.data.next);
+            syncCursor.current = response.headers['x-sync-cursor'] || null;
+            setStreamEpoch(epoch => epoch + 1);
+            fetchFacets();
         } catch (error) {
             console.error("Error fetching items:", error);
         } finally {
@@ -48,39 +92,174 @@ const Dashboard = () => {
         }
     };
 
+    // Apply a delta (from a refresh or a pushed event); filters are re-applied client-side below.
+    const applyChanges = (changed, deleted) => {
+        const deletedIds = new Set(deleted);
+        const changedById = new Map(changed.map(item => [item.id, item]));
+        setItems(current => {
+            const kept = current
+                .filter(item => !deletedIds.has(item.id))
+                .map(item => changedById.has(item.id) ? { ...item, ...changedById.get(item.id) } : item);
+            const knownIds = new Set(kept.map(item => item.id));
+            // Items older than the loaded window arrive with "load more" instead.
+            const oldest = nextPageRef.current && kept.length ? kept[kept.length - 1].created_at : null;
+            const added = changed.filter(item =>
+                !knownIds.has(item.id) && !deletedIds.has(item.id) && (!oldest || item.created_at > oldest));
+            return [...added.reverse(), ...kept];
+        });
+        setSearchResults(results => results && results
+            .filter(item => !deletedIds.has(item.id))
+            .map(item => changedById.has(item.id) ? { ...item, ...changedById.get(item.id) } : item));
+        // Counts are precomputed server-side, so re-reading them on every change is cheap.
+        fetchFacets();
+    };
+
+    // Refresh pulls only what changed since the last load; `quiet` skips the spinner for background polls.
+    const syncItems = async ({ quiet = false } = {}) => {
+        if (!syncCursor.current) return fetchItems();
+        try {
+            if (!quiet) setRefreshing(true);
+            let cursor = syncCursor.current;
+            let changed = [];
+            let deleted = [];
+            let hasMore = true;
+            while (hasMore) {
+                const response = await getChanges(cursor);
+                changed = [...changed, ...response.data.changed];
+                deleted = [...deleted, ...response.data.deleted];
+                cursor = response.data.cursor;
+                hasMore = response.data.has_more;
+            }
+            applyChanges(changed, deleted);
+            syncCursor.current = cursor;
+        } catch (error) {
+            if (error.response && error.response.status === 410) {
+                // Cursor outlived the server's tombstones: start over.
+                syncCursor.current = null;
+                return fetchItems();
+            }
+            console.error("Error syncing items:", error);
+        } finally {
+            setRefreshing(false);
+        }
+    };
+
+    // Live updates: the server pushes each save/delete; EventSource reconnects on its own via Last-Event-ID.
+    // A server without streams (WSGI) answers 204, which closes the source for good: poll for deltas instead.
+    useEffect(() => {
+        if (!streamEpoch) return;
+        let poller = null;
+        const poll = () => {
+            if (!poller) poller = setInterval(() => syncItems({ quiet: true }), CHANGES_POLL_MS);
+        };
+        if (typeof EventSource === 'undefined') {
+            poll();
+            return () => clearInterval(poller);
+        }
+        const source = new EventSource(itemEventsUrl(syncCursor.current));
+        source.addEventListener('error', () => {
+            if (source.readyState === EventSource.CLOSED) poll();
+        });
+        source.addEventListener('changes', (event) => {
+            const { changed, deleted } = JSON.parse(event.data);
+            applyChanges(changed, deleted);
+            if (event.lastEventId) syncCursor.current = event.lastEventId;
+        });
+        source.addEventListener('reset', () => {
+            source.close();
+            syncCursor.current = null;
+            fetchItems();
+        });
+        return () => {
+            source.close();
+            clearInterval(poller);
+        };
+    }, [streamEpoch]);
+
+    const loadMore = async () => {
+        if (!nextPage) return;
+        try {
+            setLoadingMore(true);
+            const response = await getItemsPage(nextPage);
+            setItems(current => [...current, ...response.data.results]);
+            setNextPage(response.data.next);
+        } catch (error) {
+            console.error("Error loading more items:", error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     useEffect(() => {
         fetchItems();
-    }, []);
+    }, [selectedPlatform, selectedCategory, selectedTimeRange]);
+
+    // Full-text search runs server-side (ranked), followed by semantic matches it missed;
+    // debounce so typing doesn't flood the API.
+    useEffect(() => {
+        const query = searchTerm.trim();
+        if (!query) {
+            setSearchResults(null);
+            return;
+        }
+
+        let cancelled = false;
+        const timer = setTimeout(async () => {
+            try {
+                const [keyword, semantic] = await Promise.all([
+                    searchItems(query, { page_size: 100 }),
+                    semanticSearch(query, { limit: 20 }).catch(() => ({ data: { results: [] } })),
+                ]);
+                const seen = new Set(keyword.data.results.map(item => item.id));
+                const extra = semantic.data.results.filter(item => !seen.has(item.id));
+                if (!cancelled) setSearchResults([...keyword.data.results, ...extra]);
+            } catch (error) {
+                console.error("Error searching items:", error);
+            }
+        }, 250);
+
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+        };
+    }, [searchTerm]);
 
     const handleDelete = async (id) => {
         try {
             await deleteItem(id);
             setItems(items.filter(item => item.id !== id));
+            setSearchResults(results => results && results.filter(item => item.id !== id));
         } catch (error) {
             console.error("Error deleting item:", error);
         }
     };
 
     const handleMarkAsSeen = async (item) => {
+        setSelectedItemForModal(item);
+        // List rows are slim; the detail (and PATCH) response carries the full item, caption included.
         if (!item.is_seen) {
             try {
-                await updateItem(item.id, { is_seen: true });
+                const response = await updateItem(item.id, { is_seen: true });
                 setItems(items.map(i => i.id === item.id ? { ...i, is_seen: true } : i));
+                setSearchResults(results => results && results.map(i => i.id === item.id ? { ...i, is_seen: true } : i));
+                setSelectedItemForModal(current => current && current.id === item.id ? response.data : current);
             } catch (error) {
                 console.error("Error marking item as seen:", error);
             }
+        } else {
+            try {
+                const response = await getItem(item.id);
+                setSelectedItemForModal(current => current && current.id === item.id ? response.data : current);
+            } catch (error) {
+                console.error("Error fetching item:", error);
+            }
         }
-        setSelectedItemForModal(item);
     };
 
-    const filteredItems = items
-        .filter(item => {
-            const matchesSearch =
-                item.title?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                item.summary?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                item.category?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                item.hashtags?.some(tag => tag.toLowerCase().includes(searchTerm.toLowerCase()));
+    const isSearching = searchTerm.trim() !== '' && searchResults !== null;
 
+    const filteredItems = (isSearching ? searchResults : items)
+        .filter(item => {
             const matchesCategory = selectedCategory === 'All' || item.category === selectedCategory;
             const matchesPlatform = selectedPlatform === 'All' || item.item_type === selectedPlatform;
 
@@ -96,9 +275,11 @@ const Dashboard = () => {
                 }
             }
 
-            return matchesSearch && matchesCategory && matchesPlatform && matchesTime;
+            return matchesCategory && matchesPlatform && matchesTime;
         })
         .sort((a, b) => {
+            // Search results arrive in relevance order; keep it unless the user picked another sort.
+            if (isSearching && sortBy === 'Newest') return 0;
             if (sortBy === 'Newest') return new Date(b.created_at) - new Date(a.created_at);
             if (sortBy === 'Oldest') return new Date(a.created_at) - new Date(b.created_at);
             if (sortBy === 'Alpha') return (a.title || '').localeCompare(b.title || '');
@@ -117,6 +298,7 @@ const Dashboard = () => {
                             onClick={() => setSelectedPlatform(p)}
                         >
                             {p === 'x' ? 'X' : p.charAt(0).toUpperCase() + p.slice(1)}
+                            {p !== 'All' && platformCounts.has(p) && <span className="chip-count">{platformCounts.get(p)}</span>}
                         </button>
                     ))}
                 </div>
@@ -144,7 +326,9 @@ const Dashboard = () => {
                     onChange={(e) => setSelectedCategory(e.target.value)}
                     className="filter-select"
                 >
-                    {categories.map(c => <option key={c} value={c}>{c}</option>)}
+                    {categories.map(c => (
+                        <option key={c} value={c}>{c === 'All' ? c : `${c} (${categoryCounts.get(c)})`}</option>
+                    ))}
                 </select>
             </div>
 
@@ -188,10 +372,14 @@ const Dashboard = () => {
                             </div>
                             <div className="sidebar-content">
                                 <FilterGroups vertical />
-                                <button onClick={fetchItems} className="refresh-btn-full">
+                                <button onClick={() => syncItems()} className="refresh-btn-full">
                                     <RefreshCw size={16} className={refreshing ? 'animate-spin' : ''} />
                                     Refresh Collection
                                 </button>
+                                <a href={exportUrl('md')} className="refresh-btn-full" download>
+                                    <Download size={16} />
+                                    Export Collection
+                                </a>
                             </div>
                         </motion.aside>
                     </>
@@ -220,10 +408,15 @@ const Dashboard = () => {
                     </div>
 
                     {!isMobile && (
-                        <button onClick={fetchItems} className="refresh-icon-btn" title="Refresh">
+                        <button onClick={() => syncItems()} className="refresh-icon-btn" title="Refresh">
                             <RefreshCw size={20} className={refreshing ? 'animate-spin' : ''} />
                         </button>
                     )}
+                    {!isMobile && (
+                        <a href={exportUrl('md')} className="refresh-icon-btn" title="Export collection (Markdown)" download>
+                            <Download size={20} />
+                        </a>
+                    )}
                 </div>
 
                 {!isMobile && (
@@ -275,6 +468,15 @@ const Dashboard = () => {
                         )}
                     </AnimatePresence>
                 )}
+
+                {!loading && !isSearching && nextPage && (
+                    <div className="load-more">
+                        <button onClick={loadMore} className="load-more-btn" disabled={loadingMore}>
+                            {loadingMore ? <Loader2 className="spinner" size={16} /> : null}
+                            Load more
+                        </button>
+                    </div>
+                )}
             </main>
 
             {selectedItemForModal && (
@@ -4,7 +4,24 @@ const api = axios.create({
     baseURL: 'https://hack-the-thread-zm6v.onrender.com/api/',
 });
 
-export const getItems = () => api.get('items/');
+export const getItems = (params = {}) => api.get('items/', { params });
+// Cursor pagination: follow the absolute `next` URL returned by the previous page.
+export const getItemsPage = (url) => api.get(url);
+export const searchItems = (q, params = {}) => api.get('items/search/', { params: { q, ...params } });
+// Delta sync: everything created, updated or deleted since a cursor from a previous response.
+export const getChanges = (since, params = {}) => api.get('items/changes/', { params: { since, ...params } });
+// Server-Sent Events stream of item changes; resumes from `since` (a sync cursor).
+export const itemEventsUrl = (since) =>
+    `${api.defaults.baseURL}items/events/${since ? `?since=${encodeURIComponent(since)}` : ''}`;
+// Meaning-based matches (embedding similarity), for queries whose words don't appear in the item.
+export const semanticSearch = (q, params = {}) => api.get('items/semantic/', { params: { q, ...params } });
+// Sidebar filter counts (categories, platforms, seen, top hashtags) from server-side counters.
+export const getFacets = (params = {}) => api.get('items/facets/', { params });
+// Download link for the whole collection (format: jsonl | csv | md).
+export const exportUrl = (format = 'md') => `${api.defaults.baseURL}items/export/?format=${format}`;
+// Server-made WebP thumbnails come back as paths on the API host.
+export const mediaUrl = (path) => (path ? new URL(path, api.defaults.baseURL).href : null);
+export const getItem = (id) => api.get(`items/${id}/`);
 export const deleteItem = (id) => api.delete(`items/${id}/`);
 export const updateItem = (id, data) => api.patch(`items/${id}/`, data);
 